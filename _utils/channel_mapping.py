@@ -0,0 +1,66 @@
+"""
+Renommage et typage des canaux appliqués à raw.info avant write_raw_bids.
+
+Partagé par tous les projets: chaque projet déclare sa table dans son fichier
+de configuration, section `channels`:
+
+    channels:
+      rename: {BIO001: ECG063}      # ancien nom -> nouveau nom
+      types: {X: misc, ECG063: ecg} # nom (après renommage) -> type MNE
+
+Les canaux absents de l'enregistrement sont ignorés, ce qui permet une même
+table pour tous les runs d'un projet.
+
+Utilisation depuis un script de projet:
+
+    sys.path.insert(0, str(Path(__file__).resolve().parent.parent / '_utils'))
+    from channel_mapping import load_channel_mapping, apply_channel_mapping
+"""
+from typing import Dict
+
+import mne
+
+
+def load_channel_mapping(config: Dict) -> Dict[str, Dict[str, str]]:
+    """
+    Lit la section `channels` d'une configuration de projet.
+
+    Returns:
+        Dictionnaire {'rename': {...}, 'types': {...}} (vides si non configurés)
+    """
+    channels = config.get('channels') or {}
+    return {
+        'rename': dict(channels.get('rename') or {}),
+        'types': dict(channels.get('types') or {}),
+    }
+
+
+def apply_channel_mapping(raw, mapping: Dict[str, Dict[str, str]]) -> Dict[str, Dict[str, str]]:
+    """
+    Applique renommages puis types de canaux à raw.info (sans charger les données).
+
+    Args:
+        raw: Objet mne.io.Raw (preload=False suffit)
+        mapping: Table retournée par load_channel_mapping
+
+    Returns:
+        Modifications réellement appliquées {'rename': {...}, 'types': {...}};
+        vide si raw.info est inchangé
+    """
+    rename = {old: new for old, new in mapping.get('rename', {}).items()
+              if old in raw.ch_names and old != new}
+    if rename:
+        mne.rename_channels(raw.info, rename, verbose=False)
+
+    current_types = dict(zip(raw.ch_names, raw.get_channel_types()))
+    types = {name: ch_type for name, ch_type in mapping.get('types', {}).items()
+             if name in current_types and current_types[name] != ch_type}
+    if types:
+        raw.set_channel_types(types, on_unit_change='ignore', verbose=False)
+
+    changes = {}
+    if rename:
+        changes['rename'] = rename
+    if types:
+        changes['types'] = types
+    return changes
@@ -0,0 +1,260 @@
+"""
+Décodage des triggers MEG sur toutes les voies STI en une seule passe.
+
+Les voies de stimulation sont lues une fois sous forme de tableau NumPy
+(n_voies, n_échantillons) ; les fronts montants de toutes les voies sont trouvés
+par un seul np.diff vectorisé, puis regroupés par type d'événement. Le résultat
+est identique, événement par événement, à un appel de mne.find_events par type
+(output='onset', consecutive='increasing', min_duration=0), y compris la
+vérification shortest_event et la déduplication entre voies d'un même groupe.
+
+Chaque projet déclare sa table dans son fichier de configuration, section
+`triggers`:
+
+    triggers:
+      shortest_event: 1
+      events:
+        start: {channels: [STI006], event_id: 1, skip_first: false}
+        answers: {channels: [STI009, STI010], event_id: 25}   # skip_first: true par défaut
+
+skip_first retire le premier événement détecté (front parasite au démarrage de
+l'acquisition).
+
+Utilisation depuis un script de projet:
+
+    sys.path.insert(0, str(Path(__file__).resolve().parent.parent / '_utils'))
+    from trigger_decoding import load_trigger_map, stim_channels, decode_triggers
+
+La détection (fronts bruts par voie, channel_onsets) peut être mise en cache par
+run (save_channel_onsets / load_channel_onsets, .npz) pour ne plus relire le
+.fif quand seuls l'étiquetage ou les étapes suivantes changent.
+"""
+import hashlib
+import json
+import os
+import warnings
+from pathlib import Path
+from typing import Dict, List, Optional
+
+import numpy as np
+
+
+def load_trigger_map(config: Dict) -> Dict:
+    """
+    Lit la section `triggers` d'une configuration de projet.
+
+    Returns:
+        Dictionnaire {'shortest_event': int, 'events': {nom: {'channels', 'event_id', 'skip_first'}}},
+        dans l'ordre du fichier de configuration
+    """
+    triggers = config.get('triggers') or {}
+    if not triggers.get('events'):
+        raise ValueError("Section 'triggers.events' absente de la configuration")
+
+    events = {}
+    for name, spec in triggers['events'].items():
+        channels = spec['channels']
+        events[name] = {
+            'channels': [channels] if isinstance(channels, str) else list(channels),
+            'event_id': int(spec['event_id']),
+            'skip_first': bool(spec.get('skip_first', True)),
+        }
+    return {'shortest_event': int(triggers.get('shortest_event', 1)), 'events': events}
+
+
+def stim_channels(trigger_map: Dict) -> List[str]:
+    """Voies STI utilisées par la table, sans doublon, dans l'ordre de déclaration."""
+    return list(dict.fromkeys(ch for spec in trigger_map['events'].values() for ch in spec['channels']))
+
+
+def find_onsets(data, first_samp: int = 0, ch_names=None) -> List[np.ndarray]:
+    """
+    Fronts montants de chaque voie, en une passe sur le bloc (n_voies, n_échantillons).
+
+    Même règle que mne.find_events (consecutive='increasing'): un onset est une
+    hausse de la valeur ; une baisse vers 0 ou une hausse depuis une valeur non
+    nulle ferme l'événement précédent. Une voie encore active au dernier
+    échantillon est fermée par la fin de l'enregistrement ; une voie sans aucune
+    fermeture ne renvoie rien.
+
+    Returns:
+        Liste (une entrée par voie) de tableaux (n, 3): [échantillon, valeur avant, valeur après]
+    """
+    data = np.asarray(data)
+    n_channels = data.shape[0]
+
+    negative = data.min(axis=1).astype(np.int64) < 0
+    if np.any(negative):
+        names = [ch_names[i] if ch_names else str(i) for i in np.flatnonzero(negative)]
+        warnings.warn(f"Valeurs négatives sur {', '.join(names)}: valeur absolue utilisée (comme mne.find_events)")
+
+    def as_level(rows, values):
+        # Conversion entière de MNE (troncature, valeur absolue des voies négatives),
+        # faite seulement aux changements
+        levels = values.astype(np.int64)
+        flip = negative[rows]
+        levels[flip] = np.abs(levels[flip])
+        return levels
+
+    # Une seule comparaison sur tout le bloc, dans son type d'origine : tout
+    # changement de niveau entier est aussi un changement de valeur brute
+    ch, idx = np.divmod(np.flatnonzero(data[:, 1:] != data[:, :-1]), data.shape[1] - 1)
+    pre = as_level(ch, data[ch, idx])
+    post = as_level(ch, data[ch, idx + 1])
+    changed = pre != post
+    ch, idx, pre, post = ch[changed], idx[changed], pre[changed], post[changed]
+
+    # Retour à 0 implicite après le dernier échantillon (pad_stop=0 dans MNE)
+    last = as_level(np.arange(n_channels), data[:, -1])
+    high_at_end = np.flatnonzero(last != 0)
+    if len(high_at_end):
+        ch = np.concatenate([ch, high_at_end])
+        idx = np.concatenate([idx, np.full(len(high_at_end), data.shape[1] - 1)])
+        pre = np.concatenate([pre, last[high_at_end]])
+        post = np.concatenate([post, np.zeros(len(high_at_end), dtype=np.int64)])
+        order = np.argsort(ch, kind='stable')
+        ch, idx, pre, post = ch[order], idx[order], pre[order], post[order]
+
+    onsets = post > pre
+    offsets = (onsets | (post == 0)) & (pre > 0)
+
+    # Position (dans la liste des changements) du dernier onset / offset de chaque voie
+    step = np.arange(len(ch))
+    last_onset = np.full(n_channels, -1)
+    last_offset = np.full(n_channels, -1)
+    np.maximum.at(last_onset, ch[onsets], step[onsets])
+    np.maximum.at(last_offset, ch[offsets], step[offsets])
+
+    orphan = (step == last_onset[ch]) & (last_onset[ch] > last_offset[ch])
+    keep = onsets & (last_offset[ch] >= 0) & ~orphan
+
+    events = np.column_stack([idx[keep] + 1 + first_samp, pre[keep], post[keep]])
+    bounds = np.searchsorted(ch[keep], np.arange(1, n_channels))
+    return np.split(events, bounds)
+
+
+def _merge_channels(channel_events: List[np.ndarray]) -> np.ndarray:
+    """Concatène les événements de plusieurs voies, retire les doublons et trie par temps (comme MNE)."""
+    events = np.concatenate(channel_events, axis=0)
+    rows = np.ascontiguousarray(events).view(np.dtype((np.void, events.dtype.itemsize * events.shape[1])))
+    _, idx = np.unique(rows, return_index=True)
+    if len(idx) < len(events):
+        warnings.warn(f"{len(events) - len(idx)} événements dupliqués entre voies ignorés")
+    events = events[idx]
+    return events[np.argsort(events[:, 0])]
+
+
+def channel_onsets(data, ch_names: List[str], first_samp: int = 0) -> Dict[str, np.ndarray]:
+    """
+    Fronts montants bruts de chaque voie (détection seule, sans étiquetage).
+
+    Returns:
+        {voie: tableau (n, 3) [échantillon, valeur avant, valeur après]}
+    """
+    return dict(zip(ch_names, find_onsets(data, first_samp, ch_names)))
+
+
+def label_events(onsets: Dict[str, np.ndarray], trigger_map: Dict) -> Dict[str, np.ndarray]:
+    """
+    Événements étiquetés de chaque type déclaré dans la table, à partir des fronts par voie.
+
+    Args:
+        onsets: Fronts par voie (channel_onsets ou load_channel_onsets)
+        trigger_map: Table retournée par load_trigger_map
+
+    Returns:
+        {nom: tableau (n, 3) [échantillon, valeur avant, event_id]}
+
+    Raises:
+        ValueError: voie absente de onsets, ou deux fronts d'une voie séparés
+            de moins de shortest_event échantillons (même contrôle que mne.find_events)
+    """
+    missing = [ch for ch in stim_channels(trigger_map) if ch not in onsets]
+    if missing:
+        raise ValueError(f"Voies de stimulation absentes : {missing}")
+
+    shortest_event = trigger_map['shortest_event']
+    for ch in stim_channels(trigger_map):
+        n_short_events = np.sum(np.diff(onsets[ch][:, 0]) < shortest_event)
+        if n_short_events > 0:
+            raise ValueError(f"{ch}: {n_short_events} événements plus courts que shortest_event={shortest_event}")
+
+    decoded = {}
+    for name, spec in trigger_map['events'].items():
+        channels = spec['channels']
+        events = onsets[channels[0]] if len(channels) == 1 else _merge_channels([onsets[ch] for ch in channels])
+        events = events.copy()
+        events[:, 2] = spec['event_id']
+        decoded[name] = events[1:] if spec['skip_first'] else events
+    return decoded
+
+
+def decode_triggers(data, ch_names: List[str], trigger_map: Dict, first_samp: int = 0) -> Dict[str, np.ndarray]:
+    """
+    Détection et étiquetage en un appel (channel_onsets puis label_events).
+
+    Args:
+        data: Bloc (n_voies, n_échantillons) des voies STI, ex. raw.get_data(picks=ch_names)
+        ch_names: Noms des lignes de data
+        trigger_map: Table retournée par load_trigger_map
+        first_samp: raw.first_samp, ajouté aux échantillons comme le fait MNE
+    """
+    return label_events(channel_onsets(data, ch_names, first_samp), trigger_map)
+
+
+# Cache des fronts détectés, un .npz par run. La clé couvre tout ce dont dépend la
+# détection (fichier, voies, version de l'algorithme) ; la table d'événements,
+# shortest_event et skip_first n'interviennent qu'à l'étiquetage et peuvent
+# changer sans relire le .fif.
+CACHE_VERSION = 1
+
+
+def detection_key(fif_file, channels: List[str]) -> str:
+    """Clé de cache : empreinte du .fif (nom, taille, mtime) et voies lues."""
+    stat = os.stat(fif_file)
+    payload = json.dumps({'version': CACHE_VERSION, 'file': os.path.basename(fif_file),
+                          'size': stat.st_size, 'mtime_ns': stat.st_mtime_ns, 'channels': list(channels)})
+    return hashlib.sha1(payload.encode()).hexdigest()
+
+
+def trigger_cache_file(cache_dir, bids_dir, fif_file) -> Path:
+    """Chemin du .npz d'un run : même arborescence que le .fif sous cache_dir."""
+    relative = Path(os.path.relpath(fif_file, bids_dir))
+    return Path(cache_dir) / relative.with_name(relative.stem + '_triggers.npz')
+
+
+def save_channel_onsets(path, key: str, onsets: Dict[str, np.ndarray], sfreq: float, first_samp: int) -> None:
+    """Écrit les fronts par voie, sfreq et first_samp dans un .npz compressé (écriture atomique)."""
+    path = Path(path)
+    path.parent.mkdir(parents=True, exist_ok=True)
+    arrays = {f'onsets_{i}': events for i, events in enumerate(onsets.values())}
+    tmp = path.with_name(f'.{path.stem}.tmp.npz')
+    try:
+        np.savez_compressed(tmp, key=np.array(key), channels=np.array(list(onsets)),
+                            sfreq=np.array(sfreq), first_samp=np.array(first_samp), **arrays)
+        os.replace(tmp, path)
+    finally:
+        if tmp.exists():
+            tmp.unlink()
+
+
+def load_channel_onsets(path, key: Optional[str] = None) -> Optional[Dict]:
+    """
+    Relit un .npz écrit par save_channel_onsets.
+
+    Returns:
+        {'onsets': {voie: tableau}, 'sfreq': float, 'first_samp': int}, ou None si
+        le fichier est absent, illisible ou d'une autre clé que `key`
+    """
+    try:
+        with np.load(path) as cache:
+            if key is not None and str(cache['key']) != key:
+                return None
+            channels = [str(ch) for ch in cache['channels']]
+            return {
+                'onsets': {ch: cache[f'onsets_{i}'] for i, ch in enumerate(channels)},
+                'sfreq': float(cache['sfreq']),
+                'first_samp': int(cache['first_samp']),
+            }
+    except (FileNotFoundError, OSError, KeyError, ValueError):
+        return None
@@ -1,10 +1,38 @@
 #!/usr/bin/env python3
+"""
+Conversion des fichiers EEG .fif en BIDS (mne-bids).
+
+Les fichiers FIF scindés (x.fif, x-1.fif, ...) sont traités comme un seul
+enregistrement, lu une seule fois par MNE à partir de sa première partie.
+
+En parallèle (--jobs), chaque processus écrit son enregistrement dans un BIDS
+temporaire privé; les fichiers sont ensuite déplacés un par un dans BIDS_ROOT
+par le processus principal, qui fusionne aussi les lignes de participants.tsv et
+des *_scans.tsv (fichiers partagés, sinon réécrits en même temps par plusieurs
+processus).
+
+Usage:
+    python 1-bidsify_eeg.py                      # mode interactif (confirmation + écrasement)
+    python 1-bidsify_eeg.py --yes --jobs 8       # sans interaction, 8 processus
+    python 1-bidsify_eeg.py --yes --overwrite    # réécrire les fichiers BIDS existants
+"""
+import argparse
+import csv
+import os
+import shutil
+import sys
+import time
+from concurrent.futures import ProcessPoolExecutor, as_completed
+
 import mne
 from mne_bids import write_raw_bids, BIDSPath
 from pathlib import Path
 import yaml
 import re
 
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent / '_utils'))
+from channel_mapping import load_channel_mapping, apply_channel_mapping
+
 # Charger la configuration
 with open('config.yaml', 'r') as f:
     config = yaml.safe_load(f)
@@ -14,6 +42,18 @@ RAW = Path(config['paths']['raw_root']) / config['paths']['raw_eeg']
 BIDS_ROOT = Path(config['paths']['bids_root'])
 TASK = config['experiment']['task']
 DATATYPE = config['bids']['datatype_eeg']
+# Renommage / types de canaux appliqués avant l'écriture BIDS
+CHANNEL_MAPPING = load_channel_mapping(config)
+
+# Format des données écrites par mne-bids: le FIF n'est conservé tel quel que pour
+# la MEG; pour l'EEG, mne-bids convertit en BrainVision (.vhdr/.vmrk/.eeg)
+BIDS_EXTENSION = '.fif' if DATATYPE == 'meg' else '.vhdr'
+
+# Parties d'un enregistrement FIF scindé: x.fif, x-1.fif, x-2.fif, ...
+SPLIT_PART_RE = re.compile(r'^(?P<base>.+)-(?P<part>\d+)\.fif$')
+
+# BIDS temporaires des processus workers (supprimé en fin de conversion)
+STAGING_DIR = BIDS_ROOT / '.bidsify_staging'
 
 
 def parse_fif_filename(filename):
@@ -23,13 +63,13 @@ def parse_fif_filename(filename):
     - su01_1_RS_C_0_eeg.fif -> RSC, run 0
     - su01_1_SHAM_1_baseline_pre_eeg.fif -> SHAM, run 1, baselinepre
     - su01_1_TACS_2_STIM_eeg.fif -> TACS, run 2, stim
-    
+
     Note: Les underscores ne sont pas autorisés dans les valeurs BIDS,
     donc RS_C devient RSC, baseline_pre devient baselinepre, etc.
     """
     # Enlever le * final et l'extension
     filename = filename.rstrip('*').replace('_eeg.fif', '')
-    
+
     # Pattern pour RS_C ou RS_O
     match_rs = re.match(r'su\d+_\d+_RS_([CO])_(\d+)', filename)
     if match_rs:
@@ -38,7 +78,7 @@ def parse_fif_filename(filename):
         run = match_rs.group(2)
         acquisition = None
         return condition, run, acquisition
-    
+
     # Pattern pour SHAM, TACS, TRNS
     match_stim = re.match(r'su\d+_\d+_(SHAM|TACS|TRNS)_(\d+)_(.+)', filename)
     if match_stim:
@@ -48,52 +88,136 @@ def parse_fif_filename(filename):
         # Remplacer les underscores par rien pour respecter BIDS
         acquisition = acquisition.replace('_', '')  # baseline_pre -> baselinepre
         return condition, run, acquisition
-    
+
     return None, None, None
 
-# Trouver tous les fichiers .fif
-fif_files = list(RAW.rglob('*.fif'))
-print(f"🔍 {len(fif_files)} fichiers .fif trouvés:")
-for f in fif_files:
-    print(f"  - {f}")
-print()
-
-# Demander confirmation à l'utilisateur
-response = input(f"⚠️  Voulez-vous continuer et convertir ces {len(fif_files)} fichiers en BIDS? (o/n): ")
-if response.lower() not in ['o', 'oui', 'y', 'yes']:
-    print("❌ Conversion annulée par l'utilisateur.")
-    exit(0)
-
-# Demander si on écrase les fichiers existants
-overwrite = False
-overwrite_response = input("🔄 Écraser les fichiers BIDS déjà existants? (o/n): ")
-if overwrite_response.lower() in ['o', 'oui', 'y', 'yes']:
-    overwrite = True
-
-print("\n🔄 Début de la conversion...")
-print()
-
-# Compteur de fichiers traités
-files_processed = 0
-files_failed = 0
-files_skipped = 0
-
-# Parcourir les fichiers .fif
-for fif_file in fif_files:
-    try:
+
+def group_split_fif(fif_files):
+    """
+    Regroupe les parties d'un enregistrement FIF scindé en un seul enregistrement.
+
+    x-1.fif, x-2.fif ne sont des parties que si x.fif existe dans le même dossier;
+    sinon ce sont des enregistrements indépendants.
+
+    Returns:
+        Liste de listes de Path, chaque liste commençant par le fichier de tête
+    """
+    fif_set = set(fif_files)
+    recordings = {}
+    for fif_file in fif_files:
+        match = SPLIT_PART_RE.match(fif_file.name)
+        head = fif_file.with_name(match.group('base') + '.fif') if match else None
+        if head is not None and head in fif_set:
+            recordings.setdefault(head, {})[int(match.group('part'))] = fif_file
+        else:
+            recordings.setdefault(fif_file, {})[0] = fif_file
+
+    return [[parts[k] for k in sorted(parts)] for _, parts in sorted(recordings.items())]
+
+
+def bids_data_outputs(data_path):
+    """Fichiers de données BIDS existants pour data_path (non scindé ou _split-XX)."""
+    stem = data_path.name[:-len(f'_{DATATYPE}{BIDS_EXTENSION}')]
+    outputs = sorted(data_path.parent.glob(f'{stem}_split-*_{DATATYPE}{BIDS_EXTENSION}'))
+    if data_path.exists() or data_path.is_symlink():
+        outputs.insert(0, data_path)
+    return outputs
+
+
+def _read_tsv(path):
+    with open(path, 'r', newline='', encoding='utf-8') as f:
+        rows = list(csv.reader(f, delimiter='\t'))
+    return rows[0], rows[1:]
+
+
+def merge_tsv(staged, target):
+    """
+    Fusionne les lignes d'un TSV BIDS écrit par un worker dans le TSV partagé.
+
+    Les lignes sont identifiées par la première colonne (participant_id, filename):
+    une nouvelle ligne est ajoutée, une ligne existante est mise à jour sans
+    remplacer une valeur connue par 'n/a'. Lignes triées par clé (comme mne-bids).
+    """
+    if not target.exists():
+        os.replace(staged, target)
+        return
+
+    header, rows = _read_tsv(staged)
+    target_header, target_rows = _read_tsv(target)
+    columns = target_header + [c for c in header if c not in target_header]
+    merged = {row[0]: dict(zip(target_header, row)) for row in target_rows}
+    for row in rows:
+        current = merged.setdefault(row[0], {})
+        current.update({k: v for k, v in zip(header, row) if v != 'n/a' or k not in current})
+
+    tmp = target.with_name(target.name + '.tmp')
+    with open(tmp, 'w', newline='', encoding='utf-8') as f:
+        writer = csv.writer(f, delimiter='\t', lineterminator='\n')
+        writer.writerow(columns)
+        writer.writerows([merged[key].get(c, 'n/a') for c in columns] for key in sorted(merged))
+    os.replace(tmp, target)
+
+
+def merge_staged_outputs(staging_root, bids_root):
+    """
+    Déplace dans bids_root les fichiers écrits par un worker dans staging_root.
+
+    participants.tsv et *_scans.tsv sont fusionnés ligne à ligne; les autres
+    fichiers du dataset (dataset_description.json, participants.json, README)
+    ne sont copiés que s'ils n'existent pas encore.
+    """
+    for path in sorted(staging_root.rglob('*')):
+        if path.is_dir():
+            continue
+        relative = path.relative_to(staging_root)
+        target = bids_root / relative
+        target.parent.mkdir(parents=True, exist_ok=True)
+        if path.name == 'participants.tsv' or path.name.endswith('_scans.tsv'):
+            merge_tsv(path, target)
+        elif len(relative.parts) == 1 and target.exists():
+            continue
+        else:
+            os.replace(path, target)
+    shutil.rmtree(staging_root)
+
+
+def ask_yes_no(question):
+    """Pose une question o/n à l'utilisateur."""
+    return input(question).lower() in ['o', 'oui', 'y', 'yes']
+
+
+def plan_conversions(recordings, overwrite):
+    """
+    Prépare les conversions sans lire aucune donnée MNE.
+
+    Le nom BIDS cible est calculé et testé ici, avant tout read_raw_fif,
+    pour que les fichiers déjà convertis ne coûtent qu'un stat.
+
+    Args:
+        recordings: Enregistrements (listes de parties) de group_split_fif
+        overwrite: Écraser les fichiers BIDS existants
+
+    Returns:
+        Tuple (jobs, skipped, failed) où jobs est trié par taille décroissante
+    """
+    jobs = []
+    skipped = []
+    failed = []
+
+    for parts in recordings:
+        fif_file = parts[0]
         # Extraire sub et ses depuis le chemin
-        parts = fif_file.parts
-        subject = parts[-3].replace('sub_', '')
-        session = parts[-2].replace('ses_', '')
-        
+        path_parts = fif_file.parts
+        subject = path_parts[-3].replace('sub_', '')
+        session = path_parts[-2].replace('ses_', '')
+
         # Parser le nom de fichier pour extraire condition, run et acquisition
         condition, run, acquisition = parse_fif_filename(fif_file.name)
-        
+
         if condition is None:
-            print(f"⚠️  {fif_file.name}: Format de nom non reconnu, ignoré")
-            files_failed += 1
+            failed.append({'file': fif_file, 'error': "Format de nom non reconnu, ignoré"})
             continue
-        
+
         # Créer BIDSPath avec les informations extraites
         bids_path = BIDSPath(
             subject=subject,
@@ -104,52 +228,194 @@ for fif_file in fif_files:
             datatype=DATATYPE,
             root=BIDS_ROOT
         )
-        
+
         # Vérifier si le fichier existe déjà
-        bids_file = bids_path.copy().update(suffix=DATATYPE, extension='.fif')
-        bids_file_path = bids_file.fpath
-        
-        if bids_file_path.exists() and not overwrite:
-            print(f"⏭️  {fif_file.name} (déjà existant)")
-            files_skipped += 1
+        bids_file_path = bids_path.copy().update(suffix=DATATYPE, extension=BIDS_EXTENSION).fpath
+        if bids_data_outputs(bids_file_path) and not overwrite:
+            skipped.append({'file': fif_file})
             continue
-        
-        # Lire raw
-        raw = mne.io.read_raw_fif(fif_file, preload=False)
-        
+
+        jobs.append({
+            'file': fif_file,
+            'parts': parts,
+            'size': sum(part.stat().st_size for part in parts),
+            'bids_path': bids_path,
+            'condition': condition,
+            'run': run,
+            'acquisition': acquisition,
+            'overwrite': overwrite,
+        })
+
+    # Les plus gros fichiers d'abord pour raccourcir la durée totale en parallèle
+    jobs.sort(key=lambda job: job['size'], reverse=True)
+    return jobs, skipped, failed
+
+
+def convert_fif(job):
+    """
+    Convertit un fichier .fif en BIDS. Exécutée dans un processus worker.
+
+    Si job['staging_root'] est donné, l'écriture se fait dans ce BIDS temporaire
+    (voir merge_staged_outputs) au lieu de BIDS_ROOT.
+
+    Returns:
+        Dictionnaire (file, ok, duration, message)
+    """
+    start = time.perf_counter()
+    try:
+        # Lire raw (en-têtes seulement, toutes les parties d'un fichier scindé)
+        raw = mne.io.read_raw_fif(job['file'], preload=False, verbose='ERROR')
+
+        # Types / noms de canaux (ex: accéléromètre X/Y/Z -> misc) directement dans raw.info
+        channel_changes = apply_channel_mapping(raw, CHANNEL_MAPPING)
+
         # Écrire en BIDS
-        write_raw_bids(raw, bids_path, overwrite=overwrite)
-        
-        # Afficher avec les détails
-        info_str = f"task={condition}, run={run}"
-        if acquisition:
-            info_str += f", acq={acquisition}"
-        print(f"✓ {fif_file.name} → {info_str}")
-        files_processed += 1
-        
+        bids_path = job['bids_path']
+        if job.get('staging_root'):
+            bids_path = bids_path.copy().update(root=job['staging_root'])
+        write_raw_bids(raw, bids_path, overwrite=job['overwrite'], verbose='ERROR')
+
+        info_str = f"task={job['condition']}, run={job['run']}"
+        if job['acquisition']:
+            info_str += f", acq={job['acquisition']}"
+        if len(job['parts']) > 1:
+            info_str += f", {len(job['parts'])} parties"
+        if channel_changes:
+            info_str += f", {sum(len(c) for c in channel_changes.values())} canaux modifiés"
+        return {'file': job['file'], 'ok': True, 'duration': time.perf_counter() - start, 'message': info_str}
+
     except Exception as e:
-        print(f"❌ Erreur avec {fif_file.name}: {e}")
-        files_failed += 1
-
-# Rapport final
-print()
-print("=" * 80)
-print("📊 RAPPORT FINAL")
-print("=" * 80)
-print(f"  Fichiers trouvés:   {len(fif_files)}")
-print(f"  Fichiers convertis: {files_processed} ✓")
-if files_skipped > 0:
-    print(f"  Fichiers ignorés:   {files_skipped} ⏭️")
-if files_failed > 0:
-    print(f"  Fichiers échoués:   {files_failed} ❌")
-print()
-
-if files_processed == len(fif_files):
-    print("✅ Tous les fichiers ont été convertis avec succès!")
-elif files_processed > 0:
-    print(f"⚠️  Conversion partielle: {files_processed}/{len(fif_files)} fichiers convertis.")
-else:
-    if files_skipped > 0:
-        print("ℹ️  Aucun nouveau fichier à convertir (tous déjà existants).")
+        return {'file': job['file'], 'ok': False, 'duration': time.perf_counter() - start, 'message': str(e)}
+
+
+def run_conversions(jobs, n_jobs):
+    """
+    Exécute les conversions en série (n_jobs=1) ou dans un pool de processus.
+
+    En parallèle, chaque job écrit dans son propre BIDS temporaire, fusionné
+    dans BIDS_ROOT par ce processus au fur et à mesure des résultats.
+    """
+    results = []
+
+    def report(result):
+        if result['ok']:
+            print(f"✓ {result['file'].name} → {result['message']} ({result['duration']:.1f}s)")
+        else:
+            print(f"❌ Erreur avec {result['file'].name}: {result['message']}")
+        results.append(result)
+
+    if n_jobs <= 1:
+        for job in jobs:
+            report(convert_fif(job))
+        return results
+
+    jobs = [dict(job, staging_root=STAGING_DIR / f'{i:04d}') for i, job in enumerate(jobs)]
+    try:
+        with ProcessPoolExecutor(max_workers=n_jobs) as executor:
+            # Soumission dans l'ordre des tailles décroissantes
+            futures = {executor.submit(convert_fif, job): job for job in jobs}
+            for future in as_completed(futures):
+                result = future.result()
+                if result['ok']:
+                    try:
+                        merge_staged_outputs(futures[future]['staging_root'], BIDS_ROOT)
+                    except OSError as e:
+                        result.update(ok=False, message=f"fusion dans {BIDS_ROOT}: {e}")
+                report(result)
+    finally:
+        shutil.rmtree(STAGING_DIR, ignore_errors=True)
+
+    return results
+
+
+def print_report(n_found, results, skipped, failed, wall_time):
+    """Affiche le rapport final avec les temps par fichier."""
+    converted = [r for r in results if r['ok']]
+    errors = [r for r in results if not r['ok']]
+    files_processed = len(converted)
+    files_failed = len(errors) + len(failed)
+
+    print()
+    print("=" * 80)
+    print("📊 RAPPORT FINAL")
+    print("=" * 80)
+    print(f"  Enregistrements trouvés:   {n_found}")
+    print(f"  Enregistrements convertis: {files_processed} ✓")
+    if skipped:
+        print(f"  Enregistrements ignorés:   {len(skipped)} ⏭️")
+    if files_failed > 0:
+        print(f"  Enregistrements échoués:   {files_failed} ❌")
+        for item in failed:
+            print(f"    - {item['file'].name}: {item['error']}")
+    print()
+
+    if results:
+        print("  ⏱️  Temps par fichier:")
+        for r in sorted(results, key=lambda r: r['duration'], reverse=True):
+            status = "✓" if r['ok'] else "❌"
+            print(f"    {status} {r['duration']:8.1f}s  {r['file'].name}")
+        cpu_time = sum(r['duration'] for r in results)
+        print(f"  Temps total: {wall_time:.1f}s (somme des conversions: {cpu_time:.1f}s)")
+        print()
+
+    if files_processed == n_found:
+        print("✅ Tous les fichiers ont été convertis avec succès!")
+    elif files_processed > 0:
+        print(f"⚠️  Conversion partielle: {files_processed}/{n_found} enregistrements convertis.")
     else:
-        print("❌ Aucun fichier n'a été converti.")
\ No newline at end of file
+        if skipped:
+            print("ℹ️  Aucun nouveau fichier à convertir (tous déjà existants).")
+        else:
+            print("❌ Aucun fichier n'a été converti.")
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Conversion des fichiers EEG .fif en BIDS")
+    parser.add_argument('--jobs', '-j', type=int, default=1,
+                        help="Nombre de processus de conversion (défaut: 1)")
+    parser.add_argument('--yes', '-y', action='store_true',
+                        help="Ne pas demander de confirmation avant la conversion")
+    overwrite_group = parser.add_mutually_exclusive_group()
+    overwrite_group.add_argument('--overwrite', dest='overwrite', action='store_true', default=None,
+                                 help="Écraser les fichiers BIDS déjà existants")
+    overwrite_group.add_argument('--no-overwrite', dest='overwrite', action='store_false',
+                                 help="Ignorer les fichiers BIDS déjà existants")
+    args = parser.parse_args()
+
+    # Trouver tous les fichiers .fif et regrouper les parties des fichiers scindés
+    fif_files = list(RAW.rglob('*.fif'))
+    recordings = group_split_fif(fif_files)
+    print(f"🔍 {len(fif_files)} fichiers .fif trouvés ({len(recordings)} enregistrements):")
+    for parts in recordings:
+        print(f"  - {parts[0]}")
+        for part in parts[1:]:
+            print(f"      + {part.name}")
+    print()
+
+    # Demander confirmation à l'utilisateur
+    if not args.yes and not ask_yes_no(
+            f"⚠️  Voulez-vous continuer et convertir ces {len(recordings)} enregistrements en BIDS? (o/n): "):
+        print("❌ Conversion annulée par l'utilisateur.")
+        exit(0)
+
+    # Demander si on écrase les fichiers existants
+    overwrite = args.overwrite
+    if overwrite is None:
+        overwrite = False if args.yes else ask_yes_no("🔄 Écraser les fichiers BIDS déjà existants? (o/n): ")
+
+    jobs, skipped, failed = plan_conversions(recordings, overwrite)
+    for item in skipped:
+        print(f"⏭️  {item['file'].name} (déjà existant)")
+    for item in failed:
+        print(f"⚠️  {item['file'].name}: {item['error']}")
+
+    print(f"\n🔄 Début de la conversion ({len(jobs)} enregistrements, {args.jobs} processus)...")
+    print()
+
+    start = time.perf_counter()
+    results = run_conversions(jobs, args.jobs)
+    print_report(len(recordings), results, skipped, failed, time.perf_counter() - start)
+
+
+if __name__ == '__main__':
+    main()
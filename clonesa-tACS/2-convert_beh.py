@@ -1,9 +1,34 @@
 #!/usr/bin/env python3
 """
 Conversion des fichiers de comportement en format BIDS
+
+Chaque CSV de RAW/bhv (sub_XX/ses_Y/sub_XX_CONDITION_RUN_...csv, cf. la
+grammaire de audit_behavior.py) devient:
+
+    sub-XX/ses-Y/beh/sub-XX_ses-Y_task-CONDITION_run-R_beh.tsv
+    sub-XX/ses-Y/beh/sub-XX_ses-Y_task-CONDITION_run-R_beh.json
+
+avec la même convention task=condition que 1-bidsify_eeg.py. Les lignes sont
+converties en flux (csv.reader -> TSV), fichier par fichier en parallèle, et les
+sorties plus récentes que leur source sont ignorées.
+
+Usage:
+    python 2-convert_beh.py                  # convertir ce qui n'est pas à jour
+    python 2-convert_beh.py --jobs 8         # 8 processus
+    python 2-convert_beh.py --overwrite      # tout reconvertir
 """
+import argparse
+import csv
+import json
+import os
+import time
+from concurrent.futures import ProcessPoolExecutor, as_completed
 from pathlib import Path
+
 import yaml
+from mne_bids import BIDSPath
+
+from audit_behavior import find_bhv_files, parse_bhv_path
 
 # Charger la configuration
 with open('config.yaml', 'r') as f:
@@ -15,12 +40,242 @@ BIDS_ROOT = Path(config['paths']['bids_root'])
 TASK = config['experiment']['task']
 CONDITIONS = config['experiment']['conditions']
 SESSIONS = config['experiment']['sessions']
+DATATYPE = config['bids']['datatype_beh']
+
+# Valeur BIDS pour une cellule vide
+NA = 'n/a'
+
+
+def bids_beh_path(info):
+    """BIDSPath du TSV de comportement pour un fichier parsé par parse_bhv_path."""
+    return BIDSPath(
+        subject=info['subject'].replace('sub_', ''),
+        session=info['session'].replace('ses_', ''),
+        task=info['condition'].upper(),  # même convention que l'EEG (SHAM, TACS, TRNS)
+        run=info['run'],
+        datatype=DATATYPE,
+        suffix='beh',
+        extension='.tsv',
+        root=BIDS_ROOT,
+    )
+
+
+def _clean_value(value):
+    """Cellule CSV -> cellule TSV (vide -> n/a, pas de tabulation ni retour à la ligne)."""
+    if value == '':
+        return NA
+    if '\t' in value or '\n' in value or '\r' in value:
+        value = ' '.join(value.split())
+    return value
+
+
+def _write_atomic(path, write):
+    """Appelle write(f) sur un fichier temporaire renommé en `path` à la fin."""
+    tmp = path.with_name(f'.{path.name}.tmp')
+    try:
+        with open(tmp, 'w', encoding='utf-8', newline='') as f:
+            write(f)
+        os.replace(tmp, path)
+    finally:
+        if tmp.exists():
+            tmp.unlink()
+
+
+def convert_csv_to_tsv(csv_file, tsv_file):
+    """
+    Convertit un CSV PsychoPy en TSV BIDS, ligne par ligne.
+
+    Les colonnes sans nom (virgule finale de PsychoPy) sont supprimées.
+
+    Returns:
+        Tuple (colonnes, nombre de lignes)
+    """
+    n_rows = 0
+    columns = []
+
+    def write(fout):
+        nonlocal n_rows, columns
+        with open(csv_file, 'r', encoding='utf-8-sig', newline='') as fin:
+            reader = csv.reader(fin)
+            header = next(reader, [])
+            keep = [i for i, name in enumerate(header) if name.strip()]
+            columns = [header[i].strip() for i in keep]
+            fout.write('\t'.join(columns) + '\n')
+
+            for row in reader:
+                if not any(row):
+                    continue
+                fout.write('\t'.join(_clean_value(row[i]) if i < len(row) else NA for i in keep) + '\n')
+                n_rows += 1
+
+    _write_atomic(tsv_file, write)
+    return columns, n_rows
+
+
+def write_sidecar(json_file, job, columns):
+    """Sidecar JSON: métadonnées de la tâche et liste des colonnes."""
+    sidecar = {
+        'TaskName': job['bids_path'].task,
+        'StimulationCondition': job['condition'],
+        'SourceFile': str(job['file'].relative_to(RAW_BHV)),
+    }
+    for column in columns:
+        sidecar[column] = {'Description': f"Colonne '{column}' du fichier PsychoPy d'origine"}
+
+    _write_atomic(json_file, lambda f: f.write(json.dumps(sidecar, indent=4, ensure_ascii=False) + '\n'))
+
+
+def is_up_to_date(csv_file, tsv_file, json_file):
+    """Sorties présentes et plus récentes que la source."""
+    try:
+        source_mtime = csv_file.stat().st_mtime_ns
+        return (tsv_file.stat().st_mtime_ns >= source_mtime
+                and json_file.stat().st_mtime_ns >= source_mtime)
+    except FileNotFoundError:
+        return False
+
+
+def plan_conversions(csv_files, overwrite):
+    """
+    Associe chaque CSV à sa sortie BIDS, sans lire les fichiers.
+
+    Returns:
+        Tuple (jobs, skipped, failed) où jobs est trié par taille décroissante
+    """
+    jobs = []
+    skipped = []
+    failed = []
+    by_output = {}
+
+    for csv_file in csv_files:
+        try:
+            info = parse_bhv_path(csv_file)
+        except ValueError as e:
+            failed.append({'file': csv_file, 'error': str(e)})
+            continue
+
+        if info['condition'] is None:
+            failed.append({'file': csv_file, 'error': "Format de nom non reconnu, ignoré"})
+            continue
+        if f"sub_{info['sub_num']}" != info['subject']:
+            failed.append({'file': csv_file, 'error': f"Incohérence sujet ({info['subject']} vs sub_{info['sub_num']})"})
+            continue
+
+        bids_path = bids_beh_path(info)
+        by_output.setdefault(bids_path.fpath, []).append((csv_file, info, bids_path))
+
+    for tsv_file, sources in sorted(by_output.items()):
+        # Plusieurs CSV pour un même run: on ne choisit pas à la place de l'utilisateur
+        if len(sources) > 1:
+            names = ', '.join(csv_file.name for csv_file, _, _ in sources)
+            for csv_file, _, _ in sources:
+                failed.append({'file': csv_file, 'error': f"Run dupliqué ({names})"})
+            continue
+
+        csv_file, info, bids_path = sources[0]
+        json_file = tsv_file.with_suffix('.json')
+        if not overwrite and is_up_to_date(csv_file, tsv_file, json_file):
+            skipped.append({'file': csv_file})
+            continue
+
+        jobs.append({
+            'file': csv_file,
+            'size': csv_file.stat().st_size,
+            'bids_path': bids_path,
+            'condition': info['condition'],
+            'run': info['run'],
+        })
+
+    # Les plus gros fichiers d'abord pour raccourcir la durée totale en parallèle
+    jobs.sort(key=lambda job: job['size'], reverse=True)
+    return jobs, skipped, failed
+
+
+def convert_beh(job):
+    """
+    Convertit un CSV de comportement en TSV + JSON BIDS. Exécutée dans un processus worker.
+
+    Returns:
+        Dictionnaire (file, ok, duration, message)
+    """
+    start = time.perf_counter()
+    try:
+        tsv_file = job['bids_path'].fpath
+        tsv_file.parent.mkdir(parents=True, exist_ok=True)
+
+        columns, n_rows = convert_csv_to_tsv(job['file'], tsv_file)
+        write_sidecar(tsv_file.with_suffix('.json'), job, columns)
+
+        message = f"{tsv_file.name} ({n_rows} lignes, {len(columns)} colonnes)"
+        return {'file': job['file'], 'ok': True, 'duration': time.perf_counter() - start, 'message': message}
+
+    except Exception as e:
+        return {'file': job['file'], 'ok': False, 'duration': time.perf_counter() - start, 'message': str(e)}
+
+
+def run_conversions(jobs, n_jobs):
+    """Exécute les conversions en série (n_jobs=1) ou dans un pool de processus."""
+    results = []
+
+    def report(result):
+        if result['ok']:
+            print(f"✓ {result['file'].name} → {result['message']} ({result['duration']:.2f}s)")
+        else:
+            print(f"❌ Erreur avec {result['file'].name}: {result['message']}")
+        results.append(result)
+
+    if n_jobs <= 1:
+        for job in jobs:
+            report(convert_beh(job))
+        return results
+
+    with ProcessPoolExecutor(max_workers=n_jobs) as executor:
+        futures = [executor.submit(convert_beh, job) for job in jobs]
+        for future in as_completed(futures):
+            report(future.result())
+
+    return results
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Conversion des fichiers de comportement en BIDS")
+    parser.add_argument('--jobs', '-j', type=int, default=1,
+                        help="Nombre de processus de conversion (défaut: 1)")
+    parser.add_argument('--overwrite', action='store_true',
+                        help="Reconvertir même les fichiers déjà à jour")
+    args = parser.parse_args()
+
+    print("=" * 80)
+    print("🔄 CONVERSION DES FICHIERS DE COMPORTEMENT EN BIDS")
+    print("=" * 80)
+    print(f"\n📂 Source: {RAW_BHV}")
+    print(f"📂 Destination: {BIDS_ROOT}")
+    print()
+
+    csv_files = find_bhv_files(RAW_BHV)
+    jobs, skipped, failed = plan_conversions(csv_files, args.overwrite)
+    print(f"🔍 {len(csv_files)} fichiers CSV trouvés: {len(jobs)} à convertir, "
+          f"{len(skipped)} à jour, {len(failed)} ignorés")
+    for item in failed:
+        print(f"⚠️  {item['file'].name}: {item['error']}")
+    print()
+
+    start = time.perf_counter()
+    results = run_conversions(jobs, args.jobs)
+    errors = [r for r in results if not r['ok']]
+
+    print()
+    print("=" * 80)
+    print("📊 RAPPORT FINAL")
+    print("=" * 80)
+    print(f"  Fichiers trouvés:   {len(csv_files)}")
+    print(f"  Fichiers convertis: {len(results) - len(errors)} ✓")
+    if skipped:
+        print(f"  Fichiers à jour:    {len(skipped)} ⏭️")
+    if errors or failed:
+        print(f"  Fichiers échoués:   {len(errors) + len(failed)} ❌")
+    print(f"  Temps total: {time.perf_counter() - start:.1f}s")
 
-print("=" * 80)
-print("🔄 CONVERSION DES FICHIERS DE COMPORTEMENT EN BIDS")
-print("=" * 80)
-print(f"\n📂 Source: {RAW_BHV}")
-print(f"📂 Destination: {BIDS_ROOT}")
-print()
 
-# TODO: Implémenter la conversion
\ No newline at end of file
+if __name__ == '__main__':
+    main()
@@ -1,59 +1,75 @@
-from pathlib import Path
-import pandas as pd
-
+#!/usr/bin/env python3
+"""
+Correction des channels.tsv du BIDS: les canaux accéléromètre X/Y/Z passent en 'misc'.
 
-from pathlib import Path
-import pandas as pd
+Les règles sont déclarées dans config.yaml (section channels_patch) et appliquées
+par tsv_patch.py en une seule passe sur tout le dataset.
 
+Les nouvelles conversions (1-bidsify_eeg.py) appliquent déjà ces types à l'écriture
+(section channels); ce script ne sert plus qu'aux datasets convertis avant.
 
-def patch_bids_channels(bids_root):
-    bids_root = Path(bids_root)
-
-    channels_files = list(bids_root.rglob("*_channels.tsv"))
-    print(f"🔍 {len(channels_files)} fichiers channels.tsv trouvés")
+Usage:
+    python 3-renameXYZ-channels.py --dry-run   # afficher le diff sans rien modifier
+    python 3-renameXYZ-channels.py --yes       # appliquer sans confirmation
+"""
+import argparse
+from pathlib import Path
 
-    files_to_modify = []
+import yaml
 
-    # Création de la liste de fichiers à modifier
-    for ch_file in channels_files:
-        df = pd.read_csv(ch_file, sep="\t")
+from tsv_patch import apply_tsv_patches, find_tsv_patches, load_rules, unified_diff
 
-        if "name" not in df.columns or "type" not in df.columns:
-            continue
+# Charger la configuration
+config_path = Path(__file__).parent / 'config.yaml'
+with open(config_path, 'r') as f:
+    config = yaml.safe_load(f)
 
-        mask = df["name"].isin(["X", "Y", "Z"])
+BIDS_ROOT = Path(config['paths']['bids_root'])
+PATCH_CONFIG = config['channels_patch']
 
-        if mask.any():
-            files_to_modify.append(ch_file)
 
-    # ✅ CHECK utilisateur ici (comme tu veux)
-    print("\n⚠️ FICHIERS QUI SERONT MODIFIÉS :")
-    for f in files_to_modify:
-        print(" -", f)
+def patch_bids_channels(bids_root, dry_run=False, yes=False, jobs=8):
+    bids_root = Path(bids_root)
+    rules = load_rules(PATCH_CONFIG['rules'])
 
-    print(f"\n➡️ Nombre de fichiers à modifier : {len(files_to_modify)}")
+    n_files, patches = find_tsv_patches(bids_root, PATCH_CONFIG['pattern'], rules, jobs=jobs)
+    print(f"🔍 {n_files} fichiers {PATCH_CONFIG['pattern']} trouvés")
 
-    if len(files_to_modify) == 0:
+    if len(patches) == 0:
         print("✅ Rien à modifier.")
         return
 
-    answer = input("\nConfirmer la modification ? (y/n) : ").strip().lower()
-
-    if answer != "y":
-        print("❌ Annulé par l'utilisateur.")
+    if dry_run:
+        for tsv_file, old_text, new_text in patches:
+            print(unified_diff(tsv_file, old_text, new_text, root=bids_root), end='')
+        print(f"\n➡️ Nombre de fichiers à modifier : {len(patches)} (dry-run, rien n'est écrit)")
         return
 
-    # Modification réelle
-    for ch_file in files_to_modify:
-        df = pd.read_csv(ch_file, sep="\t")
-        mask = df["name"].isin(["X", "Y", "Z"])
-        df.loc[mask, "type"] = "misc"
-        df.to_csv(ch_file, sep="\t", index=False)
-        print(f"💾 Modifié : {ch_file}")
+    print("\n⚠️ FICHIERS QUI SERONT MODIFIÉS :")
+    for tsv_file, _, _ in patches:
+        print(" -", tsv_file)
+
+    print(f"\n➡️ Nombre de fichiers à modifier : {len(patches)}")
+
+    if not yes:
+        answer = input("\nConfirmer la modification ? (y/n) : ").strip().lower()
+        if answer != "y":
+            print("❌ Annulé par l'utilisateur.")
+            return
+
+    # Modification réelle (seulement les fichiers qui changent)
+    apply_tsv_patches(patches, jobs=jobs)
+    print(f"💾 {len(patches)} fichiers modifiés")
 
     print("\n✅ Terminé.")
 
 
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description="Correction des channels.tsv du BIDS")
+    parser.add_argument('--bids-root', default=BIDS_ROOT, help="Racine BIDS (défaut: config.yaml)")
+    parser.add_argument('--dry-run', action='store_true', help="Afficher le diff sans modifier les fichiers")
+    parser.add_argument('--yes', '-y', action='store_true', help="Appliquer sans confirmation")
+    parser.add_argument('--jobs', '-j', type=int, default=8, help="Nombre de threads (défaut: 8)")
+    args = parser.parse_args()
 
-bids_path = "/network/iss/levy/raw/valerocabre/clonesatACS/Data/bids"
-patch_bids_channels(bids_path)
\ No newline at end of file
+    patch_bids_channels(args.bids_root, dry_run=args.dry_run, yes=args.yes, jobs=args.jobs)
@@ -1,11 +1,30 @@
 #!/usr/bin/env python3
 """
 Audit des fichiers de comportement dans RAW/bhv
+
+Le comptage des lignes se fait par un parcours binaire des fichiers (recherche
+des fins de ligne, sans DataFrame) dans un pool de threads. Les résultats sont
+mis en cache par empreinte de fichier (taille + date de modification): seuls les
+fichiers nouveaux ou modifiés sont relus d'une exécution à l'autre.
+
+La grille attendue sujet × session × condition × run vient de config.yaml
+(section experiment). Le résultat est aussi disponible sous forme de table
+(une ligne par case de la grille ou par fichier hors grille).
+
+Usage:
+    python audit_behavior.py                        # rapport lisible
+    python audit_behavior.py --output audit.tsv     # + table TSV/CSV (selon l'extension)
+    python audit_behavior.py --output -             # table TSV sur la sortie standard
 """
+import argparse
+import json
+import os
+import re
+import sys
+from concurrent.futures import ThreadPoolExecutor
 from pathlib import Path
-from collections import defaultdict
+
 import pandas as pd
-import re
 import yaml
 
 # Charger la configuration
@@ -20,171 +39,381 @@ RAW_BHV = Path(config['paths']['raw_root']) / config['paths']['raw_bhv']
 EXPECTED_CONDITIONS = config['experiment']['conditions']
 EXPECTED_SESSIONS = config['experiment']['sessions']
 EXPECTED_RUNS_PER_SESSION = config['experiment']['expected_runs_per_session']
+EXPECTED_RUNS = list(range(1, EXPECTED_RUNS_PER_SESSION + 1))
+
+# Paramètres de l'audit
+AUDIT_CONFIG = config.get('audit', {})
+MIN_ROWS = AUDIT_CONFIG.get('min_rows', 10)
+CACHE_PATH = Path(__file__).parent / AUDIT_CONFIG.get('cache_path', '.cache/audit_behavior.json')
+
+# Format: sub_XX_CONDITION_RUN_1_probe_min_FT-RSGT_YYYY_MMM_DD_HHMM.csv
+BHV_FILENAME_RE = re.compile(r'sub_(\d+)_(SHAM|tACS|tRNS)\s*_?\s*(\d+)_.*\.csv')
+
+# Colonnes de la table d'audit
+COLUMNS = ['subject', 'session', 'condition', 'run', 'status', 'relpath',
+           'size_bytes', 'n_rows', 'file_status']
+
+READ_CHUNK_SIZE = 1 << 20
 
-print("=" * 80)
-print("🔍 AUDIT DES FICHIERS DE COMPORTEMENT")
-print("=" * 80)
-print()
 
-# Statistiques globales
-total_files = 0
-subjects_data = defaultdict(lambda: defaultdict(lambda: defaultdict(list)))
-issues = []
+def parse_bhv_filename(filename):
+    """
+    Parse le nom d'un fichier de comportement.
 
-# Scanner tous les fichiers
-csv_files = list(RAW_BHV.rglob('*.csv'))
-total_files = len(csv_files)
+    Returns:
+        Tuple (sub_num, condition, run) ou None si le nom n'est pas parsable
+    """
+    # Enlever le * final qui peut apparaître
+    match = BHV_FILENAME_RE.match(filename.rstrip('*'))
+    if match is None:
+        return None
+    sub_num, condition, run = match.groups()
+    return sub_num, condition, int(run)
 
-print(f"📁 Nombre total de fichiers CSV: {total_files}")
-print()
 
-# Analyser chaque fichier
-for csv_file in sorted(csv_files):
+def parse_bhv_path(csv_file):
+    """
+    Extrait sujet/session (dossiers) et condition/run (nom de fichier) d'un CSV.
+
+    Returns:
+        Dictionnaire {subject, session, sub_num, condition, run}; sub_num,
+        condition et run valent None si le nom n'est pas parsable
+
+    Raises:
+        ValueError: si le chemin ne contient pas de dossier sub_XX/<session>
+    """
     parts = csv_file.parts
-    
-    # Extraire les informations du chemin
+    subject_idx = [i for i, p in enumerate(parts) if p.startswith('sub_')]
+    if not subject_idx or subject_idx[0] + 2 >= len(parts):
+        raise ValueError("dossier sub_XX/<session> introuvable dans le chemin")
+
+    parsed = parse_bhv_filename(csv_file.name)
+    sub_num, condition, run = parsed if parsed else (None, None, None)
+    return {
+        'subject': parts[subject_idx[0]],
+        'session': parts[subject_idx[0] + 1],
+        'sub_num': sub_num,
+        'condition': condition,
+        'run': run,
+    }
+
+
+def find_bhv_files(raw_bhv=RAW_BHV):
+    """Liste triée des CSV de comportement sous `raw_bhv`."""
+    return sorted(Path(raw_bhv).rglob('*.csv'))
+
+
+def file_fingerprint(path):
+    """Empreinte (taille, mtime en ns) utilisée comme clé de cache."""
+    stat = os.stat(path)
+    return [stat.st_size, stat.st_mtime_ns]
+
+
+def count_csv_rows(path, chunk_size=READ_CHUNK_SIZE):
+    """
+    Compte les lignes de données d'un CSV (hors en-tête) sans le parser.
+
+    Une dernière ligne sans fin de ligne est comptée. Un champ entre guillemets
+    contenant un retour à la ligne est compté comme plusieurs lignes.
+    """
+    n_newlines = 0
+    last_byte = b'\n'
+    with open(path, 'rb', buffering=0) as f:
+        while True:
+            chunk = f.read(chunk_size)
+            if not chunk:
+                break
+            n_newlines += chunk.count(b'\n')
+            last_byte = chunk[-1:]
+    n_lines = n_newlines + (last_byte != b'\n')
+    return max(n_lines - 1, 0)
+
+
+def load_cache(path=CACHE_PATH):
+    """Cache {chemin relatif: {fingerprint, n_rows, error}}; vide si absent ou illisible."""
+    try:
+        with open(path, 'r') as f:
+            return json.load(f)
+    except (OSError, ValueError):
+        return {}
+
+
+def save_cache(cache, path=CACHE_PATH):
+    path = Path(path)
+    path.parent.mkdir(parents=True, exist_ok=True)
+    tmp = path.with_name(path.name + '.tmp')
+    with open(tmp, 'w') as f:
+        json.dump(cache, f)
+    os.replace(tmp, path)
+
+
+def _scan_file(csv_file, relpath, cached):
+    """Compte les lignes d'un fichier, sauf si l'entrée de cache correspond à son empreinte."""
     try:
-        subject_idx = [i for i, p in enumerate(parts) if p.startswith('sub_')][0]
-        subject = parts[subject_idx]
-        session = parts[subject_idx + 1]
-        filename = csv_file.name
-        
-        # Parser le nom de fichier
-        # Format: sub_XX_CONDITION_RUN_1_probe_min_FT-RSGT_YYYY_MMM_DD_HHMM.csv
-        # Enlever le * final qui peut apparaître
-        filename_clean = filename.rstrip('*')
-        match = re.match(r'sub_(\d+)_(SHAM|tACS|tRNS)\s*_?\s*(\d+)_.*\.csv', filename_clean)
-        if match:
-            sub_num, condition, run = match.groups()
-            
-            # Vérifier la cohérence
-            if f'sub_{sub_num}' != subject:
-                issues.append(f"❌ {csv_file.relative_to(RAW_BHV)}: Incohérence sujet ({subject} vs sub_{sub_num})")
-            
-            # Stocker l'info
-            subjects_data[subject][session][condition].append({
-                'run': int(run),
-                'file': csv_file,
-                'filename': filename
-            })
-        else:
-            issues.append(f"⚠️  {csv_file.relative_to(RAW_BHV)}: Nom de fichier non parsable")
-            
-    except Exception as e:
-        issues.append(f"❌ {csv_file.relative_to(RAW_BHV)}: Erreur de parsing - {e}")
-
-# Rapport par sujet
-print("=" * 80)
-print("📊 RAPPORT PAR SUJET")
-print("=" * 80)
-print()
-
-for subject in sorted(subjects_data.keys()):
-    print(f"\n{'─' * 80}")
-    print(f"👤 {subject.upper()}")
-    print(f"{'─' * 80}")
-    
-    for session in EXPECTED_SESSIONS:
-        if session in subjects_data[subject]:
-            session_data = subjects_data[subject][session]
+        fingerprint = file_fingerprint(csv_file)
+    except OSError as e:
+        return relpath, {'fingerprint': None, 'n_rows': None, 'error': str(e)}
+
+    if cached and cached.get('fingerprint') == fingerprint:
+        return relpath, cached
+
+    try:
+        entry = {'fingerprint': fingerprint, 'n_rows': count_csv_rows(csv_file), 'error': None}
+    except OSError as e:
+        entry = {'fingerprint': fingerprint, 'n_rows': None, 'error': str(e)}
+    return relpath, entry
+
+
+def scan_files(csv_files, raw_bhv=RAW_BHV, jobs=8, use_cache=True):
+    """
+    Compte les lignes de tous les fichiers en parallèle, avec cache par empreinte.
+
+    Returns:
+        Tuple (dictionnaire {chemin relatif: entrée}, nombre de fichiers relus)
+    """
+    cache = load_cache() if use_cache else {}
+    relpaths = [str(f.relative_to(raw_bhv)) for f in csv_files]
+
+    with ThreadPoolExecutor(max_workers=jobs) as executor:
+        results = dict(executor.map(lambda args: _scan_file(*args),
+                                    [(f, rel, cache.get(rel)) for f, rel in zip(csv_files, relpaths)]))
+
+    n_scanned = sum(1 for rel, entry in results.items() if entry is not cache.get(rel))
+    if use_cache and n_scanned:
+        save_cache(results)
+    return results, n_scanned
+
+
+def _file_status(entry):
+    if entry['error']:
+        return 'unreadable'
+    if entry['n_rows'] == 0:
+        return 'empty'
+    if entry['n_rows'] < MIN_ROWS:
+        return 'short'
+    return 'ok'
+
+
+def build_file_table(csv_files, scan_results, raw_bhv=RAW_BHV):
+    """Une ligne par fichier: position dans la grille + résultat du comptage."""
+    rows = []
+    for csv_file in csv_files:
+        relpath = str(csv_file.relative_to(raw_bhv))
+        entry = scan_results[relpath]
+        row = {
+            'subject': None, 'session': None, 'condition': None, 'run': None,
+            'status': None, 'relpath': relpath,
+            'size_bytes': entry['fingerprint'][0] if entry['fingerprint'] else None,
+            'n_rows': entry['n_rows'],
+            'file_status': _file_status(entry),
+        }
+        try:
+            info = parse_bhv_path(csv_file)
+        except ValueError:
+            row['status'] = 'unparsable'
+            rows.append(row)
+            continue
+
+        row.update(subject=info['subject'], session=info['session'],
+                   condition=info['condition'], run=info['run'])
+        if info['condition'] is None:
+            row['status'] = 'unparsable'
+        elif f"sub_{info['sub_num']}" != info['subject']:
+            row['status'] = 'subject_mismatch'
+        rows.append(row)
+    return pd.DataFrame(rows, columns=COLUMNS)
+
+
+def build_audit_table(files):
+    """
+    Confronte les fichiers à la grille attendue sujet × session × condition × run.
+
+    Statuts: ok, missing, duplicate, extra (hors grille), unparsable,
+    subject_mismatch. Les sujets considérés sont ceux présents dans les données.
+
+    Returns:
+        DataFrame (colonnes COLUMNS): une ligne par case de la grille et par fichier
+    """
+    keys = ['subject', 'session', 'condition', 'run']
+    placed = files[files['status'].isna()].astype({'run': 'int64'})
+    other = files[files['status'].notna()]
+
+    subjects = sorted(placed['subject'].unique())
+    grid = pd.MultiIndex.from_product(
+        [subjects, EXPECTED_SESSIONS, EXPECTED_CONDITIONS, EXPECTED_RUNS],
+        names=keys).to_frame(index=False)
+
+    table = grid.merge(placed.drop(columns='status'), on=keys, how='outer', indicator=True)
+    n_per_cell = table.groupby(keys)['relpath'].transform('count')
+    table['status'] = 'ok'
+    table.loc[table['_merge'] == 'left_only', 'status'] = 'missing'
+    table.loc[table['_merge'] == 'right_only', 'status'] = 'extra'
+    table.loc[(table['_merge'] == 'both') & (n_per_cell > 1), 'status'] = 'duplicate'
+
+    table = pd.concat([table.drop(columns='_merge'), other], ignore_index=True)
+    table['run'] = table['run'].astype('Int64')
+    table['size_bytes'] = table['size_bytes'].astype('Int64')
+    table['n_rows'] = table['n_rows'].astype('Int64')
+    return table[COLUMNS].sort_values(keys + ['relpath'], na_position='last', ignore_index=True)
+
+
+def run_audit(raw_bhv=RAW_BHV, jobs=8, use_cache=True):
+    """
+    Audit complet de RAW/bhv.
+
+    Returns:
+        Tuple (table d'audit, nombre de fichiers, nombre de fichiers relus)
+    """
+    csv_files = find_bhv_files(raw_bhv)
+    scan_results, n_scanned = scan_files(csv_files, raw_bhv, jobs=jobs, use_cache=use_cache)
+    files = build_file_table(csv_files, scan_results, raw_bhv)
+    return build_audit_table(files), len(csv_files), n_scanned
+
+
+def save_table(table, output):
+    """Écrit la table en TSV (défaut, ou '-' pour la sortie standard) ou CSV selon l'extension."""
+    if output == '-':
+        table.to_csv(sys.stdout, sep='\t', index=False)
+        return
+    output = Path(output)
+    output.parent.mkdir(parents=True, exist_ok=True)
+    sep = ',' if output.suffix == '.csv' else '\t'
+    table.to_csv(output, sep=sep, index=False)
+
+
+def print_report(table, n_files, n_scanned):
+    print("=" * 80)
+    print("🔍 AUDIT DES FICHIERS DE COMPORTEMENT")
+    print("=" * 80)
+    print()
+    print(f"📁 Nombre total de fichiers CSV: {n_files} ({n_scanned} relus, {n_files - n_scanned} depuis le cache)")
+    print()
+
+    issues = []
+    for row in table[table['status'] == 'unparsable'].itertuples():
+        issues.append(f"⚠️  {row.relpath}: Nom de fichier non parsable")
+    for row in table[table['status'] == 'subject_mismatch'].itertuples():
+        issues.append(f"❌ {row.relpath}: Incohérence sujet ({row.subject})")
+
+    # Rapport par sujet
+    print("=" * 80)
+    print("📊 RAPPORT PAR SUJET")
+    print("=" * 80)
+    print()
+
+    in_grid = table[table['status'].isin(['ok', 'missing', 'duplicate', 'extra'])]
+    for subject, subject_rows in in_grid.groupby('subject', sort=True):
+        print(f"\n{'─' * 80}")
+        print(f"👤 {subject.upper()}")
+        print(f"{'─' * 80}")
+
+        for session in EXPECTED_SESSIONS:
+            session_rows = subject_rows[subject_rows['session'] == session]
+            if session_rows['relpath'].isna().all():
+                print(f"\n  ❌ {session}: SESSION MANQUANTE")
+                issues.append(f"❌ {subject}: Session {session} complètement manquante")
+                continue
+
             print(f"\n  📅 {session}")
-            
             for condition in EXPECTED_CONDITIONS:
-                if condition in session_data:
-                    runs = sorted(session_data[condition], key=lambda x: x['run'])
-                    run_nums = [r['run'] for r in runs]
-                    
-                    # Vérifier les runs
-                    expected_runs = list(range(1, 5))
-                    missing_runs = set(expected_runs) - set(run_nums)
-                    extra_runs = set(run_nums) - set(expected_runs)
-                    
-                    status = "✓" if len(runs) == 4 and not missing_runs and not extra_runs else "⚠️ "
-                    print(f"    {status} {condition:6s}: {len(runs)} fichiers (runs: {run_nums})")
-                    
-                    if missing_runs:
-                        issues.append(f"⚠️  {subject}/{session}/{condition}: Runs manquants {sorted(missing_runs)}")
-                    if extra_runs:
-                        issues.append(f"⚠️  {subject}/{session}/{condition}: Runs supplémentaires {sorted(extra_runs)}")
-                    
-                    # Vérifier les doublons
-                    if len(run_nums) != len(set(run_nums)):
-                        duplicates = [r for r in run_nums if run_nums.count(r) > 1]
-                        issues.append(f"❌ {subject}/{session}/{condition}: Runs dupliqués {set(duplicates)}")
-                else:
+                rows = session_rows[session_rows['condition'] == condition]
+                present = rows[rows['relpath'].notna()]
+                if present.empty:
                     print(f"    ❌ {condition:6s}: MANQUANT")
                     issues.append(f"❌ {subject}/{session}: Condition {condition} complètement manquante")
-        else:
-            print(f"\n  ❌ {session}: SESSION MANQUANTE")
-            issues.append(f"❌ {subject}: Session {session} complètement manquante")
-
-# Résumé des statistiques
-print("\n" + "=" * 80)
-print("📈 STATISTIQUES GLOBALES")
-print("=" * 80)
-
-total_subjects = len(subjects_data)
-print(f"\n  Nombre de sujets: {total_subjects}")
-print(f"  Nombre de fichiers CSV: {total_files}")
-
-# Compter les fichiers attendus
-expected_files = total_subjects * 2 * 3 * 4  # subjects * sessions * conditions * runs
-print(f"  Fichiers attendus: {expected_files} ({total_subjects} sujets × 2 sessions × 3 conditions × 4 runs)")
-print(f"  Différence: {total_files - expected_files}")
-
-# Vérifier l'intégrité de chaque fichier
-print("\n" + "=" * 80)
-print("🔬 VÉRIFICATION DE L'INTÉGRITÉ DES FICHIERS")
-print("=" * 80)
-print()
-
-corrupted_files = []
-file_sizes = []
-
-for csv_file in csv_files:
-    try:
-        # Essayer de lire le fichier
-        df = pd.read_csv(csv_file)
-        file_size = csv_file.stat().st_size
-        file_sizes.append(file_size)
-        
-        # Vérifications basiques
-        if len(df) == 0:
-            corrupted_files.append(f"⚠️  {csv_file.name}: Fichier vide")
-        elif len(df) < 10:
-            corrupted_files.append(f"⚠️  {csv_file.name}: Très peu de lignes ({len(df)})")
-            
-    except Exception as e:
-        corrupted_files.append(f"❌ {csv_file.name}: Erreur de lecture - {str(e)[:50]}")
-
-if corrupted_files:
-    print("Fichiers problématiques:")
-    for issue in corrupted_files:
-        print(f"  {issue}")
-else:
-    print("✓ Tous les fichiers peuvent être lus correctement")
-
-if file_sizes:
-    import numpy as np
-    print(f"\nTailles des fichiers:")
-    print(f"  Min: {min(file_sizes):,} octets")
-    print(f"  Max: {max(file_sizes):,} octets")
-    print(f"  Moyenne: {np.mean(file_sizes):,.0f} octets")
-    print(f"  Médiane: {np.median(file_sizes):,.0f} octets")
-
-# Rapport des problèmes
-print("\n" + "=" * 80)
-print("🚨 PROBLÈMES DÉTECTÉS")
-print("=" * 80)
-print()
-
-if issues:
-    print(f"Nombre total de problèmes: {len(issues)}\n")
-    for issue in issues:
-        print(f"  {issue}")
-else:
-    print("✓ Aucun problème détecté! 🎉")
-
-print("\n" + "=" * 80)
-print("FIN DE L'AUDIT")
-print("=" * 80)
+                    continue
+
+                run_nums = sorted(present['run'].tolist())
+                missing_runs = sorted(rows.loc[rows['status'] == 'missing', 'run'].tolist())
+                extra_runs = sorted(set(rows.loc[rows['status'] == 'extra', 'run'].tolist()))
+                duplicates = sorted(set(rows.loc[rows['status'] == 'duplicate', 'run'].tolist()))
+
+                ok = not missing_runs and not extra_runs and not duplicates
+                status = "✓" if ok else "⚠️ "
+                print(f"    {status} {condition:6s}: {len(present)} fichiers (runs: {run_nums})")
+
+                if missing_runs:
+                    issues.append(f"⚠️  {subject}/{session}/{condition}: Runs manquants {missing_runs}")
+                if extra_runs:
+                    issues.append(f"⚠️  {subject}/{session}/{condition}: Runs supplémentaires {extra_runs}")
+                if duplicates:
+                    issues.append(f"❌ {subject}/{session}/{condition}: Runs dupliqués {set(duplicates)}")
+
+    # Résumé des statistiques
+    print("\n" + "=" * 80)
+    print("📈 STATISTIQUES GLOBALES")
+    print("=" * 80)
+
+    total_subjects = in_grid['subject'].nunique()
+    n_sessions, n_conditions = len(EXPECTED_SESSIONS), len(EXPECTED_CONDITIONS)
+    expected_files = total_subjects * n_sessions * n_conditions * EXPECTED_RUNS_PER_SESSION
+    print(f"\n  Nombre de sujets: {total_subjects}")
+    print(f"  Nombre de fichiers CSV: {n_files}")
+    print(f"  Fichiers attendus: {expected_files} ({total_subjects} sujets × {n_sessions} sessions × "
+          f"{n_conditions} conditions × {EXPECTED_RUNS_PER_SESSION} runs)")
+    print(f"  Différence: {n_files - expected_files}")
+
+    # Vérifier l'intégrité de chaque fichier
+    print("\n" + "=" * 80)
+    print("🔬 VÉRIFICATION DE L'INTÉGRITÉ DES FICHIERS")
+    print("=" * 80)
+    print()
+
+    files = table[table['relpath'].notna()]
+    problems = files[files['file_status'] != 'ok']
+    if not problems.empty:
+        print("Fichiers problématiques:")
+        for row in problems.itertuples():
+            name = Path(row.relpath).name
+            if row.file_status == 'unreadable':
+                print(f"  ❌ {name}: Erreur de lecture")
+            elif row.file_status == 'empty':
+                print(f"  ⚠️  {name}: Fichier vide")
+            else:
+                print(f"  ⚠️  {name}: Très peu de lignes ({row.n_rows})")
+    else:
+        print("✓ Tous les fichiers peuvent être lus correctement")
+
+    sizes = files['size_bytes'].dropna()
+    if not sizes.empty:
+        print(f"\nTailles des fichiers:")
+        print(f"  Min: {sizes.min():,} octets")
+        print(f"  Max: {sizes.max():,} octets")
+        print(f"  Moyenne: {sizes.mean():,.0f} octets")
+        print(f"  Médiane: {sizes.median():,.0f} octets")
+
+    # Rapport des problèmes
+    print("\n" + "=" * 80)
+    print("🚨 PROBLÈMES DÉTECTÉS")
+    print("=" * 80)
+    print()
+
+    if issues:
+        print(f"Nombre total de problèmes: {len(issues)}\n")
+        for issue in issues:
+            print(f"  {issue}")
+    else:
+        print("✓ Aucun problème détecté! 🎉")
+
+    print("\n" + "=" * 80)
+    print("FIN DE L'AUDIT")
+    print("=" * 80)
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description="Audit des fichiers de comportement dans RAW/bhv")
+    parser.add_argument('--raw-bhv', default=RAW_BHV, type=Path, help="Dossier RAW/bhv (défaut: config.yaml)")
+    parser.add_argument('--output', '-o', help="Écrire la table d'audit (.tsv, .csv, ou '-' pour stdout)")
+    parser.add_argument('--jobs', '-j', type=int, default=8, help="Nombre de threads de lecture (défaut: 8)")
+    parser.add_argument('--no-cache', action='store_true', help="Ignorer le cache et relire tous les fichiers")
+    args = parser.parse_args()
+
+    table, n_files, n_scanned = run_audit(args.raw_bhv, jobs=args.jobs, use_cache=not args.no_cache)
+
+    if args.output == '-':
+        save_table(table, '-')
+    else:
+        print_report(table, n_files, n_scanned)
+        if args.output:
+            save_table(table, args.output)
+            print(f"\n💾 Table d'audit: {args.output}")
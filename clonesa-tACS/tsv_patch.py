@@ -0,0 +1,148 @@
+#!/usr/bin/env python3
+"""
+Moteur de correction des fichiers TSV BIDS (channels.tsv, events.tsv, ...)
+à partir de règles déclaratives.
+
+Une règle associe des valeurs de colonnes à reconnaître et des valeurs à écrire:
+
+    rules:
+      - match: {name: [X, Y, Z]}
+        set: {type: misc}
+
+Les fichiers sont lus avec un simple parseur de lignes (pas de pandas), en
+parallèle, et seuls les fichiers modifiés sont réécrits (fichier temporaire
+puis renommage atomique).
+"""
+import difflib
+import os
+import tempfile
+from concurrent.futures import ThreadPoolExecutor
+from pathlib import Path
+
+
+class TSVRule:
+    """Règle de correction: si toutes les colonnes de `match` correspondent, appliquer `assign`."""
+
+    def __init__(self, match, assign):
+        # Une valeur simple ou une liste de valeurs acceptées par colonne
+        self.match = {col: {str(v) for v in (vals if isinstance(vals, (list, tuple, set)) else [vals])}
+                      for col, vals in match.items()}
+        self.assign = {col: str(val) for col, val in assign.items()}
+
+    def columns(self):
+        return set(self.match) | set(self.assign)
+
+    def __repr__(self):
+        return f"TSVRule(match={self.match}, set={self.assign})"
+
+
+def load_rules(rules_config):
+    """Construit les règles depuis la configuration YAML (liste de {match, set})."""
+    return [TSVRule(rule['match'], rule['set']) for rule in rules_config]
+
+
+def patch_tsv_text(text, rules):
+    """
+    Applique les règles au contenu d'un fichier TSV.
+
+    Les fins de ligne et les colonnes non concernées sont conservées telles quelles.
+
+    Returns:
+        Nouveau contenu, ou None si aucune ligne n'est modifiée
+    """
+    lines = text.splitlines(keepends=True)
+    if not lines:
+        return None
+
+    header = lines[0].rstrip('\r\n').split('\t')
+    col_index = {col: i for i, col in enumerate(header)}
+    # Règles applicables à ce fichier (toutes leurs colonnes présentes)
+    active = [rule for rule in rules if rule.columns() <= col_index.keys()]
+    if not active:
+        return None
+
+    changed = False
+    for i in range(1, len(lines)):
+        line = lines[i]
+        content = line.rstrip('\r\n')
+        if not content:
+            continue
+        ending = line[len(content):]
+        fields = content.split('\t')
+
+        new_fields = None
+        for rule in active:
+            if all(col_index[col] < len(fields) and fields[col_index[col]] in values
+                   for col, values in rule.match.items()):
+                for col, value in rule.assign.items():
+                    idx = col_index[col]
+                    if idx < len(fields) and fields[idx] != value:
+                        new_fields = new_fields or list(fields)
+                        new_fields[idx] = value
+
+        if new_fields is not None:
+            lines[i] = '\t'.join(new_fields) + ending
+            changed = True
+
+    return ''.join(lines) if changed else None
+
+
+def scan_tsv_file(tsv_file, rules):
+    """
+    Lit un fichier et calcule son contenu corrigé.
+
+    Returns:
+        Tuple (tsv_file, ancien contenu, nouveau contenu), nouveau contenu None si inchangé
+    """
+    with open(tsv_file, 'r', encoding='utf-8', newline='') as f:
+        text = f.read()
+    return tsv_file, text, patch_tsv_text(text, rules)
+
+
+def write_atomic(path, text):
+    """Écrit `text` dans un fichier temporaire du même dossier puis le renomme en `path`."""
+    path = Path(path)
+    fd, tmp = tempfile.mkstemp(dir=path.parent, prefix=f'.{path.name}.', suffix='.tmp')
+    try:
+        with os.fdopen(fd, 'w', encoding='utf-8', newline='') as f:
+            f.write(text)
+        os.chmod(tmp, path.stat().st_mode & 0o777)
+        os.replace(tmp, path)
+    except BaseException:
+        if os.path.exists(tmp):
+            os.unlink(tmp)
+        raise
+
+
+def unified_diff(tsv_file, old_text, new_text, root=None):
+    """Diff unifié entre l'ancien et le nouveau contenu d'un fichier."""
+    name = str(Path(tsv_file).relative_to(root)) if root else str(tsv_file)
+    return ''.join(difflib.unified_diff(
+        old_text.splitlines(keepends=True), new_text.splitlines(keepends=True),
+        fromfile=f'a/{name}', tofile=f'b/{name}'))
+
+
+def find_tsv_patches(root, pattern, rules, jobs=8):
+    """
+    Parcourt `root` et retourne les fichiers à modifier.
+
+    Args:
+        root: Racine du dataset
+        pattern: Motif des fichiers (ex: '*_channels.tsv')
+        rules: Liste de TSVRule
+        jobs: Nombre de threads de lecture
+
+    Returns:
+        Tuple (nombre de fichiers lus, liste de (fichier, ancien contenu, nouveau contenu))
+    """
+    tsv_files = sorted(Path(root).rglob(pattern))
+    with ThreadPoolExecutor(max_workers=jobs) as executor:
+        results = executor.map(lambda f: scan_tsv_file(f, rules), tsv_files)
+        patches = [(f, old, new) for f, old, new in results if new is not None]
+    return len(tsv_files), patches
+
+
+def apply_tsv_patches(patches, jobs=8):
+    """Réécrit les fichiers modifiés (écriture atomique, en parallèle)."""
+    with ThreadPoolExecutor(max_workers=jobs) as executor:
+        list(executor.map(lambda p: write_atomic(p[0], p[2]), patches))
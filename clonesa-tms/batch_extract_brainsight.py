@@ -0,0 +1,376 @@
+#!/usr/bin/env python3
+"""
+Extract every Brainsight project of the study into one dataset-level TMS table.
+
+Finds all .bsproj files under the brainsight-TMS tree, extracts them in
+parallel (one process per project) with BrainsightExtractor, and writes:
+  - <output>/brainsight_samples.parquet/  Parquet dataset partitioned by subject
+  - <output>/sub-<label>/sub-<label>_tms.tsv  one TSV per subject (all sessions)
+  - <output>/brainsight_target_summary.tsv  coil geometry statistics per target
+
+Each sample carries its coil-to-target distance and normal angle; the summary
+adds the drift of the coil position over the session (see coil_geometry).
+
+Subject and session come from the project folder (CLONESA_<subject>_<session>).
+
+Runs are incremental: <output>/brainsight_state.json keeps, per project, the
+highest ZINDEX and creation date already exported. Unchanged projects are not
+opened, grown projects only have their new samples (ZINDEX > last) read and
+appended to the Parquet dataset and TSVs. --full rebuilds everything.
+
+Usage:
+    python batch_extract_brainsight.py
+    python batch_extract_brainsight.py --root /path/to/brainsight-TMS --jobs 8
+    python batch_extract_brainsight.py --full
+"""
+
+import argparse
+import json
+import os
+import re
+import shutil
+import sys
+import time
+from concurrent.futures import ProcessPoolExecutor, as_completed
+from pathlib import Path
+from typing import Dict, List, Optional, Tuple
+
+import numpy as np
+import pandas as pd
+import pyarrow as pa
+import pyarrow.dataset as ds
+
+from extract_brainsight_targets import (
+    BrainsightExtractor, SAMPLE_FIELDS, coil_geometry, fill_target_matrices, sample_arrays_from_rows,
+)
+
+DEFAULT_ROOT = Path('/Volumes/levy/raw/valerocabre/clonesa/Data/ClonesaTMS/brainsight-TMS')
+
+# Project folder: CLONESA_002_0001 -> subject 002, session 0001
+PROJECT_FOLDER_RE = re.compile(r'^CLONESA_(?P<subject>\d+)_(?P<session>\d+)$', re.IGNORECASE)
+
+# Full 4x4 coil transform, row-major (m0n0..m2n2 match the Brainsight rotation columns)
+TRANSFORM_COLUMNS = [f'm{i}n{j}' for i in range(4) for j in range(4)]
+
+DATASET_NAME = 'brainsight_samples.parquet'
+STATE_NAME = 'brainsight_state.json'
+SUMMARY_NAME = 'brainsight_target_summary.tsv'
+
+# Columns of the Parquet dataset needed for the per-target summary
+SUMMARY_INPUT_COLUMNS = ['subject', 'session', 'project', 'target_name', 'index',
+                         'm0n3', 'm1n3', 'm2n3', 'target_distance', 'normal_angle']
+
+
+def find_projects(root: Path) -> List[Path]:
+    """All .bsproj files under `root`, sorted."""
+    return sorted(Path(root).rglob('*.bsproj'))
+
+
+def parse_project_folder(bsproj_path: Path) -> Dict[str, Optional[str]]:
+    """
+    Subject and session labels from the project folder name.
+
+    Falls back to the alphanumeric folder name as subject (no session)
+    when the folder does not follow CLONESA_<subject>_<session>.
+    """
+    folder = bsproj_path.parent.name
+    match = PROJECT_FOLDER_RE.match(folder)
+    if match:
+        return {'subject': match.group('subject'), 'session': match.group('session')}
+    return {'subject': re.sub(r'[^a-zA-Z0-9]', '', folder), 'session': None}
+
+
+def extract_project(bsproj_path: Path, since_index: Optional[int] = None) -> pd.DataFrame:
+    """
+    Extract the samples of one project as a flat table (one row per sample).
+
+    Args:
+        bsproj_path: Project to read
+        since_index: Only read samples with ZINDEX > since_index
+
+    Returns:
+        DataFrame with columns subject, session, project, SAMPLE_FIELDS, m0n0..m3n3
+    """
+    labels = parse_project_folder(bsproj_path)
+    extractor = BrainsightExtractor(bsproj_path)
+    try:
+        target_nodes = extractor.target_node_matrices()
+        tables = [_samples_table(chunk, labels, bsproj_path.stem, target_nodes)
+                  for chunk in extractor.iter_sample_chunks(since_index=since_index)]
+    finally:
+        extractor.close()
+
+    if not tables:
+        return _samples_table(sample_arrays_from_rows([]), labels, bsproj_path.stem, target_nodes)
+    return pd.concat(tables, ignore_index=True)
+
+
+def _samples_table(arrays: Dict, labels: Dict[str, Optional[str]], project: str,
+                   target_nodes: Dict) -> pd.DataFrame:
+    """Flat table for one chunk of decoded samples, with coil-to-target geometry."""
+    n_samples = len(arrays['index'])
+    data = {
+        'subject': [labels['subject']] * n_samples,
+        'session': [labels['session']] * n_samples,
+        'project': [project] * n_samples,
+    }
+    for field, _ in SAMPLE_FIELDS:
+        data[field] = arrays[field]
+    matrices = arrays['matrix'].reshape(n_samples, 16)
+    for k, column in enumerate(TRANSFORM_COLUMNS):
+        data[column] = matrices[:, k]
+    target_matrix = fill_target_matrices(arrays['target_matrix'], arrays['target_name'], target_nodes)
+    data.update(coil_geometry(arrays['matrix'], target_matrix))
+
+    table = pd.DataFrame(data)
+    table['index'] = pd.to_numeric(table['index'], errors='coerce').astype('Int64')
+    for field in ('power_a', 'power_b'):
+        table[field] = pd.to_numeric(table[field], errors='coerce')
+    table['creation_date'] = pd.to_numeric(table['creation_date'], errors='coerce')
+    for field in ('name', 'target_name', 'uuid'):
+        table[field] = table[field].astype('string')
+    return table
+
+
+def _extract_job(job: Dict) -> Dict:
+    """Worker: extract one project (new samples only if job['since_index']), never raises."""
+    start = time.perf_counter()
+    try:
+        table = extract_project(job['file'], job['since_index'])
+        new = ' new' if job['since_index'] is not None else ''
+        return {**job, 'ok': True, 'table': table,
+                'duration': time.perf_counter() - start, 'message': f"{len(table)}{new} samples"}
+    except Exception as e:
+        return {**job, 'ok': False, 'table': None,
+                'duration': time.perf_counter() - start, 'message': str(e)}
+
+
+def load_state(output_dir: Path) -> Dict[str, Dict]:
+    """Per-project export state {relative path: {...}}; empty if absent or unreadable."""
+    try:
+        with open(output_dir / STATE_NAME) as f:
+            return json.load(f)
+    except (OSError, ValueError):
+        return {}
+
+
+def save_state(state: Dict[str, Dict], output_dir: Path) -> None:
+    tmp = output_dir / (STATE_NAME + '.tmp')
+    with open(tmp, 'w') as f:
+        json.dump(state, f, indent=2, sort_keys=True)
+    os.replace(tmp, output_dir / STATE_NAME)
+
+
+def plan_extractions(projects: List[Path], root: Path, state: Dict[str, Dict]) -> Tuple[List[Dict], int]:
+    """
+    Decide what to read for each project from the previous export state.
+
+    Returns:
+        Tuple (jobs, number of unchanged projects skipped); each job is
+        {'file', 'key', 'size', 'mtime_ns', 'since_index'}
+    """
+    jobs = []
+    n_unchanged = 0
+    for project in projects:
+        key = str(project.relative_to(root))
+        stat = project.stat()
+        previous = state.get(key)
+        if previous and previous['size'] == stat.st_size and previous['mtime_ns'] == stat.st_mtime_ns:
+            n_unchanged += 1
+            continue
+        jobs.append({'file': project, 'key': key, 'size': stat.st_size, 'mtime_ns': stat.st_mtime_ns,
+                     'since_index': previous['last_index'] if previous else None})
+    return jobs, n_unchanged
+
+
+def update_state(state: Dict[str, Dict], result: Dict) -> None:
+    """Record what was exported for a successfully extracted project."""
+    table = result['table']
+    previous = state.get(result['key'], {})
+    entry = {
+        'size': result['size'],
+        'mtime_ns': result['mtime_ns'],
+        'last_index': previous.get('last_index'),
+        'last_creation_date': previous.get('last_creation_date'),
+        'n_samples': previous.get('n_samples', 0) + len(table),
+    }
+    if len(table):
+        entry['last_index'] = int(table['index'].max())
+        entry['last_creation_date'] = float(table['creation_date'].max())
+    state[result['key']] = entry
+
+
+def extract_all(jobs: List[Dict], n_jobs: int) -> List[Dict]:
+    """Extract projects in series (n_jobs=1) or in a process pool, largest first."""
+    jobs = sorted(jobs, key=lambda job: job['size'], reverse=True)
+    results = []
+
+    def report(result):
+        status = "✓" if result['ok'] else "❌"
+        print(f"{status} {result['file'].name}: {result['message']} ({result['duration']:.1f}s)")
+        results.append(result)
+
+    if n_jobs <= 1:
+        for job in jobs:
+            report(_extract_job(job))
+        return results
+
+    with ProcessPoolExecutor(max_workers=n_jobs) as executor:
+        futures = [executor.submit(_extract_job, job) for job in jobs]
+        for future in as_completed(futures):
+            report(future.result())
+    return results
+
+
+def write_dataset_description(output_dir: Path) -> None:
+    """Minimal BIDS derivatives dataset_description.json (kept if already present)."""
+    description = output_dir / 'dataset_description.json'
+    if description.exists():
+        return
+    with open(description, 'w') as f:
+        json.dump({
+            'Name': 'Brainsight TMS coil positions',
+            'BIDSVersion': '1.8.0',
+            'DatasetType': 'derivative',
+            'GeneratedBy': [{'Name': 'batch_extract_brainsight.py'}],
+        }, f, indent=4)
+
+
+def write_outputs(table: pd.DataFrame, output_dir: Path, append: bool = False) -> None:
+    """
+    Write the partitioned Parquet dataset and one TSV per subject.
+
+    With `append`, rows are added to the existing outputs (new Parquet files in
+    the subject partitions, rows appended to the TSVs); otherwise both are
+    rewritten from `table`.
+    """
+    output_dir.mkdir(parents=True, exist_ok=True)
+    write_dataset_description(output_dir)
+
+    dataset_dir = output_dir / DATASET_NAME
+    if not append:
+        # Rewritten as a whole: stale partitions of removed projects must not survive
+        if dataset_dir.exists():
+            shutil.rmtree(dataset_dir)
+        for old_tsv in output_dir.glob('sub-*/sub-*_tms.tsv'):
+            old_tsv.unlink()
+    if table.empty:
+        return
+    table.to_parquet(dataset_dir, partition_cols=['subject'], index=False)
+
+    for subject, subject_table in table.groupby('subject', sort=True):
+        subject_dir = output_dir / f'sub-{subject}'
+        subject_dir.mkdir(exist_ok=True)
+        tsv_file = subject_dir / f'sub-{subject}_tms.tsv'
+        exists = tsv_file.exists()
+        subject_table.drop(columns='subject').to_csv(
+            tsv_file, sep='\t', index=False, na_rep='n/a', float_format='%.9f',
+            mode='a' if exists else 'w', header=not exists)
+
+
+def target_summary(samples: pd.DataFrame) -> pd.DataFrame:
+    """
+    Coil geometry statistics per (subject, session, project, target).
+
+    drift is the distance of each sample from the first sample aimed at the
+    same target in the project (samples ordered by ZINDEX); drift_final is
+    that distance for the last sample.
+    """
+    keys = ['subject', 'session', 'project', 'target_name']
+    samples = samples.sort_values(keys + ['index'], ignore_index=True)
+    groups = samples.groupby(keys, dropna=False, sort=False, observed=True)
+
+    position = samples[['m0n3', 'm1n3', 'm2n3']].to_numpy(dtype=float)
+    first = groups[['m0n3', 'm1n3', 'm2n3']].transform('first').to_numpy(dtype=float)
+    samples['drift'] = np.linalg.norm(position - first, axis=1)
+
+    groups = samples.groupby(keys, dropna=False, sort=True, observed=True)
+    return groups.agg(
+        n_samples=('index', 'size'),
+        distance_mean=('target_distance', 'mean'),
+        distance_median=('target_distance', 'median'),
+        distance_std=('target_distance', 'std'),
+        distance_max=('target_distance', 'max'),
+        angle_mean=('normal_angle', 'mean'),
+        angle_median=('normal_angle', 'median'),
+        angle_max=('normal_angle', 'max'),
+        drift_final=('drift', 'last'),
+        drift_max=('drift', 'max'),
+    ).reset_index()
+
+
+def write_target_summary(output_dir: Path) -> pd.DataFrame:
+    """Recompute the per-target summary from the whole Parquet dataset (needed columns only)."""
+    # Keep subject labels as strings ('002', not 2) when reading the partitions back
+    partitioning = ds.partitioning(pa.schema([('subject', pa.string())]), flavor='hive')
+    samples = pd.read_parquet(output_dir / DATASET_NAME, columns=SUMMARY_INPUT_COLUMNS,
+                              partitioning=partitioning)
+    summary = target_summary(samples)
+    summary.to_csv(output_dir / SUMMARY_NAME, sep='\t', index=False, na_rep='n/a', float_format='%.3f')
+    return summary
+
+
+def main():
+    parser = argparse.ArgumentParser(
+        description='Extract all Brainsight projects into a dataset-level TMS table'
+    )
+    parser.add_argument('--root', type=Path, default=DEFAULT_ROOT,
+                        help=f'brainsight-TMS folder to search for .bsproj files (default: {DEFAULT_ROOT})')
+    parser.add_argument('--output-dir', type=Path,
+                        help='Output folder (default: <root>/../derivatives/brainsight)')
+    parser.add_argument('--jobs', '-j', type=int, default=4,
+                        help='Number of extraction processes (default: 4)')
+    parser.add_argument('--full', action='store_true',
+                        help='Ignore the export state and rebuild all outputs')
+    args = parser.parse_args()
+
+    output_dir = args.output_dir or args.root.parent / 'derivatives' / 'brainsight'
+
+    projects = find_projects(args.root)
+    print(f"Found {len(projects)} .bsproj files under {args.root}")
+    if not projects:
+        sys.exit(1)
+
+    # Without an existing dataset there is nothing to append to
+    full = args.full or not (output_dir / DATASET_NAME).exists()
+    state = {} if full else load_state(output_dir)
+    jobs, n_unchanged = plan_extractions(projects, args.root, state)
+    if n_unchanged:
+        print(f"  {n_unchanged} unchanged projects skipped")
+
+    start = time.perf_counter()
+    results = extract_all(jobs, args.jobs)
+    succeeded = [r for r in results if r['ok']]
+    failed = [r for r in results if not r['ok']]
+
+    if succeeded or full:
+        tables = [r['table'] for r in succeeded]
+        table = pd.concat(tables, ignore_index=True) if tables else pd.DataFrame()
+        if not table.empty:
+            table = table.sort_values(['subject', 'session', 'project', 'index'], ignore_index=True)
+        write_outputs(table, output_dir, append=not full)
+
+        # State saved only once the rows it describes are written
+        for result in succeeded:
+            update_state(state, result)
+        save_state(state, output_dir)
+
+        if (output_dir / DATASET_NAME).exists():
+            summary = write_target_summary(output_dir)
+            print(f"✓ Target summary ({len(summary)} targets): {output_dir / SUMMARY_NAME}")
+
+        mode = "rebuilt" if full else "appended"
+        n_subjects = table['subject'].nunique() if not table.empty else 0
+        print(f"\n✓ {len(table)} samples from {len(succeeded)} projects "
+              f"({n_subjects} subjects) {mode} in: {output_dir}")
+
+    print(f"  Total time: {time.perf_counter() - start:.1f}s")
+    if failed:
+        print(f"\n❌ {len(failed)} projects failed:", file=sys.stderr)
+        for r in failed:
+            print(f"  - {r['file']}: {r['message']}", file=sys.stderr)
+        sys.exit(1)
+
+
+if __name__ == '__main__':
+    main()
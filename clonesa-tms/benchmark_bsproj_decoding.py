@@ -0,0 +1,143 @@
+#!/usr/bin/env python3
+"""
+Benchmark of Brainsight position-blob decoding on a synthetic .bsproj.
+
+Builds a project with the same ZSAMPLE / ZTARGETNODE layout as Brainsight
+(NSKeyedArchiver binary plists holding a 4x4 float64 matrix at $objects[2])
+and compares:
+  - plistlib: plistlib.loads + struct.unpack for every blob (previous code)
+  - direct:   binary plist walk + one numpy.frombuffer (decode_transforms)
+
+Usage:
+    python benchmark_bsproj_decoding.py                 # 100k samples
+    python benchmark_bsproj_decoding.py --samples 20000 --keep synthetic.bsproj
+"""
+
+import argparse
+import plistlib
+import sqlite3
+import struct
+import tempfile
+import time
+from pathlib import Path
+
+import numpy as np
+
+from extract_brainsight_targets import (
+    BrainsightExtractor, decode_transforms, _plistlib_transform_payload,
+)
+
+
+def _position_blob(matrix: np.ndarray) -> bytes:
+    """Serialize a 4x4 matrix like Brainsight (NSKeyedArchiver binary plist)."""
+    return plistlib.dumps({
+        '$version': 100000,
+        '$archiver': 'NSKeyedArchiver',
+        '$top': {'root': plistlib.UID(1)},
+        '$objects': [
+            '$null',
+            {'$class': plistlib.UID(3), 'transformData': plistlib.UID(2)},
+            struct.pack('<16d', *matrix.ravel()),
+            {'$classname': 'BSTransform', '$classes': ['BSTransform', 'NSObject']},
+        ],
+    }, fmt=plistlib.FMT_BINARY)
+
+
+def make_synthetic_bsproj(path: Path, n_samples: int, n_targets: int = 3, seed: int = 0) -> None:
+    """
+    Write a synthetic .bsproj: n_targets targets and n_samples samples spread
+    around them (random in-plane rotation, ~1 mm position jitter).
+    """
+    rng = np.random.default_rng(seed)
+    conn = sqlite3.connect(path)
+    conn.executescript("""
+        DROP TABLE IF EXISTS ZTARGETNODE;
+        DROP TABLE IF EXISTS ZSAMPLE;
+        CREATE TABLE ZTARGETNODE (Z_PK INTEGER PRIMARY KEY, ZNAME TEXT, ZPOSITION BLOB,
+                                  ZTRANSFORM BLOB, ZTYPE INTEGER, ZINDEXX INTEGER, ZINDEXY INTEGER);
+        CREATE TABLE ZSAMPLE (Z_PK INTEGER PRIMARY KEY, ZINDEX INTEGER, ZNAME TEXT, ZPOSITION BLOB,
+                              ZTARGETPOSITION BLOB, ZTARGETNAME TEXT, ZUUID TEXT, ZCREATIONDATE REAL,
+                              ZSTIMULATORPOWERA INTEGER, ZSTIMULATORPOWERB INTEGER);
+    """)
+
+    targets = []
+    for t in range(n_targets):
+        matrix = np.eye(4)
+        matrix[:3, 3] = rng.normal(scale=50, size=3)
+        targets.append((matrix, _position_blob(matrix)))
+        conn.execute("INSERT INTO ZTARGETNODE VALUES (?, ?, ?, NULL, 1, ?, 0)",
+                     (t + 1, f"Target {t + 1}", targets[-1][1], t))
+
+    angles = rng.normal(scale=0.1, size=n_samples)
+    jitter = rng.normal(size=(n_samples, 3))
+    rows = []
+    for i in range(n_samples):
+        target_matrix, target_blob = targets[i % n_targets]
+        c, s = np.cos(angles[i]), np.sin(angles[i])
+        matrix = np.eye(4)
+        matrix[:3, :3] = [[c, -s, 0], [s, c, 0], [0, 0, 1]]
+        matrix[:3, 3] = target_matrix[:3, 3] + jitter[i]
+        rows.append((i + 1, i, f"Sample {i + 1}", _position_blob(matrix), target_blob,
+                     f"Target {i % n_targets + 1}", f"uuid-{i}", 7e8 + i, 60, None))
+    conn.executemany("INSERT INTO ZSAMPLE VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?)", rows)
+    conn.commit()
+    conn.close()
+
+
+def decode_plistlib(blobs) -> np.ndarray:
+    """Previous per-row path: plistlib.loads + struct.unpack, one blob at a time."""
+    matrices = np.full((len(blobs), 4, 4), np.nan)
+    for i, blob in enumerate(blobs):
+        payload = _plistlib_transform_payload(blob) if blob else None
+        if payload is not None:
+            matrices[i] = np.array(struct.unpack('<16d', payload)).reshape(4, 4)
+    return matrices
+
+
+def _best_of(func, repeat):
+    best, result = float('inf'), None
+    for _ in range(repeat):
+        start = time.perf_counter()
+        result = func()
+        best = min(best, time.perf_counter() - start)
+    return best, result
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Benchmark Brainsight position-blob decoding')
+    parser.add_argument('--samples', type=int, default=100_000, help='Number of synthetic samples (default: 100000)')
+    parser.add_argument('--repeat', type=int, default=3, help='Timing repetitions, best kept (default: 3)')
+    parser.add_argument('--keep', help='Keep the synthetic .bsproj at this path')
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as tmp:
+        bsproj = Path(args.keep) if args.keep else Path(tmp) / 'synthetic.bsproj'
+        start = time.perf_counter()
+        make_synthetic_bsproj(bsproj, args.samples)
+        print(f"Synthetic project: {args.samples} samples ({time.perf_counter() - start:.1f}s to build)")
+
+        conn = sqlite3.connect(bsproj)
+        blobs = [row[0] for row in conn.execute("SELECT ZPOSITION FROM ZSAMPLE ORDER BY ZINDEX")]
+        conn.close()
+
+        t_plistlib, reference = _best_of(lambda: decode_plistlib(blobs), args.repeat)
+        t_direct, matrices = _best_of(lambda: decode_transforms(blobs), args.repeat)
+        assert np.array_equal(reference, matrices), "decoders disagree"
+
+        print(f"  plistlib + struct : {t_plistlib:8.3f}s  ({args.samples / t_plistlib:12,.0f} blobs/s)")
+        print(f"  direct + frombuffer: {t_direct:8.3f}s  ({args.samples / t_direct:12,.0f} blobs/s)")
+        print(f"  speedup           : {t_plistlib / t_direct:8.1f}x")
+
+        def end_to_end():
+            extractor = BrainsightExtractor(bsproj)
+            arrays = extractor.extract_sample_arrays()
+            extractor.close()
+            return arrays
+
+        t_total, arrays = _best_of(end_to_end, args.repeat)
+        print(f"  extract_sample_arrays (query + decode, positions and targets): {t_total:.3f}s")
+        assert len(arrays['matrix']) == args.samples
+
+
+if __name__ == '__main__':
+    main()
@@ -9,7 +9,7 @@ import plistlib
 import struct
 import argparse
 from pathlib import Path
-from typing import List, Dict, Tuple, Optional
+from typing import Any, Callable, Iterator, List, Dict, Tuple, Optional
 import sys
 
 try:
@@ -17,23 +17,348 @@ try:
 except ImportError:
     np = None
 
+try:
+    import pandas as pd
+except ImportError:
+    pd = None
+
+# Size of a serialized 4x4 float64 transform (16 little-endian doubles)
+TRANSFORM_SIZE = 16 * 8
+
+# Rotation columns of the Brainsight text exports
+MATRIX_COLUMNS = [f'm{i}n{j}' for i in range(3) for j in range(3)]
+
+# Binary plist layout (see CFBinaryPList.c): header, objects, offset table, 32-byte trailer
+BPLIST_HEADER = b'bplist00'
+BPLIST_TRAILER = struct.Struct('>6xBBQQQ')
+OBJECTS_KEY = b'$objects'
+
+# Scalar ZSAMPLE columns kept as per-sample arrays (name in output, SQL column)
+SAMPLE_FIELDS = [
+    ('index', 'ZINDEX'),
+    ('name', 'ZNAME'),
+    ('target_name', 'ZTARGETNAME'),
+    ('uuid', 'ZUUID'),
+    ('creation_date', 'ZCREATIONDATE'),
+    ('power_a', 'ZSTIMULATORPOWERA'),
+    ('power_b', 'ZSTIMULATORPOWERB'),
+]
+
+# Arrays stored per sample; the others are views derived from them
+_BASE_SAMPLE_KEYS = [field for field, _ in SAMPLE_FIELDS] + ['matrix', 'target_matrix']
+
+# SQLite tuning for read-only access over network shares
+MMAP_SIZE = 256 * 1024 * 1024   # bytes memory-mapped instead of read() calls
+CACHE_SIZE_KIB = 64 * 1024      # page cache (negative PRAGMA value = KiB)
+FETCH_CHUNK_SIZE = 10_000       # rows per fetchmany / decoded chunk
+
+SAMPLE_QUERY = """
+SELECT 
+    ZINDEX,
+    ZNAME,
+    ZPOSITION,
+    ZTARGETPOSITION,
+    ZTARGETNAME,
+    ZUUID,
+    ZCREATIONDATE,
+    ZSTIMULATORPOWERA,
+    ZSTIMULATORPOWERB
+FROM ZSAMPLE
+WHERE ZPOSITION IS NOT NULL{since}
+ORDER BY ZINDEX ASC
+"""
+
+
+def _format_rows(row_format: str, columns: List[list]) -> str:
+    """Format column lists into one text block, one `row_format` line per row."""
+    return ''.join([row_format % row for row in zip(*columns)])
+
+
+def _bplist_length(data: bytes, pos: int) -> Tuple[int, int]:
+    """
+    Read the length of the container/data object starting at `pos`.
+
+    Returns:
+        (length, offset of the object content)
+    """
+    length = data[pos] & 0x0F
+    if length != 0x0F:
+        return length, pos + 1
+    # Length >= 15 is stored as a following int object (marker 0x1n, 2**n bytes)
+    int_marker = data[pos + 1]
+    if int_marker >> 4 != 0x1:
+        raise ValueError("invalid length marker")
+    size = 1 << (int_marker & 0x0F)
+    return int.from_bytes(data[pos + 2:pos + 2 + size], 'big'), pos + 2 + size
+
+
+def _bplist_transform_payload(blob_data: bytes) -> Optional[bytes]:
+    """
+    Slice `$objects[2]` out of a binary plist without building Python objects.
+
+    Walks trailer -> offset table -> top dict -> `$objects` array -> data object.
+
+    Returns:
+        The 128-byte payload, or None if the blob does not have the expected layout
+    """
+    if len(blob_data) < len(BPLIST_HEADER) + BPLIST_TRAILER.size or not blob_data.startswith(BPLIST_HEADER):
+        return None
+    offset_size, ref_size, _, top_object, table_offset = BPLIST_TRAILER.unpack_from(
+        blob_data, len(blob_data) - BPLIST_TRAILER.size)
+
+    def object_offset(ref: int) -> int:
+        pos = table_offset + ref * offset_size
+        return int.from_bytes(blob_data[pos:pos + offset_size], 'big')
+
+    def ref_at(pos: int, k: int) -> int:
+        return int.from_bytes(blob_data[pos + k * ref_size:pos + (k + 1) * ref_size], 'big')
+
+    # Top object: dict (marker 0xDn), n key refs followed by n value refs
+    pos = object_offset(top_object)
+    if blob_data[pos] >> 4 != 0xD:
+        return None
+    n_keys, refs = _bplist_length(blob_data, pos)
+
+    for k in range(n_keys):
+        key_pos = object_offset(ref_at(refs, k))
+        # ASCII string of length 8 (marker 0x58)
+        if blob_data[key_pos] != 0x50 | len(OBJECTS_KEY) or \
+                blob_data[key_pos + 1:key_pos + 1 + len(OBJECTS_KEY)] != OBJECTS_KEY:
+            continue
+
+        # $objects: array (marker 0xAn)
+        array_pos = object_offset(ref_at(refs, n_keys + k))
+        if blob_data[array_pos] >> 4 != 0xA:
+            return None
+        n_items, items = _bplist_length(blob_data, array_pos)
+        if n_items < 3:
+            return None
+
+        # $objects[2]: data (marker 0x4n)
+        data_pos = object_offset(ref_at(items, 2))
+        if blob_data[data_pos] >> 4 != 0x4:
+            return None
+        size, start = _bplist_length(blob_data, data_pos)
+        if size != TRANSFORM_SIZE:
+            return None
+        return blob_data[start:start + size]
+
+    return None
+
+
+def _plistlib_transform_payload(blob_data: bytes) -> Optional[bytes]:
+    """Same as _bplist_transform_payload, through a full plistlib.loads."""
+    try:
+        payload = plistlib.loads(blob_data)['$objects'][2]
+    except Exception:
+        return None
+    if not isinstance(payload, bytes) or len(payload) != TRANSFORM_SIZE:
+        return None
+    return payload
+
+
+def transform_payload(blob_data: Optional[bytes]) -> Optional[bytes]:
+    """
+    Return the raw 128-byte transformData of a position blob.
+
+    Position blobs are NSKeyedArchiver plists whose `$objects[2]` holds the
+    4x4 matrix as 16 little-endian doubles (row-major). The binary plist is
+    read directly; anything unexpected goes through plistlib instead.
+
+    Returns:
+        The 128 bytes, or None if the blob is empty or not in that format
+    """
+    if not blob_data:
+        return None
+    try:
+        payload = _bplist_transform_payload(blob_data)
+    except (IndexError, ValueError, struct.error):
+        payload = None
+    if payload is not None:
+        return payload
+    return _plistlib_transform_payload(blob_data)
+
+
+def decode_transforms(blobs: List[Optional[bytes]]) -> 'np.ndarray':
+    """
+    Decode position blobs in one batch.
+
+    The payloads are concatenated and read with a single numpy.frombuffer.
+    Identical blobs are decoded once.
+
+    Returns:
+        (N, 4, 4) float64 array; rows whose blob cannot be decoded are NaN
+    """
+    if np is None:
+        raise ImportError("numpy is required to decode transforms in batch")
+
+    # Target blobs are repeated for every sample of a target: decode each distinct blob once
+    unique = {}
+    payloads = [unique[blob] if blob in unique else unique.setdefault(blob, transform_payload(blob))
+                for blob in blobs]
+    valid = np.fromiter((p is not None for p in payloads), dtype=bool, count=len(payloads))
+
+    matrices = np.full((len(payloads), 4, 4), np.nan)
+    if valid.any():
+        buffer = b''.join(p for p in payloads if p is not None)
+        matrices[valid] = np.frombuffer(buffer, dtype='<f8').reshape(-1, 4, 4)
+    return matrices
+
+
+def _with_derived_arrays(arrays: Dict[str, 'np.ndarray']) -> Dict[str, 'np.ndarray']:
+    """Add position / rotation / axis views of the matrix and target_matrix arrays."""
+    arrays['position'] = arrays['matrix'][:, :3, 3]
+    arrays['target_position'] = arrays['target_matrix'][:, :3, 3]
+    arrays['rotation'] = arrays['matrix'][:, :3, :3]
+    arrays['x_axis'] = arrays['rotation'][:, :, 0]
+    arrays['y_axis'] = arrays['rotation'][:, :, 1]
+    arrays['normal'] = arrays['rotation'][:, :, 2]
+    return arrays
+
+
+def sample_arrays_from_rows(rows: List[Tuple]) -> Dict[str, 'np.ndarray']:
+    """Column arrays (see BrainsightExtractor.extract_sample_arrays) from SAMPLE_QUERY rows."""
+    columns = list(zip(*rows)) if rows else [()] * 9
+    zindex, name, zposition, ztargetposition, target_name, uuid, creation_date, power_a, power_b = columns
+    values = dict(zip([field for field, _ in SAMPLE_FIELDS],
+                      [zindex, name, target_name, uuid, creation_date, power_a, power_b]))
+
+    arrays = {field: np.array(values[field], dtype=object) for field, _ in SAMPLE_FIELDS}
+    arrays['matrix'] = decode_transforms(zposition)
+    arrays['target_matrix'] = decode_transforms(ztargetposition)
+    return _with_derived_arrays(arrays)
+
+
+def fill_target_matrices(target_matrix: 'np.ndarray', target_names: 'np.ndarray',
+                         target_nodes: Dict[str, 'np.ndarray']) -> 'np.ndarray':
+    """
+    Replace undecodable sample target transforms (NaN rows) by the transform of
+    the ZTARGETNODE with the same name, when there is one.
+
+    Returns:
+        New (N, 4, 4) array
+    """
+    filled = target_matrix.copy()
+    missing = np.isnan(target_matrix).any(axis=(1, 2))
+    if not missing.any() or not target_nodes:
+        return filled
+
+    names = list(target_nodes)
+    lookup = {name: k for k, name in enumerate(names)}
+    codes = np.array([lookup.get(name, -1) for name in target_names[missing]], dtype=int)
+    node_matrices = np.concatenate([np.stack([target_nodes[name] for name in names]),
+                                    np.full((1, 4, 4), np.nan)])
+    filled[missing] = node_matrices[codes]  # -1 -> NaN row
+    return filled
+
+
+def coil_geometry(matrix: 'np.ndarray', target_matrix: 'np.ndarray') -> Dict[str, 'np.ndarray']:
+    """
+    Per-sample coil / target geometry, vectorized over (N, 4, 4) transforms.
+
+    Returns:
+        - target_distance: distance between coil and target positions (mm)
+        - normal_angle: angle between coil and target normals (third rotation
+          column), in degrees
+        NaN where either transform is missing.
+    """
+    offset = matrix[:, :3, 3] - target_matrix[:, :3, 3]
+    normal = matrix[:, :3, 2]
+    target_normal = target_matrix[:, :3, 2]
+
+    with np.errstate(invalid='ignore', divide='ignore'):
+        cos = np.einsum('ij,ij->i', normal, target_normal) / (
+            np.linalg.norm(normal, axis=1) * np.linalg.norm(target_normal, axis=1))
+    return {
+        'target_distance': np.linalg.norm(offset, axis=1),
+        'normal_angle': np.degrees(np.arccos(np.clip(cos, -1.0, 1.0))),
+    }
+
+
+def position_drift(position: 'np.ndarray', groups: 'np.ndarray') -> 'np.ndarray':
+    """
+    Distance of each sample from the first sample of its group (e.g. target),
+    in array order (samples are ordered by ZINDEX).
+    """
+    if len(position) == 0:
+        return np.empty(0)
+    keys = np.asarray([str(g) for g in groups])
+    _, first, inverse = np.unique(keys, return_index=True, return_inverse=True)
+    return np.linalg.norm(position - position[first[inverse]], axis=1)
+
 
 class BrainsightExtractor:
-    """Extract target and coil information from Brainsight .bsproj files."""
+    """
+    Extract target and coil information from Brainsight .bsproj files.
+
+    Query results are computed lazily and cached per instance, so each query
+    runs at most once while the .bsproj file is unchanged (same mtime).
+    """
     
-    def __init__(self, bsproj_path: str):
+    def __init__(self, bsproj_path: str, immutable: bool = True):
         """
         Initialize the extractor.
+
+        The project is opened read-only: no lock, no journal file created next
+        to it. With `immutable`, SQLite also skips all change detection, which is
+        much faster on network shares; the connection is reopened if the file
+        mtime changes.
         
         Args:
             bsproj_path: Path to the .bsproj file (SQLite database)
+            immutable: Open with immutable=1 (the file must not change while read)
         """
         self.bsproj_path = Path(bsproj_path)
         if not self.bsproj_path.exists():
             raise FileNotFoundError(f"File not found: {bsproj_path}")
-        
-        self.conn = sqlite3.connect(self.bsproj_path)
+
+        self.immutable = immutable
+        self.conn = self._connect()
         self.cursor = self.conn.cursor()
+
+        # Lazily computed query results, invalidated when the file mtime changes
+        self._cache: Dict[str, Any] = {}
+        self._cache_mtime: Optional[int] = None
+
+    def _connect(self) -> sqlite3.Connection:
+        """Open the project in URI read-only mode with memory-mapped I/O."""
+        uri = self.bsproj_path.resolve().as_uri() + '?mode=ro'
+        if self.immutable:
+            uri += '&immutable=1'
+        conn = sqlite3.connect(uri, uri=True)
+        conn.execute(f'PRAGMA mmap_size = {MMAP_SIZE}')
+        conn.execute(f'PRAGMA cache_size = {-CACHE_SIZE_KIB}')
+        conn.execute('PRAGMA query_only = ON')
+        return conn
+
+    def _cached(self, key: str, compute: Callable[[], Any]) -> Any:
+        """
+        Return the cached result for `key`, computing it on first access.
+
+        The whole cache is dropped if the .bsproj mtime changed since it was filled.
+        A result of None (query failure) is not cached.
+        """
+        mtime = self.bsproj_path.stat().st_mtime_ns
+        if mtime != self._cache_mtime:
+            if self._cache_mtime is not None and self.immutable:
+                # An immutable connection would keep serving the old pages
+                self.conn.close()
+                self.conn = self._connect()
+                self.cursor = self.conn.cursor()
+            self._cache.clear()
+            self._cache_mtime = mtime
+
+        if key not in self._cache:
+            result = compute()
+            if result is None:
+                return []
+            self._cache[key] = result
+        return self._cache[key]
+
+    def clear_cache(self) -> None:
+        """Forget all cached query results."""
+        self._cache.clear()
+        self._cache_mtime = None
     
     def _parse_position_data(self, blob_data: bytes) -> Optional[list]:
         """
@@ -139,11 +464,15 @@ class BrainsightExtractor:
     
     def extract_targets(self) -> List[Dict]:
         """
-        Extract all target/coil information from the .bsproj file.
+        Extract all target/coil information from the .bsproj file (cached).
         
         Returns:
             List of target dictionaries with name, position, and transform
         """
+        return self._cached('targets', self._query_targets)
+
+    def _query_targets(self) -> Optional[List[Dict]]:
+        """Run the ZTARGETNODE query; None on database error."""
         targets = []
         
         try:
@@ -170,6 +499,15 @@ class BrainsightExtractor:
                 
                 position = self._parse_position_data(position_blob)
                 transform = self._parse_transform_data(transform_blob)
+
+                # Same 4x4 transform archive as the sample positions
+                payload = transform_payload(position_blob)
+                if payload is not None:
+                    values = struct.unpack('<16d', payload)
+                    if position is None:
+                        position = [values[3], values[7], values[11]]
+                    if transform is None:
+                        transform = [[values[i*4+j] for j in range(3)] for i in range(3)]
                 
                 target_info = {
                     'name': name,
@@ -187,145 +525,315 @@ class BrainsightExtractor:
         
         except sqlite3.Error as e:
             print(f"Database error: {e}", file=sys.stderr)
-            return []
+            return None
         
         return targets
     
     def extract_samples(self) -> List[Dict]:
         """
-        Extract all sample/measurement points from the .bsproj file.
+        Extract all sample/measurement points from the .bsproj file (cached).
         
         Returns:
             List of sample dictionaries with position and metadata
         """
-        samples = []
-        
+        return self._cached('samples', self._query_samples)
+
+    def _iter_sample_rows(self, chunk_size: int = FETCH_CHUNK_SIZE,
+                          since_index: Optional[int] = None) -> Iterator[List[Tuple]]:
+        """
+        Stream ZSAMPLE rows in lists of at most `chunk_size` (fetchmany, own cursor).
+        With `since_index`, only rows with ZINDEX > since_index are read.
+        """
+        cursor = self.conn.cursor()
         try:
-            query = """
-            SELECT 
-                ZINDEX,
-                ZNAME,
-                ZPOSITION,
-                ZTARGETPOSITION,
-                ZTARGETNAME,
-                ZUUID,
-                ZCREATIONDATE,
-                ZSTIMULATORPOWERA,
-                ZSTIMULATORPOWERB
-            FROM ZSAMPLE
-            WHERE ZPOSITION IS NOT NULL
-            ORDER BY ZINDEX ASC
-            """
-            
-            self.cursor.execute(query)
-            rows = self.cursor.fetchall()
-            
-            for row in rows:
-                zindex, name, zposition, ztargetposition, target_name, uuid, creation_date, power_a, power_b = row
-                
-                position = self._parse_position_data(zposition)
-                target_position = self._parse_position_data(ztargetposition) if ztargetposition else None
-                
-                # Extract rotation matrix from position blob
-                rotation = None
-                if zposition:
-                    try:
-                        plist_data = plistlib.loads(zposition)
-                        transform_data = plist_data['$objects'][2]
-                        values = struct.unpack('<16d', transform_data)
-                        # Extract 3x3 rotation from 4x4 matrix
-                        rotation = [[values[i*4+j] for j in range(3)] for i in range(3)]
-                    except:
-                        pass
-                
-                sample_info = {
-                    'index': zindex,
-                    'name': name,
-                    'uuid': uuid,
-                    'position': position,
-                    'target_position': target_position,
-                    'target_name': target_name,
-                    'rotation': rotation,
-                    'creation_date': creation_date,
-                    'power_a': power_a,
-                    'power_b': power_b,
-                }
-                
-                samples.append(sample_info)
+            if since_index is None:
+                cursor.execute(SAMPLE_QUERY.format(since=''))
+            else:
+                cursor.execute(SAMPLE_QUERY.format(since=' AND ZINDEX > ?'), (since_index,))
+            while True:
+                rows = cursor.fetchmany(chunk_size)
+                if not rows:
+                    break
+                yield rows
+        finally:
+            cursor.close()
+
+    def _query_sample_rows(self) -> Optional[List[Tuple]]:
+        """Run the ZSAMPLE query; None on database error."""
+        try:
+            return [row for rows in self._iter_sample_rows() for row in rows]
         
         except sqlite3.Error as e:
             print(f"Database error: {e}", file=sys.stderr)
-            return []
-        
+            return None
+
+    def iter_sample_chunks(self, chunk_size: int = FETCH_CHUNK_SIZE,
+                           since_index: Optional[int] = None) -> Iterator[Dict[str, 'np.ndarray']]:
+        """
+        Yield decoded samples by chunks of at most `chunk_size` rows (requires numpy).
+
+        Each chunk has the same keys as extract_sample_arrays(). Nothing is
+        cached: memory stays bounded by one chunk, whatever the project size.
+        With `since_index`, only samples with ZINDEX > since_index are read
+        (incremental extraction).
+
+        Raises:
+            sqlite3.Error: if the ZSAMPLE query fails
+        """
+        if np is None:
+            raise ImportError("numpy is required for iter_sample_chunks()")
+        for rows in self._iter_sample_rows(chunk_size, since_index):
+            yield sample_arrays_from_rows(rows)
+
+    def extract_sample_arrays(self) -> Dict[str, 'np.ndarray']:
+        """
+        Extract all samples as column arrays (cached, requires numpy).
+
+        Returns:
+            Dictionary of arrays with one entry per sample:
+            - SAMPLE_FIELDS columns (index, name, target_name, uuid, ...)
+            - matrix, target_matrix: (N, 4, 4) coil / target transforms
+            - position, target_position: (N, 3) translations
+            - rotation: (N, 3, 3) upper-left block of the coil transform
+            - x_axis, y_axis, normal: (N, 3) coil axes (rotation columns)
+            Undecodable transforms are NaN.
+
+        Raises:
+            sqlite3.DatabaseError: if the ZSAMPLE query fails
+        """
+        return self._cached('sample_arrays', self._decode_sample_arrays)
+
+    def _decode_sample_arrays(self) -> Optional[Dict[str, 'np.ndarray']]:
+        try:
+            chunks = list(self.iter_sample_chunks())
+        except sqlite3.Error as e:
+            raise sqlite3.DatabaseError(f"Could not read ZSAMPLE from {self.bsproj_path}: {e}") from e
+
+        if not chunks:
+            return sample_arrays_from_rows([])
+        if len(chunks) == 1:
+            return chunks[0]
+        base = {key: np.concatenate([chunk[key] for chunk in chunks]) for key in _BASE_SAMPLE_KEYS}
+        return _with_derived_arrays(base)
+
+    def samples_structured(self) -> 'np.ndarray':
+        """
+        Samples as a NumPy structured array (one record per sample).
+
+        Vector fields keep their shape: position (3,), rotation (3, 3), matrix (4, 4), ...
+        """
+        arrays = self.extract_sample_arrays()
+        dtype = [(field, object) for field, _ in SAMPLE_FIELDS]
+        dtype += [(key, 'f8', arrays[key].shape[1:]) for key in
+                  ('position', 'target_position', 'x_axis', 'y_axis', 'normal', 'rotation', 'matrix', 'target_matrix')]
+
+        table = np.empty(len(arrays['index']), dtype=dtype)
+        for field in table.dtype.names:
+            table[field] = arrays[field]
+        return table
+
+    def target_node_matrices(self) -> Dict[str, 'np.ndarray']:
+        """4x4 transforms of the ZTARGETNODE targets, by name (requires numpy)."""
+        if np is None:
+            raise ImportError("numpy is required for target_node_matrices()")
+        targets = [t for t in self.extract_targets() if transform_payload(t['position_raw']) is not None]
+        matrices = decode_transforms([t['position_raw'] for t in targets])
+        return {t['name']: m for t, m in zip(targets, matrices)}
+
+    def extract_coil_metrics(self) -> Dict[str, 'np.ndarray']:
+        """
+        Per-sample coil geometry (cached, requires numpy).
+
+        Sample target transforms come from ZTARGETPOSITION, or from the
+        ZTARGETNODE transform of the same name when missing.
+
+        Returns:
+            Arrays target_distance (mm), normal_angle (degrees) and drift
+            (mm from the first sample aimed at the same target)
+        """
+        return self._cached('coil_metrics', self._compute_coil_metrics)
+
+    def _compute_coil_metrics(self) -> Dict[str, 'np.ndarray']:
+        arrays = self.extract_sample_arrays()
+        target_matrix = fill_target_matrices(arrays['target_matrix'], arrays['target_name'],
+                                             self.target_node_matrices())
+        metrics = coil_geometry(arrays['matrix'], target_matrix)
+        metrics['drift'] = position_drift(arrays['position'], arrays['target_name'])
+        return metrics
+
+    def samples_dataframe(self) -> 'pd.DataFrame':
+        """
+        Samples as a pandas DataFrame with flat columns
+        (x, y, z, target_x, ..., m0n0..m2n2 of the rotation, nx, ny, nz for the normal,
+        and the extract_coil_metrics() columns).
+        """
+        if pd is None:
+            raise ImportError("pandas is required for samples_dataframe()")
+
+        arrays = self.extract_sample_arrays()
+        data = {field: arrays[field] for field, _ in SAMPLE_FIELDS}
+        for k, axis in enumerate('xyz'):
+            data[axis] = arrays['position'][:, k]
+        for k, axis in enumerate('xyz'):
+            data[f'target_{axis}'] = arrays['target_position'][:, k]
+        for i in range(3):
+            for j in range(3):
+                data[f'm{i}n{j}'] = arrays['rotation'][:, i, j]
+        for k, axis in enumerate('xyz'):
+            data[f'n{axis}'] = arrays['normal'][:, k]
+        data.update(self.extract_coil_metrics())
+        return pd.DataFrame(data)
+
+    def _query_samples(self) -> Optional[List[Dict]]:
+        """Build the list of sample dictionaries (from the column arrays when numpy is available)."""
+        if np is not None:
+            try:
+                arrays = self.extract_sample_arrays()
+            except sqlite3.Error as e:
+                print(f"Database error: {e}", file=sys.stderr)
+                return None
+            positions = arrays['position'].tolist()
+            target_positions = arrays['target_position'].tolist()
+            rotations = arrays['rotation'].tolist()
+            valid = ~np.isnan(arrays['matrix']).any(axis=(1, 2))
+            target_valid = ~np.isnan(arrays['target_matrix']).any(axis=(1, 2))
+
+            return [{
+                'index': arrays['index'][i],
+                'name': arrays['name'][i],
+                'uuid': arrays['uuid'][i],
+                'position': positions[i] if valid[i] else None,
+                'target_position': target_positions[i] if target_valid[i] else None,
+                'target_name': arrays['target_name'][i],
+                'rotation': rotations[i] if valid[i] else None,
+                'creation_date': arrays['creation_date'][i],
+                'power_a': arrays['power_a'][i],
+                'power_b': arrays['power_b'][i],
+            } for i in range(len(positions))]
+
+        # Without numpy: same decoding, one sample at a time
+        rows = self._query_sample_rows()
+        if rows is None:
+            return None
+
+        samples = []
+        for row in rows:
+            zindex, name, zposition, ztargetposition, target_name, uuid, creation_date, power_a, power_b = row
+
+            payload = transform_payload(zposition)
+            values = struct.unpack('<16d', payload) if payload else None
+            target_payload = transform_payload(ztargetposition)
+            target_values = struct.unpack('<16d', target_payload) if target_payload else None
+
+            samples.append({
+                'index': zindex,
+                'name': name,
+                'uuid': uuid,
+                'position': [values[3], values[7], values[11]] if values else None,
+                'target_position': [target_values[3], target_values[7], target_values[11]] if target_values else None,
+                'target_name': target_name,
+                # Extract 3x3 rotation from 4x4 matrix
+                'rotation': [[values[i*4+j] for j in range(3)] for i in range(3)] if values else None,
+                'creation_date': creation_date,
+                'power_a': power_a,
+                'power_b': power_b,
+            })
+
         return samples
     
     def export_samples_txt(self, output_path: str) -> None:
         """
         Export samples (actual coil positions) in Brainsight format.
+
+        Rows are formatted from column lists and written in a single call.
         
         Args:
             output_path: Path to save the exported samples file
         """
-        samples = self.extract_samples()
+        samples = [s for s in self.extract_samples() if s['position'] is not None]
         
         if not samples:
             print("Warning: No samples found to export", file=sys.stderr)
             return
+
+        identity = [[1.0, 0.0, 0.0], [0.0, 1.0, 0.0], [0.0, 0.0, 1.0]]
+        columns = [
+            [s['index'] for s in samples],
+            [s['name'] for s in samples],
+            [s['target_name'] or 'N/A' for s in samples],
+        ]
+        columns += [[s['position'][k] for s in samples] for k in range(3)]
+        rotations = [s['rotation'] or identity for s in samples]
+        columns += [[r[i][j] for r in rotations] for i in range(3) for j in range(3)]
+        columns += [[s['power_a'] or 'N/A' for s in samples], [s['power_b'] or 'N/A' for s in samples]]
+
+        header = (
+            "# Version: 1.0 (Extracted from Brainsight .bsproj)\n"
+            "# Coordinate system: MNI (or native depending on project)\n"
+            "# Units: millimetres, degrees\n"
+            "# Encoding: UTF-8\n"
+            "# Notes: Extracted from .bsproj ZSAMPLE table\n"
+            "# Sample Index\tSample Name\tTarget Name\tLoc. X\tLoc. Y\tLoc. Z\t"
+            + "\t".join(MATRIX_COLUMNS) + "\tPower_A\tPower_B\n"
+        )
+        row_format = "\t".join(["%s"] * 3 + ["%.9f"] * 12 + ["%s"] * 2) + "\n"
         
         with open(output_path, 'w') as f:
-            # Write header (similar to Brainsight format)
-            f.write("# Version: 1.0 (Extracted from Brainsight .bsproj)\n")
-            f.write("# Coordinate system: MNI (or native depending on project)\n")
-            f.write("# Units: millimetres, degrees\n")
-            f.write("# Encoding: UTF-8\n")
-            f.write("# Notes: Extracted from .bsproj ZSAMPLE table\n")
-            f.write("# Sample Index\tSample Name\tTarget Name\tLoc. X\tLoc. Y\tLoc. Z\t")
-            
-            # Add matrix headers
-            for i in range(3):
-                for j in range(3):
-                    f.write(f"m{i}n{j}")
-                    if not (i == 2 and j == 2):
-                        f.write("\t")
-            f.write("\tPower_A\tPower_B\n")
-            
-            # Write samples
-            for sample in samples:
-                if sample['position'] is None:
-                    continue
-                
-                f.write(f"{sample['index']}\t{sample['name']}\t{sample['target_name'] or 'N/A'}\t")
-                
-                # Write position
-                pos = sample['position']
-                for i, coord in enumerate(pos):
-                    f.write(f"{coord:.9f}")
-                    if i < 2:
-                        f.write("\t")
-                
-                # Write rotation matrix
-                if sample['rotation'] is not None:
-                    f.write("\t")
-                    for i in range(3):
-                        for j in range(3):
-                            f.write(f"{sample['rotation'][i][j]:.9f}")
-                            if not (i == 2 and j == 2):
-                                f.write("\t")
-                else:
-                    # Identity matrix if no rotation
-                    f.write("\t")
-                    for i in range(3):
-                        for j in range(3):
-                            val = 1.0 if i == j else 0.0
-                            f.write(f"{val:.9f}")
-                            if not (i == 2 and j == 2):
-                                f.write("\t")
-                
-                # Write power values
-                f.write(f"\t{sample['power_a'] or 'N/A'}\t{sample['power_b'] or 'N/A'}")
-                f.write("\n")
+            f.write(header)
+            f.write(_format_rows(row_format, columns))
         
         print(f"✓ Exported {len(samples)} samples to: {output_path}")
+
+    def export_targets_txt(self, output_path: str) -> None:
+        """
+        Export targets (planned positions) in Brainsight format.
+        
+        Args:
+            output_path: Path to save the exported targets file
+        """
+        targets = [t for t in self.extract_targets() if t['position'] is not None]
+
+        if not targets:
+            print("Warning: No targets found to export", file=sys.stderr)
+            return
+
+        identity = [[1.0, 0.0, 0.0], [0.0, 1.0, 0.0], [0.0, 0.0, 1.0]]
+        columns = [[t['name'] for t in targets]]
+        columns += [[t['position'][k] for t in targets] for k in range(3)]
+        transforms = [t['transform'] or identity for t in targets]
+        columns += [[m[i][j] for m in transforms] for i in range(3) for j in range(3)]
+
+        header = (
+            "# Version: 1.0 (Extracted from Brainsight .bsproj)\n"
+            "# Coordinate system: MNI (or native depending on project)\n"
+            "# Units: millimetres, degrees\n"
+            "# Encoding: UTF-8\n"
+            "# Notes: Extracted from .bsproj ZTARGETNODE table\n"
+            "# Target Name\tLoc. X\tLoc. Y\tLoc. Z\t" + "\t".join(MATRIX_COLUMNS) + "\n"
+        )
+        row_format = "\t".join(["%s"] + ["%.9f"] * 12) + "\n"
+
+        with open(output_path, 'w') as f:
+            f.write(header)
+            f.write(_format_rows(row_format, columns))
+
+        print(f"✓ Exported {len(targets)} targets to: {output_path}")
+
+    def export_samples_table(self, output_path: str) -> None:
+        """
+        Export samples as a table: Parquet if the path ends with .parquet,
+        TSV otherwise (columns of samples_dataframe()).
+        
+        Args:
+            output_path: Path to save the table
+        """
+        table = self.samples_dataframe()
+        if str(output_path).endswith('.parquet'):
+            table.to_parquet(output_path, index=False)
+        else:
+            table.to_csv(output_path, sep='\t', index=False, na_rep='n/a', float_format='%.9f')
+
+        print(f"✓ Exported {len(table)} samples to: {output_path}")
     
     def export_csv(self, output_path: str) -> None:
         """
@@ -415,6 +923,10 @@ def main():
         '--export-csv',
         help='Export as CSV'
     )
+    parser.add_argument(
+        '--export-table',
+        help='Export samples as a table (.parquet, or TSV for any other extension)'
+    )
     parser.add_argument(
         '--output-dir',
         default='.',
@@ -451,6 +963,9 @@ def main():
             
             if args.export_csv:
                 extractor.export_csv(args.export_csv)
+
+            if args.export_table:
+                extractor.export_samples_table(args.export_table)
         
         extractor.close()
     
@@ -1,68 +1,159 @@
-from math import isnan
+"""
+Build participants_to_import.tsv (neurospin_to_bids input) from list_participants.xlsx.
+
+One output row per participant x session, whose to_import column lists the
+(fid, data_type, BIDS filename) of every acquisition of that session. Filenames
+are assembled column-wise and sessions are grouped with a single groupby.
+
+All rows are validated first; invalid rows are reported as a table (and written
+next to the output as participants_to_import_errors.tsv) and nothing is imported.
+"""
+import argparse
+import sys
+
+import numpy as np
 import pandas as pd
 
 
 root = '/home/hippolytedreyfus/Documents/explore_plus/Data/bidsification/'
 
-participants_file = root + 'list_participants.xlsx'
-tsv_file = root + 'participants_to_import.tsv'
-
-df_in = pd.read_excel(participants_file)
-#df_out = pd.DataFrame(columns=['participant_id', 'NIP', 'infos_participant','session_label', 'acq_date', 'acq_label','location','run_id','to_import'])
-columns = df_in.keys()
-subject_ids = df_in["participant_id"]
-subject_filter = subject_ids.duplicated(keep='first')
-subject_ids = subject_ids[subject_filter==False].values
-rows_list = []
-for id in subject_ids:
-    print(id) 
-    #how many sessions
-    subj_df = df_in[df_in["participant_id"]==id]
-    sess_labels = subj_df["session_label"]
-    sess_filter = sess_labels.duplicated(keep='first')
-    sess_labels = sess_labels[sess_filter==False].values
-    for sess in sess_labels:
-        sess_df = subj_df[subj_df["session_label"]==sess]
-        to_import = []
-        print(sess_df.shape[0])
-        for i in range(sess_df.shape[0]):
-            row = sess_df.iloc[i]    
-            print(id, sess,row['run_id'],row['data_type']) 
-            fid = row['fid']
-            data_type = row['data_type']
-            if 'anat' in data_type:
-                if isnan(row['run_id']): 
-                    filename = id+'_ses-%02d' % sess+'_acq-'+row['seq_type']+'_'+row['contrast_type'] 
-                    print(filename, "\n")
-                else:
-                    filename = id+'_ses-%02d' % sess+'_acq-'+row['seq_type']+'_run-%02d' % row['run_id']+'_'+row['contrast_type'] 
-                    print(filename, "\n")
-            if 'func' in data_type:
-                if isnan(row['run_id']):
-                    filename = id+'_ses-%02d' % sess+'_task-'+row['task_type']+'_acq-'+row['seq_type']+'_dir-'+row['encoding_dir']+'_'+row['contrast_type']
-                    print(filename,"\n")
-                else:     
-                    filename = id+'_ses-%02d' % sess+'_task-'+row['task_type']+'_acq-'+row['seq_type']+'_dir-'+row['encoding_dir']+'_run-%02d' % row['run_id']+'_'+row['contrast_type'] 
-                    print(filename,"\n")
-            if 'fmap' in data_type: 
-                if isnan(row['run_id']):
-                    filename = id+'_ses-%02d' % sess+'_acq-'+row['seq_type']+'_dir-'+row['encoding_dir']+'_'+row['contrast_type']
-                    print(filename,"\n")
-                else:     
-                    filename = id+'_ses-%02d' % sess+'_acq-'+row['seq_type']+'_dir-'+row['encoding_dir']+'_run-%02d' % row['run_id']+'_'+row['contrast_type']
-                    print(filename,"\n")
-            to_import.append((str(fid),data_type,(filename)))
-        #print(to_import)
-        rows_list.append({'participant_id':id,
-                       'NIP':row['NIP'],
-                       'infos_participant':row['infos_participant'],
-                       'session_label':row['session_label'],
-                       'acq_date':str(row['acq_date']).split(sep=' ')[0], 
-                       'acq_label':row['acq_label'],
-                       'location':row['location'],
-                       'run_id':float("nan"),
-                       'to_import':tuple(to_import)})
-#print(rows_list)           
-df_out = pd.DataFrame(rows_list)
-df_out.to_csv(tsv_file, 
-              sep='\t', index=False, header=True)
+DATA_TYPES = ['anat', 'func', 'fmap']
+
+# Columns that must be filled for each data type
+REQUIRED_COLUMNS = {
+    'anat': ['seq_type', 'contrast_type'],
+    'func': ['task_type', 'seq_type', 'encoding_dir', 'contrast_type'],
+    'fmap': ['seq_type', 'encoding_dir', 'contrast_type'],
+}
+
+# Session-level columns copied to the output (values of the last row of the session)
+SESSION_COLUMNS = ['NIP', 'infos_participant', 'session_label', 'acq_date', 'acq_label', 'location']
+
+
+def data_type_category(df_in):
+    """
+    anat / func / fmap for each row (substring match on data_type), NaN if unknown.
+    A data_type matching several categories takes the last one of DATA_TYPES.
+    """
+    data_type = df_in['data_type'].astype(str)
+    category = pd.Series(np.nan, index=df_in.index, dtype=object)
+    for name in DATA_TYPES:
+        category = category.mask(data_type.str.contains(name, regex=False), name)
+    return category
+
+
+def integer_labels(column):
+    """Two-digit labels ('01', '02', ...) of an integer column; NaN for empty, non-numeric or non-integer cells."""
+    values = pd.to_numeric(column, errors='coerce')
+    valid = values.notna() & (values % 1 == 0)
+    return values.where(valid).astype('Int64').astype(str).str.zfill(2).where(valid)
+
+
+def build_filenames(df_in, category):
+    """
+    BIDS filename (without extension) of every row, assembled column by column.
+    NaN for rows whose session_label or run_id is invalid (reported by validate_rows).
+    """
+    ses = '_ses-' + integer_labels(df_in['session_label'])
+    run = ('_run-' + integer_labels(df_in['run_id'])).where(df_in['run_id'].notna(), '')
+
+    prefix = df_in['participant_id'].astype(str) + ses
+    acq = '_acq-' + df_in['seq_type'].astype(str)
+    direction = '_dir-' + df_in['encoding_dir'].astype(str)
+    suffix = run + '_' + df_in['contrast_type'].astype(str)
+
+    return pd.Series(np.select(
+        [category == 'anat', category == 'func', category == 'fmap'],
+        [prefix + acq + suffix,
+         prefix + '_task-' + df_in['task_type'].astype(str) + acq + direction + suffix,
+         prefix + acq + direction + suffix],
+        default=None), index=df_in.index)
+
+
+def validate_rows(df_in, category, filenames):
+    """
+    Check every row before building the import table.
+
+    Returns:
+        DataFrame (row, participant_id, session_label, data_type, error), empty if all rows are valid
+    """
+    errors = []
+
+    def report(mask, message):
+        for idx in df_in.index[mask]:
+            errors.append({'row': idx + 2,  # Excel line (header = line 1)
+                           'participant_id': df_in.at[idx, 'participant_id'],
+                           'session_label': df_in.at[idx, 'session_label'],
+                           'data_type': df_in.at[idx, 'data_type'],
+                           'error': message})
+
+    report(category.isna(), f"unknown data_type (expected one of {', '.join(DATA_TYPES)})")
+    report(df_in['participant_id'].isna(), "missing participant_id")
+    report(integer_labels(df_in['session_label']).isna(), "missing or non-integer session_label")
+    report(df_in['run_id'].notna() & integer_labels(df_in['run_id']).isna(), "non-integer run_id")
+
+    for name, columns in REQUIRED_COLUMNS.items():
+        for column in columns:
+            report((category == name) & df_in[column].isna(), f"missing {column} for {name}")
+
+    # Same filename twice in a session: repeated acquisition without run_id
+    duplicated = filenames.notna() & filenames.duplicated(keep=False)
+    report(duplicated & df_in['run_id'].isna(), "missing run_id (duplicate filename in session)")
+    report(duplicated & df_in['run_id'].notna(), "duplicate run_id (duplicate filename in session)")
+
+    return pd.DataFrame(errors, columns=['row', 'participant_id', 'session_label', 'data_type', 'error'])
+
+
+def build_import_table(df_in, filenames):
+    """
+    One row per participant x session, to_import as a tuple. Participants in order of
+    first appearance, then the sessions of each participant in order of first appearance.
+    """
+    df = df_in.assign(
+        to_import=list(zip(df_in['fid'].astype(str), df_in['data_type'], filenames)),
+        acq_date=df_in['acq_date'].astype(str).str.split(' ').str[0],
+    )
+    groups = df.groupby(['participant_id', 'session_label'], sort=False)
+
+    # Last row of each session; groups (first appearance of the pair) re-sorted by
+    # first appearance of the participant
+    last_rows = groups.tail(1).index
+    group_ids = groups.ngroup()[last_rows].values
+    participant_rank = pd.Series(pd.factorize(df['participant_id'])[0], index=df.index)[last_rows].values
+    order = np.lexsort((group_ids, participant_rank))
+    df_out = df.loc[last_rows[order], ['participant_id'] + SESSION_COLUMNS].reset_index(drop=True)
+    df_out['run_id'] = float('nan')
+    df_out['to_import'] = groups['to_import'].agg(tuple).values[group_ids[order]]
+    return df_out
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Build participants_to_import.tsv from list_participants.xlsx")
+    parser.add_argument('--root', default=root, help=f"bidsification folder (default: {root})")
+    args = parser.parse_args()
+
+    participants_file = args.root + 'list_participants.xlsx'
+    tsv_file = args.root + 'participants_to_import.tsv'
+    errors_file = args.root + 'participants_to_import_errors.tsv'
+
+    df_in = pd.read_excel(participants_file)
+    category = data_type_category(df_in)
+    filenames = build_filenames(df_in, category)
+
+    errors = validate_rows(df_in, category, filenames)
+    if not errors.empty:
+        print(f"{len(errors)} invalid rows in {participants_file}:\n")
+        print(errors.to_string(index=False))
+        errors.to_csv(errors_file, sep='\t', index=False, header=True)
+        print(f"\nErrors written to {errors_file}; nothing imported.")
+        sys.exit(1)
+
+    df_out = build_import_table(df_in, filenames)
+    df_out.to_csv(tsv_file,
+                  sep='\t', index=False, header=True)
+    print(f"{len(df_out)} sessions ({df_out['participant_id'].nunique()} participants), "
+          f"{len(df_in)} acquisitions -> {tsv_file}")
+
+
+if __name__ == '__main__':
+    main()
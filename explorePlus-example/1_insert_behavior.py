@@ -1,109 +1,280 @@
-'''' 
+'''
 Run this file after running the "neurospin_to_bids" command in the terminal of neurospin server.
 
 For all behavior files (.csv) of the RAW folder :
 Take the behavior, copy to BIDS folder, bidsifie content and name.
+
+Les fichiers (sujet x session x bloc) sont repérés en un seul parcours de RAW,
+puis convertis en parallèle (--jobs). Le CSV est réécrit en TSV ligne par ligne
+(csv.reader -> csv.writer), sans passer par pandas. L'empreinte de chaque source
+(taille + date de modification) est gardée dans .cache/insert_behavior.json :
+une sortie dont la source n'a pas changé n'est pas réécrite. Un fichier
+manquant ou illisible n'arrête plus le script, il est listé dans le rapport final.
 '''
 
 # TODO détecter la modalités associées à la session, pour pouvoir le réinjecter dans le nom du fichier ?
 
-import os 
-import numpy as np
-import pandas as pd
-from glob import glob
+import os
 import re
+import sys
+import csv
+import json
+import time
 import argparse
+from concurrent.futures import ProcessPoolExecutor, as_completed
+
 import yaml
 
 
-# load config variables 
-'/neurospin/unicog/protocols/IRMf/ExplorePlus_Meyniel_Paunov_2023/RAW/'
-'/neurospin/unicog/protocols/IRMf/ExplorePlus_Meyniel_Paunov_2023/EXPLORE_PLUS/rawdata/'
+# load config variables
 CONFIG_FILE = "_config.yaml"
 try:
     with open(CONFIG_FILE, 'r') as file:
         config = yaml.safe_load(file)
         RAW_DIR = config.get('raw_dir', '/default/raw/dir/')
         BIDS_DIR = config.get('bids_dir', '/default/bids/dir/')
-        print(f"RAW_DIR: {RAW_DIR}")
-        print(f"BIDS_DIR: {BIDS_DIR}")
 except FileNotFoundError:
     print(f"Le fichier de configuration '{CONFIG_FILE}' est introuvable.")
 except yaml.YAMLError as e:
     print(f"Erreur lors du chargement du fichier YAML : {e}")
 
 
-        
 RAW_BEH = 'behavior'
 BIDS_BEH = 'beh'
 
+# Empreintes des sources déjà converties (clé : chemin de sortie relatif à BIDS_DIR)
+STATE_FILE = os.path.join(os.path.dirname(os.path.abspath(__file__)), '.cache', 'insert_behavior.json')
+
+# data_subject_108_session_1_block2.000000.csv (ou MEG_data_subject_...)
+BEH_FILE_RE = re.compile(r'^(MEG_)?data_subject_(\d+)_session_(\d+)_block(\d+)\..*\.csv$')
+
+
+def file_fingerprint(path):
+    """Empreinte (taille, mtime en ns) d'un fichier source."""
+    stat = os.stat(path)
+    return [stat.st_size, stat.st_mtime_ns]
+
+
+def load_state(path=STATE_FILE):
+    try:
+        with open(path, 'r') as f:
+            return json.load(f)
+    except (FileNotFoundError, json.JSONDecodeError):
+        return {}
+
+
+def save_state(state, path=STATE_FILE):
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    tmp = path + '.tmp'
+    with open(tmp, 'w') as f:
+        json.dump(state, f, indent=1, sort_keys=True)
+    os.replace(tmp, path)
+
+
+def find_behavior_files(subjects, raw_dir=RAW_DIR):
+    """
+    Parcourt RAW une seule fois par sujet et associe chaque fichier de comportement
+    à son (sujet, session, run) BIDS.
+
+    Arguments :
+        subjects (list) : sujets BIDS (sub-08, ...), 'sub-1XX' dans RAW.
+
+    Retourne :
+        tuple (files, failed) : files est une liste de dicts (source, subject, session, run),
+        un seul fichier par run (data_ préféré à MEG_data_) ; failed liste (source, error).
+    """
+    by_run = {}
+    failed = []
+
+    for bids_subject in subjects:
+        raw_subject = bids_subject.replace('sub-', 'sub-1')  # ajout d'un 1 après le tiret pour matcher avec la structure de RAW
+        subject_dir = os.path.join(raw_dir, raw_subject)
+        expected_sub = int(bids_subject.split('-')[1]) + 100
+
+        if not os.path.isdir(subject_dir):
+            failed.append({'source': subject_dir, 'error': 'dossier sujet introuvable'})
+            continue
+
+        with os.scandir(subject_dir) as sessions:
+            session_dirs = sorted(entry.path for entry in sessions
+                                  if entry.is_dir() and os.path.isdir(os.path.join(entry.path, RAW_BEH)))
+
+        for session_dir in session_dirs:
+            session = os.path.basename(session_dir)
+            bids_session = session.replace('sess_', 'ses-')  # on remplace le _ par un tiret et sess par sess pour matcher avec la structure de RAW
+            beh_session_dir = os.path.join(session_dir, RAW_BEH)
+
+            with os.scandir(beh_session_dir) as entries:
+                names = sorted(entry.name for entry in entries if '.csv' in entry.name and 'data' in entry.name)
+
+            for name in names:
+                source = os.path.join(beh_session_dir, name)
+                match = BEH_FILE_RE.match(name)
+                if match is None:
+                    failed.append({'source': source, 'error': 'nom de fichier non reconnu'})
+                    continue
+
+                meg_prefix, sub, ses, block = match.groups()
+                if int(sub) != expected_sub:
+                    failed.append({'source': source, 'error': f'sujet {sub} dans le nom, {expected_sub} attendu'})
+                    continue
+                if int(ses) != int(bids_session.split('-')[1]):
+                    failed.append({'source': source, 'error': f'session {ses} dans le nom, dossier {session}'})
+                    continue
+
+                key = (bids_subject, bids_session, 'run-' + block)
+                # même priorité que l'ancien script : data_... avant MEG_data_...
+                if key not in by_run or (by_run[key]['meg'] and not meg_prefix):
+                    by_run[key] = {'source': source, 'subject': bids_subject, 'session': bids_session,
+                                   'run': 'run-' + block, 'meg': bool(meg_prefix)}
+
+    return [by_run[key] for key in sorted(by_run)], failed
+
+
+def target_path(item, bids_dir=BIDS_DIR):
+    """Chemin du TSV BIDS d'un fichier de comportement."""
+    return os.path.join(bids_dir, item['subject'], item['session'], BIDS_BEH,
+                        item['subject'] + "_" + item['session'] + "_" + item['run'] + "_task-beh.tsv")
+
+
+def plan_imports(files, state, overwrite=False, bids_dir=BIDS_DIR):
+    """
+    Sépare les fichiers à convertir de ceux dont la source n'a pas changé.
+
+    Retourne :
+        tuple (jobs, skipped) ; jobs triés par taille décroissante
+    """
+    jobs = []
+    skipped = []
+    for item in files:
+        target = target_path(item, bids_dir)
+        fingerprint = file_fingerprint(item['source'])
+        entry = state.get(os.path.relpath(target, bids_dir))
+        if (not overwrite and entry is not None and os.path.exists(target)
+                and entry['source'] == item['source'] and entry['fingerprint'] == fingerprint):
+            skipped.append(target)
+            continue
+        jobs.append(dict(item, target=target, fingerprint=fingerprint))
+
+    # Les plus gros fichiers d'abord pour raccourcir la durée totale en parallèle
+    jobs.sort(key=lambda job: job['fingerprint'][0], reverse=True)
+    return jobs, skipped
+
+
+def convert_csv_to_tsv(source, target):
+    """
+    Réécrit un CSV en TSV ligne par ligne (écriture atomique).
+
+    Les colonnes sans nom sont nommées 'Unnamed: i' et les lignes courtes
+    complétées, comme le faisait pandas.read_csv + to_csv.
+
+    Retourne :
+        int : nombre de lignes de données
+    """
+    n_rows = 0
+    tmp = os.path.join(os.path.dirname(target), '.' + os.path.basename(target) + '.tmp')
+    try:
+        with open(source, 'r', newline='', encoding='utf-8-sig') as fin, \
+                open(tmp, 'w', newline='', encoding='utf-8') as fout:
+            reader = csv.reader(fin)
+            writer = csv.writer(fout, delimiter='\t', lineterminator='\n')
+            header = next(reader, [])
+            writer.writerow([name if name else f'Unnamed: {i}' for i, name in enumerate(header)])
+            for row in reader:
+                if not row:
+                    continue
+                if len(row) < len(header):
+                    row += [''] * (len(header) - len(row))
+                writer.writerow(row)
+                n_rows += 1
+        os.replace(tmp, target)
+    finally:
+        if os.path.exists(tmp):
+            os.remove(tmp)
+    return n_rows
+
+
+def import_behavior(job):
+    """
+    Convertit un fichier de comportement. Exécutée dans un processus worker.
+
+    Retourne :
+        dict (job, ok, duration, message)
+    """
+    start = time.perf_counter()
+    try:
+        os.makedirs(os.path.dirname(job['target']), exist_ok=True)
+        n_rows = convert_csv_to_tsv(job['source'], job['target'])
+        return {'job': job, 'ok': True, 'duration': time.perf_counter() - start, 'message': f'{n_rows} lignes'}
+    except Exception as e:
+        return {'job': job, 'ok': False, 'duration': time.perf_counter() - start, 'message': f'{type(e).__name__}: {e}'}
+
+
+def run_imports(jobs, n_jobs, state, bids_dir=BIDS_DIR):
+    """Exécute les conversions (en série si n_jobs=1) et met à jour l'état au fil de l'eau."""
+    results = []
+
+    def report(result):
+        job = result['job']
+        if result['ok']:
+            print(f"Saved behavior data to {job['target']} ({result['message']}, {result['duration']:.2f}s)")
+            state[os.path.relpath(job['target'], bids_dir)] = {'source': job['source'], 'fingerprint': job['fingerprint']}
+        else:
+            print(f"Erreur avec {job['source']} : {result['message']}")
+        results.append(result)
+
+    if n_jobs <= 1:
+        for job in jobs:
+            report(import_behavior(job))
+        return results
+
+    with ProcessPoolExecutor(max_workers=n_jobs) as executor:
+        futures = [executor.submit(import_behavior, job) for job in jobs]
+        for future in as_completed(futures):
+            report(future.result())
+    return results
+
+
+def main():
+    #------- parser
+    parser = argparse.ArgumentParser(description="Script pour traiter un ou des sujet BIDS.")
+    parser.add_argument(
+        '--subjects',
+        type=str,
+        nargs='+',  # Permet d'accepter plusieurs valeurs
+        required=True,
+        help="Liste des identifiants des sujets (par exemple, sub-08 sub-09)"
+    )
+    parser.add_argument('--jobs', '-j', type=int, default=1, help="Nombre de processus de conversion (défaut : 1)")
+    parser.add_argument('--overwrite', action='store_true', help="Reconvertir même les fichiers dont la source n'a pas changé")
+    args = parser.parse_args()
+    print(f"RAW_DIR: {RAW_DIR}")
+    print(f"BIDS_DIR: {BIDS_DIR}")
+    print(f"Sujet(s) traité(s) : {args.subjects}")
+
+    subjects = [x for x in args.subjects if 'sub-' in x]
+    files, failed = find_behavior_files(subjects)
+    state = load_state()
+    jobs, skipped = plan_imports(files, state, overwrite=args.overwrite)
+    print(f"{len(files)} fichiers de comportement détectés : {len(jobs)} à convertir, "
+          f"{len(skipped)} à jour, {len(failed)} en erreur")
 
+    start = time.perf_counter()
+    try:
+        results = run_imports(jobs, args.jobs, state)
+    finally:
+        save_state(state)
+    n_ok = sum(r['ok'] for r in results)
+    failed += [{'source': r['job']['source'], 'error': r['message']} for r in results if not r['ok']]
 
-#------- parser
-parser = argparse.ArgumentParser(description="Script pour traiter un ou des sujet BIDS.")
-parser.add_argument(
-    '--subjects', 
-    type=str, 
-    nargs='+',  # Permet d'accepter plusieurs valeurs
-    required=True, 
-    help="Liste des identifiants des sujets (par exemple, sub-08 sub-09)"
-)
-args = parser.parse_args()
-print(f"Sujet(s) traité(s) : {args.subjects}")
-
-
-
-#recherche des sujet déjà présents dans BIDS_DIR
-#BIDSsubjects = os.listdir(BIDS_DIR)
-BIDSsubjects = args.subjects
-BIDSsubjects = [x for x in BIDSsubjects if 'sub-' in x]
-RAWsubjects = [x.replace('sub-', 'sub-1') for x in BIDSsubjects] #ajout d'un 1 après le tiret pour matcher avec la structure de RAW
-print('subjects detected', RAWsubjects)
-
-
-# on rentre dans le dossier de chaque sujet pour renommer les fichiers .fif
-i = 0
-for subject in RAWsubjects:
-    #on récupère les sessions effectuées dans RAW_DIR
-    subject_dir = os.path.join(RAW_DIR, subject)
-    #on effectue un screening des sessions MEG (sessions qui contienne un dossier 'meg')
-    RAWsessions = os.listdir(subject_dir)
-    RAWsessions = [x for x in RAWsessions if RAW_BEH in os.listdir(os.path.join(subject_dir, x))]
-    print('behavior session detected', RAWsessions)
-    # on copie les fichiers .fif dans le dossier BIDS_DIR
-    for session in RAWsessions:
-        beh_session_dir = os.path.join(subject_dir, session, RAW_BEH)
-        files = os.listdir(beh_session_dir)
-        files = [x for x in files if ('.csv' in x and 'data' in x)]
-        print('behavior files detected ' , files)
-        for file in files:
-            i+=1
-            BIDSsession = session.replace('sess_', 'ses-') # on remplace le _ par un tiret et sess par sess pour matcher avec la structure de RAW
-            BIDSsubject = subject.replace('sub-1', 'sub-')
-            match = re.search(r'block(\d+)', file)
-            BIDSrun = 'run-' + str(match.group(1))
-            
-            # load behavior data .csv
-            sub = int(BIDSsubject.split('-')[1]) +100 
-            ses = int(BIDSsession.split('-')[1])
-            run = int(BIDSrun.split('-')[1]) 
-            filename = f"data_subject_{sub}_session_{ses}_block{run}.000000.csv"
-            MEGfilename = f"MEG_data_subject_{sub}_session_{ses}_block{run}.000000.csv"
-            beh_file = os.path.join(beh_session_dir, filename)
-            MEG_beh_file = os.path.join(beh_session_dir, MEGfilename)
-            if os.path.exists(beh_file):
-                behavior_data = pd.read_csv(beh_file)
-            elif os.path.exists(MEG_beh_file):
-                behavior_data = pd.read_csv(MEG_beh_file)
-            else :
-                raise BaseException('erreur donnée manquante')
-            
-            # Sauvegarder les données comportementales au format TSV 
-            target_beh_file = os.path.join(BIDS_DIR, BIDSsubject, BIDSsession, BIDS_BEH, BIDSsubject + "_" + BIDSsession + "_" + BIDSrun + "_task-beh.tsv")
-            os.makedirs(os.path.dirname(target_beh_file), exist_ok=True)
-            behavior_data.to_csv(target_beh_file, sep='\t', index=False)
-            print(f"Saved behavior data to {target_beh_file}")      
-                        
-print(f'Total of {i} .tsv files copied to BIDS format')
+    print(f'Total of {n_ok} .tsv files copied to BIDS format '
+          f'({len(skipped)} already up to date, {time.perf_counter() - start:.1f}s)')
+    if failed:
+        print(f"\n{len(failed)} fichier(s) non importé(s) :")
+        for item in failed:
+            print(f"  {item['source']} : {item['error']}")
+        sys.exit(1)
 
 
+if __name__ == '__main__':
+    main()
@@ -5,89 +5,314 @@ This script will insert the MEG session in the BIDS dataset (from the non-BIDS d
 
 CAUTION !!!
 This is a script that interact with the rawdata,
-AND MEG DATA DONT HAVE ANY BACK UP on Neurospin server 
+AND MEG DATA DONT HAVE ANY BACK UP on Neurospin server
 (some of them are present on the server but some of them are only on a hard drive in MEG room.)
-So make sure to have a copy of the rawdata before running this script. 
+So make sure to have a copy of the rawdata before running this script.
+
+La copie se fait dans le processus (plus de `cp` via os.system) : chaque .fif
+est lu une seule fois par blocs, son SHA-256 calculé au vol pendant l'écriture
+d'un fichier temporaire dans le dossier de destination, synchronisé sur disque
+(fsync), retiré du cache système puis relu depuis le disque : il n'est renommé
+(os.replace, atomique) que si son SHA-256 est égal à celui de la source. La
+destination est soit absente, soit une copie vérifiée. Les sources ne sont jamais modifiées. Plusieurs fichiers sont
+copiés en parallèle (--jobs) et chaque copie terminée est notée avec son SHA-256
+dans .cache/insert_meg_session.json : une copie interrompue reprend aux fichiers
+qui ne sont pas encore copiés, et --verify recalcule le SHA-256 des copies pour
+détecter celles modifiées ou remplacées depuis.
 '''
 
 import os
-import pandas as pd
 import re
+import sys
+import json
+import time
+import hashlib
 import argparse
+import threading
 import warnings
+from concurrent.futures import ThreadPoolExecutor, as_completed
 warnings.warn( "BAD CHANNELS TO ADD")
 import yaml
 
 
 
-# load config variables 
+# load config variables
 CONFIG_FILE = "_config.yaml"
 try:
     with open(CONFIG_FILE, 'r') as file:
         config = yaml.safe_load(file)
         RAW_DIR = config.get('raw_dir', '/default/raw/dir/')
         BIDS_DIR = config.get('bids_dir', '/default/bids/dir/')
-        print(f"RAW_DIR: {RAW_DIR}")
-        print(f"BIDS_DIR: {BIDS_DIR}")
 except FileNotFoundError:
     print(f"Le fichier de configuration '{CONFIG_FILE}' est introuvable.")
 except yaml.YAMLError as e:
     print(f"Erreur lors du chargement du fichier YAML : {e}")
 
 
+# Copies vérifiées (clé : chemin de destination relatif à BIDS_DIR)
+MANIFEST_FILE = os.path.join(os.path.dirname(os.path.abspath(__file__)), '.cache', 'insert_meg_session.json')
+
+COPY_CHUNK_SIZE = 8 << 20  # 8 Mio par lecture/écriture
+
+
+def file_fingerprint(path):
+    """Empreinte (taille, mtime en ns) d'un fichier source."""
+    stat = os.stat(path)
+    return [stat.st_size, stat.st_mtime_ns]
+
+
+def load_manifest(path=MANIFEST_FILE):
+    try:
+        with open(path, 'r') as f:
+            return json.load(f)
+    except (FileNotFoundError, json.JSONDecodeError):
+        return {}
+
+
+def save_manifest(manifest, path=MANIFEST_FILE):
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    tmp = path + '.tmp'
+    with open(tmp, 'w') as f:
+        json.dump(manifest, f, indent=1, sort_keys=True)
+    os.replace(tmp, path)
+
+
+def drop_page_cache(fd):
+    """Retire du cache système les pages d'un fichier (déjà synchronisé), pour que la relecture vienne du disque."""
+    if hasattr(os, 'posix_fadvise'):
+        os.posix_fadvise(fd, 0, 0, os.POSIX_FADV_DONTNEED)
+
+
+def sha256_file(path, chunk_size=COPY_CHUNK_SIZE, from_disk=False):
+    """SHA-256 d'un fichier, lu par blocs (depuis le disque et non le cache si from_disk)."""
+    digest = hashlib.sha256()
+    with open(path, 'rb') as f:
+        if from_disk:
+            drop_page_cache(f.fileno())
+        while chunk := f.read(chunk_size):
+            digest.update(chunk)
+    return digest.hexdigest()
+
+
+def copy_with_sha256(source, target, chunk_size=COPY_CHUNK_SIZE):
+    """
+    Copie source -> target sans jamais laisser de fichier partiel à la place de target.
+
+    La source est lue une fois (SHA-256 calculé pendant l'écriture du temporaire).
+    Le temporaire est synchronisé sur disque (fsync), ses pages retirées du cache
+    système (posix_fadvise DONTNEED) puis relu depuis le disque : il n'est renommé
+    en target que si son SHA-256 est égal à celui de la source. Le renommage
+    lui-même est synchronisé (fsync du dossier).
+
+    Retourne :
+        str : SHA-256 (hexadécimal) des données lues dans source
+    """
+    if os.path.exists(target) and os.path.samefile(source, target):
+        raise ValueError(f"source et destination identiques : {source}")
+
+    tmp = os.path.join(os.path.dirname(target), '.' + os.path.basename(target) + '.part')
+    source_digest = hashlib.sha256()
+    try:
+        with open(source, 'rb') as fin, open(tmp, 'wb') as fout:
+            while chunk := fin.read(chunk_size):
+                source_digest.update(chunk)
+                fout.write(chunk)
+            fout.flush()
+            os.fsync(fout.fileno())
+
+        source_sha = source_digest.hexdigest()
+        target_sha = sha256_file(tmp, chunk_size, from_disk=True)
+        if target_sha != source_sha:
+            raise IOError(f"somme de contrôle différente après copie ({source_sha} != {target_sha})")
+        os.replace(tmp, target)
+    finally:
+        if os.path.exists(tmp):
+            os.remove(tmp)
+
+    dir_fd = os.open(os.path.dirname(target) or '.', os.O_RDONLY)
+    try:
+        os.fsync(dir_fd)
+    finally:
+        os.close(dir_fd)
+    return source_sha
+
+
+def find_meg_files(subjects, raw_dir=RAW_DIR, bids_dir=BIDS_DIR):
+    """
+    Associe chaque .fif de RAW à son chemin de destination BIDS.
+
+    Arguments :
+        subjects (list) : sujets BIDS (sub-08, ...), 'sub-1XX' dans RAW.
+
+    Retourne :
+        tuple (files, failed) : files est une liste de dicts (source, target),
+        failed liste (source, error).
+    """
+    by_target = {}
+    failed = []
+
+    for BIDSsubject in subjects:
+        subject = BIDSsubject.replace('sub-', 'sub-1')  # ajout d'un 1 après le tiret pour matcher avec la structure de RAW
+        subject_dir = os.path.join(raw_dir, subject)
+        if not os.path.isdir(subject_dir):
+            failed.append({'source': subject_dir, 'error': 'dossier sujet introuvable'})
+            continue
+
+        #on effectue un screening des sessions MEG (sessions qui contienne un dossier 'meg')
+        with os.scandir(subject_dir) as sessions:
+            RAWsessions = sorted(entry.name for entry in sessions
+                                 if entry.is_dir() and os.path.isdir(os.path.join(entry.path, 'meg')))
+        print(subject, 'meg sessions detected', RAWsessions)
+
+        for session in RAWsessions:
+            BIDSsession = session.replace('sess_', 'ses-')  # on remplace le _ par un tiret et sess par sess pour matcher avec la structure de RAW
+            meg_session_dir = os.path.join(subject_dir, session, 'meg')
+            with os.scandir(meg_session_dir) as entries:
+                files = sorted(entry.name for entry in entries if '.fif' in entry.name and 'run' in entry.name)
+
+            for file in files:
+                source = os.path.join(meg_session_dir, file)
+                match = re.search(r'run(\d+)', file)
+                if match is None:
+                    failed.append({'source': source, 'error': 'numéro de run introuvable dans le nom'})
+                    continue
+                BIDSrun = 'run-' + str(match.group(1))
+                target = os.path.join(bids_dir, BIDSsubject, BIDSsession, 'meg',
+                                      BIDSsubject + '_' + BIDSsession + '_' + BIDSrun + '_task_raw.fif')
+                by_target.setdefault(target, []).append(source)
+
+    files = []
+    for target, sources in sorted(by_target.items()):
+        # Plusieurs .fif pour un même run : on ne choisit pas à la place de l'utilisateur
+        if len(sources) > 1:
+            for source in sources:
+                failed.append({'source': source, 'error': f"même destination que {', '.join(os.path.basename(s) for s in sources if s != source)}"})
+            continue
+        files.append({'source': sources[0], 'target': target})
+    return files, failed
+
+
+def plan_copies(files, manifest, overwrite=False, verify=False, bids_dir=BIDS_DIR):
+    """
+    Sépare les copies à faire de celles déjà faites selon le manifeste.
+
+    Une copie est considérée faite si la source a la même empreinte qu'au moment
+    de la copie et que la destination existe avec la bonne taille (et, avec
+    verify=True, le bon SHA-256).
+
+    Retourne :
+        tuple (jobs, skipped, failed) ; jobs triés par taille décroissante
+    """
+    jobs = []
+    skipped = []
+    failed = []
+    for item in files:
+        fingerprint = file_fingerprint(item['source'])
+        entry = manifest.get(os.path.relpath(item['target'], bids_dir))
+        done = (not overwrite and entry is not None
+                and entry['source'] == item['source'] and entry['fingerprint'] == fingerprint
+                and os.path.exists(item['target']) and os.path.getsize(item['target']) == fingerprint[0])
+        if done and verify and sha256_file(item['target'], from_disk=True) != entry['sha256']:
+            failed.append({'source': item['source'], 'error': f"{item['target']} ne correspond plus au manifeste"})
+            continue
+        if done:
+            skipped.append(item['target'])
+            continue
+        jobs.append(dict(item, fingerprint=fingerprint))
+
+    # Les plus gros fichiers d'abord pour raccourcir la durée totale en parallèle
+    jobs.sort(key=lambda job: job['fingerprint'][0], reverse=True)
+    return jobs, skipped, failed
+
+
+def copy_meg_file(job):
+    """
+    Copie vérifiée d'un .fif. Exécutée dans un thread (lecture/écriture et hashlib libèrent le GIL).
+
+    Retourne :
+        dict (job, ok, duration, sha256, message)
+    """
+    start = time.perf_counter()
+    try:
+        os.makedirs(os.path.dirname(job['target']), exist_ok=True)
+        sha = copy_with_sha256(job['source'], job['target'])
+        if file_fingerprint(job['source']) != job['fingerprint']:
+            raise IOError("la source a été modifiée pendant la copie")
+        return {'job': job, 'ok': True, 'duration': time.perf_counter() - start, 'sha256': sha, 'message': ''}
+    except Exception as e:
+        return {'job': job, 'ok': False, 'duration': time.perf_counter() - start, 'sha256': None,
+                'message': f'{type(e).__name__}: {e}'}
+
+
+def run_copies(jobs, n_jobs, manifest, bids_dir=BIDS_DIR):
+    """Copie les fichiers en parallèle ; le manifeste est réécrit après chaque copie vérifiée."""
+    results = []
+    lock = threading.Lock()
+
+    def report(result):
+        job = result['job']
+        if result['ok']:
+            size_mb = job['fingerprint'][0] / 1e6
+            print(f"{job['source']} -> {job['target']} "
+                  f"({size_mb:.0f} Mo, {size_mb / max(result['duration'], 1e-9):.0f} Mo/s, sha256 {result['sha256'][:12]})")
+            with lock:
+                manifest[os.path.relpath(job['target'], bids_dir)] = {
+                    'source': job['source'], 'fingerprint': job['fingerprint'], 'sha256': result['sha256'],
+                }
+                save_manifest(manifest)
+        else:
+            print(f"Erreur avec {job['source']} : {result['message']}")
+        results.append(result)
+
+    with ThreadPoolExecutor(max_workers=max(n_jobs, 1)) as executor:
+        futures = [executor.submit(copy_meg_file, job) for job in jobs]
+        for future in as_completed(futures):
+            report(future.result())
+    return results
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Script pour traiter un ou des sujet BIDS.")
+    parser.add_argument(
+        '--subjects',
+        type=str,
+        nargs='+',  # Permet d'accepter plusieurs valeurs
+        required=True,
+        help="Liste des identifiants des sujets (par exemple, sub-08 sub-09)"
+    )
+    parser.add_argument('--jobs', '-j', type=int, default=2, help="Nombre de copies simultanées (défaut : 2)")
+    parser.add_argument('--overwrite', action='store_true', help="Recopier même les fichiers déjà copiés")
+    parser.add_argument('--verify', action='store_true',
+                        help="Relire les copies déjà faites et comparer leur SHA-256 à celui de la source "
+                             "noté au moment de la copie (détecte une copie modifiée ou remplacée depuis)")
+    args = parser.parse_args()
+    print(f"RAW_DIR: {RAW_DIR}")
+    print(f"BIDS_DIR: {BIDS_DIR}")
+    print(f"Sujet(s) traité(s) : {args.subjects}")
+
+    #### 1 création des sessions MEG pour les sujets déja présents dans BIDS_DIR et rennomage correct des fichiers .fif
+    BIDSsubjects = [x for x in args.subjects if 'sub-' in x]
+    files, failed = find_meg_files(BIDSsubjects)
+    manifest = load_manifest()
+    jobs, skipped, invalid = plan_copies(files, manifest, overwrite=args.overwrite, verify=args.verify)
+    failed += invalid
+    total_mb = sum(job['fingerprint'][0] for job in jobs) / 1e6
+    print(f"{len(files)} fichiers .fif détectés : {len(jobs)} à copier ({total_mb:.0f} Mo), "
+          f"{len(skipped)} déjà copiés, {len(failed)} en erreur")
 
+    start = time.perf_counter()
+    results = run_copies(jobs, args.jobs, manifest)
+    n_ok = sum(r['ok'] for r in results)
+    failed += [{'source': r['job']['source'], 'error': r['message']} for r in results if not r['ok']]
 
-parser = argparse.ArgumentParser(description="Script pour traiter un ou des sujet BIDS.")
-parser.add_argument(
-    '--subjects', 
-    type=str, 
-    nargs='+',  # Permet d'accepter plusieurs valeurs
-    required=True, 
-    help="Liste des identifiants des sujets (par exemple, sub-08 sub-09)"
-)
-args = parser.parse_args()
-print(f"Sujet(s) traité(s) : {args.subjects}")
-
-
-#### 1 création des sessions MEG pour les sujets déja présents dans BIDS_DIR et rennomage correct des fichiers .fif
-
-#recherche des sujet déjà présents dans BIDS_DIR
-#BIDSsubjects = os.listdir(BIDS_DIR)
-BIDSsubjects = args.subjects
-BIDSsubjects = [x for x in BIDSsubjects if 'sub-' in x]
-RAWsubjects = [x.replace('sub-', 'sub-1') for x in BIDSsubjects] #ajout d'un 1 après le tiret pour matcher avec la structure de RAW
-print('subjects detected', RAWsubjects)
-
-# on rentre dans le dossier de chaque sujet pour renommer les fichiers .fif
-i = 0
-for subject in RAWsubjects:
-    #on récupère les sessions effectuées dans RAW_DIR
-    subject_dir = os.path.join(RAW_DIR, subject)
-    #on effectue un screening des sessions MEG (sessions qui contienne un dossier 'meg')
-    RAWsessions = os.listdir(subject_dir)
-    RAWsessions = [x for x in RAWsessions if 'meg' in os.listdir(os.path.join(subject_dir, x))]
-    print('meg sessions detected', RAWsessions)
-    # on copie les fichiers .fif dans le dossier BIDS_DIR
-    for session in RAWsessions:
-        meg_session_dir = os.path.join(subject_dir, session, 'meg')
-        files = os.listdir(meg_session_dir)
-        files = [x for x in files if ('.fif' in x and 'run' in x)]
-        print('meg files detected which will be copied in BIDS format' ,files)
-        for file in files:
-            i+=1
-            BIDSsession = session.replace('sess_', 'ses-') # on remplace le _ par un tiret et sess par sess pour matcher avec la structure de RAW
-            BIDSsubject = subject.replace('sub-1', 'sub-')
-            match = re.search(r'run(\d+)', file)
-            BIDSrun = 'run-' + str(match.group(1))
-            cmd = 'cp ' + os.path.join(meg_session_dir, file) + ' ' + os.path.join(BIDS_DIR, BIDSsubject,BIDSsession, 'meg', BIDSsubject + '_' + BIDSsession +'_' + BIDSrun + '_task_raw.fif')
-            
-            #duplication des fichiers .fif dans le dossier BIDS_DIR
-            print(cmd)
-            destination_dir = os.path.join(BIDS_DIR, BIDSsubject, BIDSsession, 'meg')
-            os.makedirs(destination_dir, exist_ok=True)
-            os.system(cmd)
-            
-print(f'Total of {i} .fif files copied to BIDS format')
-            
+    print(f'Total of {n_ok} .fif files copied to BIDS format '
+          f'({len(skipped)} already copied, {time.perf_counter() - start:.1f}s)')
+    if failed:
+        print(f"\n{len(failed)} fichier(s) non copié(s) :")
+        for item in failed:
+            print(f"  {item['source']} : {item['error']}")
+        sys.exit(1)
 
 
+if __name__ == '__main__':
+    main()
@@ -9,11 +9,19 @@ import matplotlib.pyplot as plt
 import argparse
 from glob import glob
 import re
+import sys
+import time
+from concurrent.futures import ProcessPoolExecutor, as_completed
+from pathlib import Path
 import mne
 import warnings
 warnings.warn("ANNE CHECKS BETWEEN BEHAVIOR AND MEG" )
 import yaml
 
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent / '_utils'))
+from trigger_decoding import (load_trigger_map, stim_channels, channel_onsets, label_events,
+                              detection_key, trigger_cache_file, save_channel_onsets, load_channel_onsets)
+
 
 # load config variables 
 CONFIG_FILE = "_config.yaml"
@@ -21,6 +29,9 @@ try:
     with open(CONFIG_FILE, 'r') as file:
         config = yaml.safe_load(file)
         BIDS_DIR = config.get('bids_dir', '/default/bids/dir/')
+        TRIGGER_MAP = load_trigger_map(config)
+        # fronts détectés par run (.npz), pour ne pas relire les .fif quand seuls les réglages en aval changent
+        TRIGGER_CACHE_DIR = config.get('trigger_cache_dir') or os.path.join(BIDS_DIR, 'derivatives', 'trigger_cache')
         print(f"BIDS_DIR: {BIDS_DIR}")
 except FileNotFoundError:
     print(f"Le fichier de configuration '{CONFIG_FILE}' est introuvable.")
@@ -31,16 +42,6 @@ except yaml.YAMLError as e:
 
 
 
-parser = argparse.ArgumentParser(description="Script pour traiter un ou des sujet BIDS.")
-parser.add_argument(
-    '--subjects', 
-    type=str, 
-    nargs='+',  # Permet d'accepter plusieurs valeurs
-    required=True, 
-    help="Liste des identifiants des sujets (par exemple, sub-08 sub-09)"
-)
-args = parser.parse_args()
-print(f"Sujet(s) traité(s) : {args.subjects}")
     
     
 
@@ -99,16 +100,86 @@ def find_behavior_files(BIDS_DIR, subjects, BEH="beh", MEG="meg"):
     return results
 
 
+def read_stim_channels(meg_file, stim_channels):
+    """
+    Lit uniquement les voies de stimulation d'un run MEG.
+
+    Le fichier est ouvert sans préchargement, les voies STI sont sélectionnées,
+    puis seules leurs données sont chargées : la mémoire est proportionnelle au
+    nombre de voies STI (une dizaine) et non aux 306+ voies du run, ce qui permet
+    de traiter plusieurs runs en parallèle. Le résultat (temps, first_samp, sfreq)
+    est le même pour mne.find_events que sur le Raw complet.
+
+    Arguments :
+        meg_file (str) : Chemin du .fif.
+        stim_channels (list) : Noms des voies de stimulation à lire.
+
+    Retourne :
+        mne.io.Raw : Raw préchargé ne contenant que stim_channels.
+    """
+    raw = mne.io.read_raw_fif(meg_file, preload=False, allow_maxshield=True, verbose='ERROR')
+    missing = [ch for ch in stim_channels if ch not in raw.ch_names]
+    if missing:
+        raise ValueError(f"Voies de stimulation absentes de {meg_file} : {missing}")
+    raw.pick(stim_channels)
+    raw.load_data(verbose='ERROR')
+    return raw
+
+
+# colonne de temps du comportement utilisée pour apparier chaque type d'événement
+MATCH_COLUMNS = {'cue': 'cue_time', 'response': 'response_time', 'feedback': 'feedback_time',
+                 'questions': 'questions_time', 'answers': 'answers_time'}
+# écart maximal (échantillons) entre un événement et sa ligne comportementale ;
+# answers_time vaut startQuestion : la réponse est cherchée dans les 6 s de sa question
+# (même fenêtre que filter_answers_near_questions)
+MATCH_TOLERANCE = {'cue': 500, 'response': 500, 'feedback': 500, 'questions': 500, 'answers': 6000}
+
+
+def load_trigger_onsets(meg_file, channels, cache_dir=None, overwrite=False):
+    """
+    Fronts montants bruts de chaque voie STI d'un run, depuis le cache si possible.
+
+    Le cache (un .npz par run sous cache_dir) est valide tant que le .fif (taille,
+    date de modification) et la liste des voies sont inchangés ; sinon les voies
+    STI sont relues (read_stim_channels) et le cache réécrit.
+
+    Arguments :
+        meg_file (str) : Chemin du .fif.
+        channels (list) : Voies de stimulation à détecter.
+        cache_dir (str) : Dossier du cache (défaut : TRIGGER_CACHE_DIR).
+        overwrite (bool) : Ignorer le cache existant.
+
+    Retourne :
+        dict : {'onsets': {voie: tableau (n, 3)}, 'sfreq': float, 'first_samp': int, 'cached': bool}
+    """
+    cache_file = trigger_cache_file(cache_dir or TRIGGER_CACHE_DIR, BIDS_DIR, meg_file)
+    key = detection_key(meg_file, channels)
+    detection = None if overwrite else load_channel_onsets(cache_file, key)
+    if detection is not None:
+        return dict(detection, cached=True)
+
+    raw = read_stim_channels(meg_file, channels)
+    onsets = channel_onsets(raw.get_data(picks=channels), channels, first_samp=raw.first_samp)
+    save_channel_onsets(cache_file, key, onsets, raw.info['sfreq'], raw.first_samp)
+    return {'onsets': onsets, 'sfreq': raw.info['sfreq'], 'first_samp': raw.first_samp, 'cached': False}
+
+
 def filter_answers_near_questions(events_quest, events_answer, max_time_diff=6.0, sfreq=1000, max_events=4, time_window=16.0):
     """
     Filtrer les événements "answer" qui se produisent à moins de `max_time_diff` secondes des événements "quest",
     et limiter à un maximum de `max_events` événements dans une fenêtre temporelle de `time_window` secondes.
 
+    La question la plus proche de chaque réponse est trouvée par np.searchsorted
+    sur les temps de questions triés ; la limite de densité est appliquée en un
+    seul parcours avec une fenêtre glissante (deux indices) sur les réponses
+    déjà retenues.
+
     Arguments :
         events_quest : np.ndarray
             Tableau des événements de type "quest", format MNE [n_events, 3].
         events_answer : np.ndarray
-            Tableau des événements de type "answer", format MNE [n_events, 3].
+            Tableau des événements de type "answer", format MNE [n_events, 3], trié par temps
+            (comme le renvoient mne.find_events et decode_triggers).
         max_time_diff : float
             Différence maximale de temps en secondes entre "quest" et "answer".
         sfreq : int
@@ -119,25 +190,35 @@ def filter_answers_near_questions(events_quest, events_answer, max_time_diff=6.0
             Taille de la fenêtre temporelle en secondes pour limiter le nombre d'événements.
 
     Retourne :
-        np.ndarray : Tableau filtré des événements "answer".
+        np.ndarray : Tableau filtré des événements "answer" ([0, 3] si aucun).
     """
     max_time_diff_samples = int(max_time_diff * sfreq)  # Convertir la différence de temps en points temporels
     time_window_samples = int(time_window * sfreq)  # Convertir la fenêtre temporelle en points temporels
-    filtered_answers = []
-    answer_times = []  # Liste des temps des événements filtrés
-
-    for answer_event in events_answer:
-        answer_time = answer_event[0]  # Temps de l'événement "answer" en points temporels
-        
-        # Vérifier si un événement "quest" est proche dans le temps
-        if np.any(np.abs(answer_time - events_quest[:, 0]) <= max_time_diff_samples):
-            # Vérifier la densité temporelle des événements "answer"
-            recent_answers = [t for t in answer_times if answer_time - t <= time_window_samples]
-            if len(recent_answers) < max_events:
-                filtered_answers.append(answer_event)
-                answer_times.append(answer_time)  # Ajouter l'événement filtré à la liste
-
-    return np.array(filtered_answers)
+    events_answer = np.asarray(events_answer).reshape(-1, 3)
+    answer_times = events_answer[:, 0]
+    if np.any(np.diff(answer_times) < 0):
+        raise ValueError("events_answer doit être trié par temps")
+
+    # Distance de chaque "answer" à la "quest" la plus proche (voisines gauche et droite dans l'ordre trié)
+    quest_times = np.sort(np.asarray(events_quest).reshape(-1, 3)[:, 0])
+    if len(quest_times) == 0:
+        return events_answer[:0]
+    pos = np.searchsorted(quest_times, answer_times)
+    before = quest_times[np.maximum(pos - 1, 0)]
+    after = quest_times[np.minimum(pos, len(quest_times) - 1)]
+    near_question = np.minimum(np.abs(answer_times - before), np.abs(answer_times - after)) <= max_time_diff_samples
+
+    # Densité temporelle : au plus max_events réponses retenues dans les time_window dernières secondes
+    kept = []
+    first = 0  # première réponse retenue encore dans la fenêtre
+    for i in np.flatnonzero(near_question):
+        answer_time = answer_times[i]
+        while first < len(kept) and answer_time - answer_times[kept[first]] > time_window_samples:
+            first += 1
+        if len(kept) - first < max_events:
+            kept.append(i)
+
+    return events_answer[kept]
 
 
 def timing_alignment(behavior_data, start_event_value):
@@ -150,23 +231,67 @@ def timing_alignment(behavior_data, start_event_value):
     return behavior_data
 
 
-def match_metadata(events, beh_data, col_event, tolerance = 500):
-    events_times = events['onset']
-    # Boucle sur les événements de type RESPONSE
-    metadata = pd.DataFrame()
-    for time in events_times:
-        # Trouver l'indice du temps le plus proche dans feedb_behavior_time
-        closest_row = beh_data.iloc[(time - beh_data[col_event]).abs().idxmin()] # Trouver la ligne avec la plus petite différence temporelle
-        closest_row = closest_row.to_frame().T
-        # mise à jour du dataframe metadata 
-        metadata = pd.concat([metadata, closest_row], ignore_index=True)
-    
-    # ajout des metadonnées
-    events = pd.concat([events, metadata], axis=1)
-    return events
+def match_metadata(events, beh_data, event_columns, tolerance=500):
+    """
+    Associe à chaque événement MEG la ligne comportementale la plus proche dans le temps.
 
+    Tous les types d'événements sont appariés en un seul pd.merge_asof (direction
+    'nearest', par type) : chaque type est comparé à sa propre colonne de temps du
+    comportement. Au-delà de `tolerance`, l'événement reste sans métadonnées.
 
+    Arguments :
+        events : pd.DataFrame
+            Colonnes onset, duration, event_id et event_type (nom du type, clé de event_columns).
+        beh_data : pd.DataFrame
+            Comportement aligné sur les temps MEG (cf. timing_alignment).
+        event_columns : dict
+            Type d'événement -> colonne de temps de beh_data (ex. {'cue': 'cue_time'}).
+        tolerance : int ou dict
+            Écart maximal en échantillons, commun ou par type d'événement.
 
+    Retourne :
+        pd.DataFrame : events (même ordre) suivi des colonnes de beh_data, plus
+        beh_row (ligne appariée), match_delay (onset - temps comportemental) et
+        match_status : 'ok', 'unmatched' (rien dans la tolérance) ou 'double'
+        (plusieurs événements du même type appariés à la même ligne).
+    """
+    # Temps comportementaux au format long : une ligne par (ligne de beh_data, type d'événement)
+    beh_times = (beh_data[list(event_columns.values())]
+                 .rename(columns={col: name for name, col in event_columns.items()})
+                 .rename_axis('beh_row').reset_index()
+                 .melt(id_vars='beh_row', var_name='event_type', value_name='beh_time')
+                 .dropna(subset=['beh_time'])
+                 .sort_values('beh_time'))
+    beh_times['beh_time'] = beh_times['beh_time'].astype(float)
+
+    left = (events.reset_index(drop=True).rename_axis('event_row').reset_index()
+            .assign(onset_time=lambda df: df['onset'].astype(float))
+            .sort_values('onset_time'))
+    matched = pd.merge_asof(left, beh_times, left_on='onset_time', right_on='beh_time',
+                            by='event_type', direction='nearest').sort_values('event_row')
+
+    if not isinstance(tolerance, dict):
+        tolerance = dict.fromkeys(event_columns, tolerance)
+    matched['match_delay'] = matched['onset_time'] - matched['beh_time']
+    too_far = matched['match_delay'].abs() > matched['event_type'].map(tolerance)
+    matched.loc[too_far, ['beh_row', 'beh_time', 'match_delay']] = np.nan
+
+    double = matched['beh_row'].notna() & matched.duplicated(['event_type', 'beh_row'], keep=False)
+    matched['match_status'] = np.select([matched['beh_row'].isna(), double], ['unmatched', 'double'], default='ok')
+
+    metadata = beh_data.reset_index(drop=True).reindex(matched['beh_row'].fillna(-1).astype(int).values)
+    events = matched[list(events.columns) + ['beh_row', 'match_delay', 'match_status']].reset_index(drop=True)
+    return pd.concat([events, metadata.reset_index(drop=True)], axis=1)
+
+
+def report_matches(events):
+    """Affiche, par type d'événement, les événements sans ligne comportementale ou appariés en double."""
+    counts = events.groupby('event_type', sort=False)['match_status'].value_counts().unstack(fill_value=0)
+    for event_type, row in counts.iterrows():
+        issues = {status: row.get(status, 0) for status in ('unmatched', 'double') if row.get(status, 0)}
+        if issues:
+            print(f"{event_type}: " + ', '.join(f"{n} {status}" for status, n in issues.items())
+                  + f" sur {row.sum()} événements")
 
 
 def check_events_number(events, event_id_map):
@@ -221,7 +346,160 @@ def create_missing_events(event_name,beh_data, event_id_map):
     
 
 
+def add_events_file(beh_file_dir, events_file_dir, meg_file_dir, redetect=False, plot=True):
+    """
+    Détecte les événements d'un run, les apparie au comportement et écrit le events.tsv.
+
+    Arguments :
+        beh_file_dir, events_file_dir, meg_file_dir (str) : Tuple renvoyé par find_behavior_files.
+        redetect (bool) : Relire les voies STI même si le cache des triggers est à jour.
+        plot (bool) : Tracer les événements quand la détection est incomplète.
+
+    Retourne :
+        dict : events_file, meg_file, ok, counts (événements écrits par type, + start),
+        validated (check_events_number), recreated (types recréés depuis le comportement),
+        match_issues (nombre d'événements 'unmatched' / 'double'), cached, duration.
+    """
+    start = time.perf_counter()
+    # make a dictionnary with all triggers (channels and event ids: section 'triggers' of _config.yaml)
+    event_id = {name: spec['event_id'] for name, spec in TRIGGER_MAP['events'].items()}
+    trigger_channels = stim_channels(TRIGGER_MAP)
+    recreated = []
+
+    print(f"Reading {meg_file_dir}")
+    detection = load_trigger_onsets(meg_file_dir, trigger_channels, overwrite=redetect)
+    if detection['cached']:
+        print('Triggers read from cache')
+    behavior_data = pd.read_csv(beh_file_dir, sep='\t') # warning, there is some comma in the file. sep='\t' is not optional !
+    
+    
+    # EVENTS DETECTION
+    print('Finding events...')
+    #find events: onsets of all STI channels labelled from the table (first event dropped except for 'start', cf. skip_first)
+    triggers = label_events(detection['onsets'], TRIGGER_MAP)
+    events_start = triggers['start'] # here we do not remove the first event, which is the only one !
+    events_cue = triggers['cue']
+    events_resp = triggers['response']
+    events_feedb = triggers['feedback']
+    events_quest = triggers['questions']
+    events_answ = triggers['answers']
+    #filter answers
+    # print(events_feedb) # TODO check timing between plot event_detection !
+    # print(len(events_feedb))
+    events_answ = filter_answers_near_questions(events_quest, events_answ)
+    
+    # check events detection (events numbers, dependant of event type) 
+    tmp_events = np.concatenate((events_start, events_cue, events_resp, events_feedb, events_quest, events_answ,), axis=0)
+    is_well_detected = check_events_number(tmp_events,event_id)
+    
+    # alignement des temps MEG (pc meg) avec les temps behavior (pc behavior)
+    behavior_data = timing_alignment(behavior_data, events_start[0, 0]) 
+    
+    
+    ###### HANDLE BAD DETECTION ######
+    #plot events if issue detected
+    if all(is_well_detected.values()):
+        print("Tous les événements ont été bien détectés.")
+    else:
+        # Filtrer event_id pour inclure uniquement les ids présents
+        available_event_ids = set(tmp_events[:, 2])
+        filtered_event_id = {key: val for key, val in event_id.items() if val in available_event_ids} 
+        if plot:
+            fig = mne.viz.plot_events(tmp_events, event_id=filtered_event_id, sfreq=detection['sfreq'])
+        #user = input("yes to try detecting with behavior file")
+        user = 'yes'
+    
+        # # create events if necessary
+        if user == 'yes':
+            for event_name, value in is_well_detected.items():
+                if not value:
+                    print('\n EVENT',event_name)
+                    if event_name == 'cue':
+                        events_cue = create_missing_events(event_name, behavior_data,event_id)
+                        print('recreate cue')
+                    elif event_name == 'feedback':
+                        events_feedb = create_missing_events(event_name, behavior_data, event_id)
+                        print('recreate feedback')
+                    else :
+                        raise NotImplementedError(f"Recréation des événements '{event_name}' non prise en charge")
+                    recreated.append(event_name)
+                
+    
+    
+    ##### AJOUT DES INFORMATIONS EN PROVENANCE DU TSV ######
+    # et reformatage des timing du .csv et du .fif pour comparaison
+    
+    #conversion events to dataframe
+    events = pd.concat([pd.DataFrame(events_type, columns=["onset", "duration", "event_id"]).assign(event_type=name)
+                        for name, events_type in [('cue', events_cue), ('response', events_resp), ('feedback', events_feedb),
+                                                  ('questions', events_quest), ('answers', events_answ)]],
+                       ignore_index=True)
+    
+    #add the related metadata to each events (all types in one call)
+    events = match_metadata(events, behavior_data, MATCH_COLUMNS, tolerance=MATCH_TOLERANCE)
+    report_matches(events)
+    counts = events['event_type'].value_counts().reindex(MATCH_COLUMNS, fill_value=0)
+    match_issues = events.loc[events['match_status'] != 'ok', 'match_status'].value_counts()
+    
+    
+    SEC = 1000 # for ms to s conversion
+    events['start_event_time'] = events['start_event_time'] / SEC
+    events['onset'] = events['onset'] / SEC
+    events['cue_time'] = events['cue_time'] / SEC
+    events['feedback_time'] = events['feedback_time'] / SEC
+    events['response_time'] = events['response_time'] / SEC
+    events['questions_time'] = events['questions_time'] / SEC
+    events['answers_time'] = events['answers_time'] / SEC
+
+    col_to_save = ["onset",	"duration",	"event_id",	"TrialID",	"arm_choice",	"color_choice",	"reward",	
+                "trial_start",	"RT",	"A",	"B",	"outcome_SD",	"forced",	"A_mean",	"B_mean",]
+    col_to_save = col_to_save + ["start_event_time", "cue_time", "response_time","feedback_time", "questions_time", "answers_time"]
+    events = events[col_to_save]
+    
+    
+    events.to_csv(events_file_dir, sep='\t', index=False)     
+    print(f"Saved events file to {events_file_dir}")
+    print('\n\n')
+
+    return {
+        'events_file': events_file_dir,
+        'meg_file': meg_file_dir,
+        'ok': True,
+        'counts': {'start': len(events_start), **counts.to_dict()},
+        'validated': is_well_detected,
+        'recreated': recreated,
+        'match_issues': match_issues.to_dict(),
+        'cached': detection['cached'],
+        'duration': time.perf_counter() - start,
+    }
+
+
+def _add_events_file_job(job):
+    """add_events_file pour un tuple de find_behavior_files ; les erreurs sont renvoyées, pas levées."""
+    beh_file_dir, events_file_dir, meg_file_dir = job['files']
+    try:
+        return add_events_file(beh_file_dir, events_file_dir, meg_file_dir, redetect=job['redetect'], plot=job['plot'])
+    except Exception as e:
+        return {'events_file': events_file_dir, 'meg_file': meg_file_dir, 'ok': False,
+                'error': f"{type(e).__name__}: {e}"}
+
+
 if '__main__' == __name__ :
+    parser = argparse.ArgumentParser(description="Script pour traiter un ou des sujet BIDS.")
+    parser.add_argument(
+        '--subjects', 
+        type=str, 
+        nargs='+',  # Permet d'accepter plusieurs valeurs
+        required=True, 
+        help="Liste des identifiants des sujets (par exemple, sub-08 sub-09)"
+    )
+    parser.add_argument('--jobs', '-j', type=int, default=1,
+                        help="Nombre de runs traités en parallèle (processus, défaut : 1)")
+    parser.add_argument('--redetect', action='store_true',
+                        help="Relire les voies STI des .fif même si le cache des triggers est à jour")
+    args = parser.parse_args()
+    print(f"Sujet(s) traité(s) : {args.subjects}")
+
     #recherche des sujet déjà présents dans BIDS_DIR
     # subjects = os.listdir(BIDS_DIR)
     subjects = args.subjects
@@ -229,131 +507,28 @@ if '__main__' == __name__ :
     results = find_behavior_files(BIDS_DIR,subjects)
     print('subjects detected', subjects)
 
+    # un run par processus (--jobs > 1) ; pas de figure dans les workers
+    jobs = [{'files': files, 'redetect': args.redetect, 'plot': args.jobs <= 1} for files in results]
+    if args.jobs <= 1:
+        outcomes = [_add_events_file_job(job) for job in jobs]
+    else:
+        with ProcessPoolExecutor(max_workers=args.jobs) as executor:
+            futures = [executor.submit(_add_events_file_job, job) for job in jobs]
+            outcomes = [future.result() for future in as_completed(futures)]
+
+    # RAPPORT FINAL
+    failed = [r for r in outcomes if not r['ok']]
+    print(f"{len(outcomes) - len(failed)}/{len(outcomes)} runs traités")
+    for r in sorted(outcomes, key=lambda r: r['events_file']):
+        name = os.path.basename(r['events_file'])
+        if not r['ok']:
+            print(f"  ❌ {name} : {r['error']}")
+            continue
+        not_validated = [event for event, ok in r['validated'].items() if not ok]
+        print(f"  {name} : " + ', '.join(f"{event}={n}" for event, n in r['counts'].items())
+              + (f" | non validés : {not_validated}" if not_validated else '')
+              + (f" | recréés : {r['recreated']}" if r['recreated'] else '')
+              + (f" | appariement : {r['match_issues']}" if r['match_issues'] else ''))
+    if failed:
+        sys.exit(1)
 
-    for beh_file_dir, events_file_dir, meg_file_dir in results:
-        print(f"Reading {meg_file_dir}")
-        raw = mne.io.read_raw_fif(meg_file_dir, preload=True, allow_maxshield=True, verbose='ERROR')
-        behavior_data = pd.read_csv(beh_file_dir, sep='\t') # warning, there is some comma in the file. sep='\t' is not optional !
-        
-        
-        # EVENTS DETECTION
-        print('Finding events...')
-        # make a dictionnary with all triggers
-        event_id = {'start':1,'cue': 5,'response': 10,'feedback': 15, 'questions':20, 'answers':25}
-        # declare channels for TTL detection
-        start_chan = 'STI006'
-        cue_chan = 'STI001'
-        resp_chan = 'STI002'
-        feedb_chan = 'STI003'
-        iti_chan = 'STI004'
-        
-        quest_chan = ['STI005']
-        answer_chan = ['STI009','STI010','STI012','STI013']
-        
-        #find events
-        events_start = mne.find_events(raw, stim_channel=start_chan, shortest_event=1,verbose='WARNING')
-        events_start[:,2]= event_id['start']
-        events_start = events_start[:,:] # here we do not remove the first event, which is the only one !
-        
-        events_cue  = mne.find_events(raw, stim_channel=cue_chan, shortest_event=1,verbose='WARNING')
-        events_cue[:,2]= event_id['cue']
-        events_cue = events_cue[1:,:]
-        events_resp  = mne.find_events(raw, stim_channel=resp_chan, shortest_event=1,verbose='WARNING')
-        events_resp[:,2]= event_id['response']
-        events_resp = events_resp[1:,:]
-        events_feedb = mne.find_events(raw, stim_channel=feedb_chan, shortest_event=1,verbose='WARNING')
-        events_feedb[:,2]= event_id['feedback']
-        events_feedb = events_feedb[1:,:]
-        
-        events_quest  = mne.find_events(raw, stim_channel=quest_chan, shortest_event=1, verbose='WARNING')
-        events_quest[:,2]= event_id['questions']
-        events_quest = events_quest[1:,:]
-        events_answ  = mne.find_events(raw, stim_channel=answer_chan, shortest_event=1,verbose='WARNING')
-        events_answ[:,2]= event_id['answers']
-        events_answ = events_answ[1:,:]
-        #filter answers
-        # print(events_feedb) # TODO check timing between plot event_detection !
-        # print(len(events_feedb))
-        events_answ = filter_answers_near_questions(events_quest, events_answ)
-        
-        # check events detection (events numbers, dependant of event type) 
-        tmp_events = np.concatenate((events_start, events_cue, events_resp, events_feedb, events_quest, events_answ,), axis=0)
-        is_well_detected = check_events_number(tmp_events,event_id)
-        
-        # alignement des temps MEG (pc meg) avec les temps behavior (pc behavior)
-        behavior_data = timing_alignment(behavior_data, events_start[0, 0]) 
-        
-        
-        ###### HANDLE BAD DETECTION ######
-        #plot events if issue detected
-        if all(is_well_detected.values()):
-            print("Tous les événements ont été bien détectés.")
-        else:
-            # Filtrer event_id pour inclure uniquement les ids présents
-            available_event_ids = set(tmp_events[:, 2])
-            filtered_event_id = {key: val for key, val in event_id.items() if val in available_event_ids} 
-            fig = mne.viz.plot_events(tmp_events, event_id=filtered_event_id, sfreq=raw.info['sfreq'])
-            #user = input("yes to try detecting with behavior file")
-            user = 'yes'
-        
-            # # create events if necessary
-            if user == 'yes':
-                for event_name, value in is_well_detected.items():
-                    if not value:
-                        print('\n EVENT',event_name)
-                        if event_name == 'cue':
-                            events_cue = create_missing_events(event_name, behavior_data,event_id)
-                            print('recreate cue')
-                        elif event_name == 'feedback':
-                            events_feedb = create_missing_events(event_name, behavior_data, event_id)
-                            print('recreate feedback')
-                        else :
-                            raise "not handle"
-                    
-        
-        
-        ##### AJOUT DES INFORMATIONS EN PROVENANCE DU TSV ######
-        # et reformatage des timing du .csv et du .fif pour comparaison
-        
-        #conversion events to dataframe
-        events_cue = pd.DataFrame(events_cue, columns=["onset", "duration", "event_id"])
-        events_resp = pd.DataFrame(events_resp, columns=["onset", "duration", "event_id"])
-        events_feedb = pd.DataFrame(events_feedb, columns=["onset", "duration", "event_id"])
-        events_quest = pd.DataFrame(events_quest, columns=["onset", "duration", "event_id"])
-        events_answ = pd.DataFrame(events_answ, columns=["onset", "duration", "event_id"])
-        
-        #add the related metadata to each events
-        events_cue = match_metadata(events_cue,behavior_data, col_event='cue_time')
-        events_resp = match_metadata(events_resp,behavior_data, col_event='response_time')
-        events_feedb = match_metadata(events_feedb,behavior_data, col_event='feedback_time')
-        events_quest = match_metadata(events_quest,behavior_data, col_event='questions_time')
-        events_answ = match_metadata(events_answ,behavior_data, col_event='answers_time')
-        
-        
-        ### Concaténation final           
-        events = pd.concat((events_cue,events_resp,events_feedb,events_quest,events_answ),axis=0)
-        
-        SEC = 1000 # for ms to s conversion
-        events['start_event_time'] = events['start_event_time'] / SEC
-        events['onset'] = events['onset'] / SEC
-        events['cue_time'] = events['cue_time'] / SEC
-        events['feedback_time'] = events['feedback_time'] / SEC
-        events['response_time'] = events['response_time'] / SEC
-        events['questions_time'] = events['questions_time'] / SEC
-        events['answers_time'] = events['answers_time'] / SEC
-
-        col_to_save = ["onset",	"duration",	"event_id",	"TrialID",	"arm_choice",	"color_choice",	"reward",	
-                    "trial_start",	"RT",	"A",	"B",	"outcome_SD",	"forced",	"A_mean",	"B_mean",]
-        col_to_save = col_to_save + ["start_event_time", "cue_time", "response_time","feedback_time", "questions_time", "answers_time"]
-        events = events[col_to_save]
-        
-        
-        events.to_csv(events_file_dir, sep='\t', index=False)     
-        print(f"Saved events file to {events_file_dir}")
-        print('\n\n')
-
-                        
-                        
-
-
-                    
\ No newline at end of file
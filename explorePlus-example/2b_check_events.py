@@ -6,13 +6,18 @@ if it is not the case. Writing a new 'filtered_events.tsv' which is then used as
 '''
 
 import os
+import sys
 from pathlib import Path
+import numpy as np
 import pandas as pd
 import matplotlib.pyplot as plt
 import re
 import argparse
 import yaml
 
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent / '_utils'))
+from trigger_decoding import load_trigger_map, stim_channels, label_events, detection_key, trigger_cache_file, load_channel_onsets
+
 
 
 # load config variables 
@@ -21,6 +26,9 @@ try:
     with open(CONFIG_FILE, 'r') as file:
         config = yaml.safe_load(file)
         BIDS_DIR = config.get('bids_dir', '/default/bids/dir/')
+        TRIGGER_MAP = load_trigger_map(config)
+        # cache des triggers écrit par 2_add_events_files.py
+        TRIGGER_CACHE_DIR = config.get('trigger_cache_dir') or os.path.join(BIDS_DIR, 'derivatives', 'trigger_cache')
         print(f"BIDS_DIR: {BIDS_DIR}")
 except FileNotFoundError:
     print(f"Le fichier de configuration '{CONFIG_FILE}' est introuvable.")
@@ -38,6 +46,7 @@ parser.add_argument(
     required=True, 
     help="Liste des identifiants des sujets (par exemple, sub-08 sub-09)"
 )
+parser.add_argument('--no-plots', action='store_true', help="Ne pas tracer ni sauvegarder les comparaisons de timings")
 args = parser.parse_args()
 print(f"Sujet(s) traité(s) : {args.subjects}")
 
@@ -126,74 +135,114 @@ def save_event_comparisons(tsv_event, events_df, filtered_events, compare_timing
 
 
 
-def compute_behtime_diff(events_df):
-    events_df.loc[events_df['event_id'] == 5, 'behtime_diff'] = (
-        events_df.loc[events_df['event_id'] == 5].groupby('event_id')['cue_time'].diff()
-    )
-    
-    events_df.loc[events_df['event_id'] == 10, 'behtime_diff'] = (
-        events_df.loc[events_df['event_id'] == 10].groupby('event_id')['response_time'].diff()
-    )
-    events_df.loc[events_df['event_id'] == 15, 'behtime_diff'] = (
-        events_df.loc[events_df['event_id'] == 15].groupby('event_id')['feedback_time'].diff()
-    )
-    events_df.loc[events_df['event_id'] == 20, 'behtime_diff'] = (
-        events_df.loc[events_df['event_id'] == 20].groupby('event_id')['questions_time'].diff()
-    )
-    events_df.loc[events_df['event_id'] == 25, 'behtime_diff'] = (
-        events_df.loc[events_df['event_id'] == 25].groupby('event_id')['answers_time'].diff()
-    )
-    
+# colonne de temps du comportement de chaque type d'événement (ids : section 'triggers' de _config.yaml)
+BEHAVIOR_TIME_COLUMNS = {'cue': 'cue_time', 'response': 'response_time', 'feedback': 'feedback_time',
+                         'questions': 'questions_time', 'answers': 'answers_time'}
+# types dont la cohérence des timings .fif / comportement est contrôlée, et écart toléré (s)
+CHECKED_EVENTS = ['cue', 'response', 'feedback']
+TIMING_TOLERANCE = 0.01
+
+
+def compute_timing_diffs(events_df):
+    '''
+    Ajoute onset_diff, behtime_diff et timing_diff (= behtime_diff - onset_diff).
+
+    Intervalles entre événements successifs d'un même type, côté .fif (onset) et
+    côté comportement (colonne de BEHAVIOR_TIME_COLUMNS du type), calculés en un
+    seul groupby().diff() ; le premier événement de chaque type vaut 0.
+    Un événement sans temps comportemental (non apparié) est laissé de côté : ses
+    intervalles valent NaN et l'événement suivant du même type est comparé au
+    précédent événement apparié.
+    '''
+    event_ids = {TRIGGER_MAP['events'][name]['event_id']: column for name, column in BEHAVIOR_TIME_COLUMNS.items()}
+    unknown = ~events_df['event_id'].isin(list(event_ids))
+    if unknown.any():
+        raise NotImplementedError(f"Tsv_file contains rows not described in the function (event_id {sorted(events_df.loc[unknown, 'event_id'].unique())})")
+
+    # temps comportemental de chaque ligne, pris dans la colonne de son type
+    columns = list(event_ids.values())
+    column_index = events_df['event_id'].map({event_id: columns.index(column) for event_id, column in event_ids.items()})
+    behtime = events_df[columns].to_numpy(dtype=float)[np.arange(len(events_df)), column_index.to_numpy()]
+
     # TODO handle the 'behtime_diff' == 0 because two times the same timing in the raw 
-    
+    times = pd.DataFrame({'onset_diff': events_df['onset'].to_numpy(dtype=float), 'behtime_diff': behtime},
+                         index=events_df.index)
+    matched = times['behtime_diff'].notna()
+    event_id = events_df.loc[matched, 'event_id']
+    diffs = times[matched].groupby(event_id).diff()
     # handle first event of each type
-    events_df.loc[events_df.groupby('event_id').head(1).index, 'behtime_diff'] = 0
-    
-    if events_df['behtime_diff'].isna().any():
-        raise NotImplementedError("Tsv_file contains rows not described in the function")
-    return events_df
+    diffs[event_id.groupby(event_id).cumcount() == 0] = 0
+    diffs = diffs.reindex(events_df.index)
 
-def compute_onset_diff(events_df):
-    events_df['onset_diff'] = events_df.groupby('event_id')['onset'].diff()
-    # handle first event of each type
-    events_df.loc[events_df.groupby('event_id').head(1).index, 'onset_diff'] = 0
+    events_df = events_df.assign(onset_diff=diffs['onset_diff'], behtime_diff=diffs['behtime_diff'])
+    events_df['timing_diff'] = events_df['behtime_diff'] - events_df['onset_diff']
     return events_df
 
+
+def timing_mask(events_df, tolerance=TIMING_TOLERANCE):
+    '''Lignes conservées : types non contrôlés, ou |timing_diff| <= tolerance. BE CAREFUL no check for questions and answers type'''
+    checked = events_df['event_id'].isin([TRIGGER_MAP['events'][name]['event_id'] for name in CHECKED_EVENTS])
+    return ~checked | (events_df['timing_diff'].abs() <= tolerance)
+
+
+def detected_trigger_counts(tsv_event):
+    '''
+    Nombre de triggers détectés dans le .fif pour chaque type d'événement, lu dans le
+    cache de 2_add_events_files.py (sans relire le .fif). None si le cache est absent
+    ou ne correspond plus au .fif.
+    '''
+    fif_file = re.sub(r'_task-beh_events\.tsv$', '_task_raw.fif', str(tsv_event))
+    key = detection_key(fif_file, stim_channels(TRIGGER_MAP)) if os.path.exists(fif_file) else None
+    detection = load_channel_onsets(trigger_cache_file(TRIGGER_CACHE_DIR, BIDS_DIR, fif_file), key)
+    if detection is None:
+        return None
+    events = label_events(detection['onsets'], TRIGGER_MAP)
+    return {TRIGGER_MAP['events'][name]['event_id']: len(events[name]) for name in events}
+
+
 def remove_events(events_df):
-    '''  Remove the incoherent events, BE CAREFUL no check for questions and answers type'''
-    
-    event_condition = events_df['event_id'].isin([5, 10, 15])
-    timing_condition = abs(events_df['timing_diff']) <= 0.01
-    events_df = events_df[~event_condition | (event_condition & timing_condition)]
-    return events_df
+    '''  Remove the incoherent events (cf. timing_mask)'''
+    mask = timing_mask(events_df)
+    unmatched = ~mask & events_df['behtime_diff'].isna()
+    if unmatched.any():
+        print(f"{unmatched.sum()} événements sans temps comportemental (non appariés) retirés")
+    return events_df[mask]
 
 
 if __name__ == '__main__':
     # Recherche récursive des fichiers events.tsv
-    all_tsv_events = [file for file in Path(BIDS_DIR).rglob('*_events.tsv') if 'derivatives' not in file.parts]
+    # (seulement dans les dossiers des sujets demandés)
     sub_list = args.subjects
-    all_tsv_events = [file for file in all_tsv_events if any(sub in file.parts for sub in sub_list)]
+    all_tsv_events = [file for sub in sub_list for file in sorted((Path(BIDS_DIR) / sub).rglob('*_events.tsv'))
+                      if 'derivatives' not in file.parts]
     
     for tsv_event in all_tsv_events:
         events_df = pd.read_csv(tsv_event, sep='\t')
         print('Reading',tsv_event)
         
         #### inter events #### 
-        # create 2 more columns for 'inter events' timings
-        events_df = compute_onset_diff(events_df)
-        events_df = compute_behtime_diff(events_df)
+        # create 3 more columns for 'inter events' timings and their comparison .fif et behavior
+        events_df = compute_timing_diffs(events_df)
         # TODO compute cue_time 
         # TODO (+ question/anwer time ?)
         
-        # Create 1 more column for 'inter events' comparison .fif et behavior
-        events_df['timing_diff'] = events_df.apply(lambda row: row['behtime_diff'] - row['onset_diff'] ,axis=1)
-        
         #filtering
         filtered_events = remove_events(events_df) 
        
         ### plot and save final plot events ###
-        save_event_comparisons(str(tsv_event), events_df, filtered_events, compare_timing)
+        if not args.no_plots:
+            save_event_comparisons(str(tsv_event), events_df, filtered_events, compare_timing)
+        
         
+        # triggers détectés dans le .fif (cache) -> events.tsv -> après filtrage
+        detected = detected_trigger_counts(tsv_event)
+        if detected is None:
+            print("Pas de cache de triggers pour ce run (lancer 2_add_events_files.py)")
+        else:
+            for name, spec in TRIGGER_MAP['events'].items():
+                event_id = spec['event_id']
+                print(f"{name}: {detected[event_id]} détectés, {(events_df['event_id'] == event_id).sum()} dans events.tsv, "
+                      f"{(filtered_events['event_id'] == event_id).sum()} après filtrage")
         
         base_name, ext = os.path.splitext(tsv_event)
         filtered_events.round(3).to_csv(f"{base_name}_filtered{ext}", sep='\t', index=False)
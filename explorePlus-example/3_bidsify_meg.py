@@ -2,11 +2,11 @@
 mne bidsification of meg data
 '''
 import os
+import sys
 import argparse
 import pdb
 from datetime import datetime, timezone
 
-import numpy as np
 import pandas as pd
 
 import mne
@@ -14,6 +14,8 @@ from mne_bids import BIDSPath, write_raw_bids, write_meg_calibration, write_meg_
 from pathlib import Path
 import yaml
 
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent / '_utils'))
+from channel_mapping import load_channel_mapping, apply_channel_mapping
 
 
 
@@ -24,6 +26,7 @@ try:
         config = yaml.safe_load(file)
         BIDS_DIR = config.get('bids_dir', '/default/bids/dir/')
         SSS_DIR = config.get('sss_dir', '/default/bids/dir/')
+        CHANNEL_MAPPING = load_channel_mapping(config)
         print(f"BIDS_DIR: {BIDS_DIR}")
 except FileNotFoundError:
     print(f"Le fichier de configuration '{CONFIG_FILE}' est introuvable.")
@@ -43,18 +46,6 @@ parser.add_argument(
 args = parser.parse_args()
 print(f"Sujet(s) traité(s) : {args.subjects}")
 
-def rename_BIO_channels(raw):
-    # The current version of the MNE BIDS pipeline doesn't handle BIO channels, so the best is that you rename them
-    index_ECG = np.where([raw.info['ch_names'][i] == 'BIO001' for i in range(len(raw.info['ch_names']))])[0][0]
-    index_E0G1 = np.where([raw.info['ch_names'][i] == 'BIO002' for i in range(len(raw.info['ch_names']))])[0][0]
-    index_E0G2 = np.where([raw.info['ch_names'][i] == 'BIO003' for i in range(len(raw.info['ch_names']))])[0][0]
-
-    raw.info['ch_names'][index_ECG] = 'ECG063'
-    raw.info['ch_names'][index_E0G1] = 'E0G061'
-    raw.info['ch_names'][index_E0G2] = 'E0G062'
-
-
-
 #subjects = os.listdir(BIDS)
 subjects = args.subjects
 subjects = [x for x in subjects if 'sub-' in x]
@@ -125,10 +116,9 @@ for posix in posix_paths:
         
         
         ###------------------------ RENAME BIO CHANNELS -----------------------------###
-        rename_mapping = {"BIO001": "ECG063",
-                          "BIO002": "EOG061",
-                          "BIO003": "EOG062",}
-        mne.rename_channels(raw.info, rename_mapping)
+        # The current version of the MNE BIDS pipeline doesn't handle BIO channels,
+        # they are renamed from the 'channels' section of _config.yaml
+        apply_channel_mapping(raw, CHANNEL_MAPPING)
         # raw.info['helium_info']['meas_date'] = datetime.now(timezone.utc)
         # print(type(raw.info['helium_info']['meas_date']))
         ###-----------------------------------------------------------------------------#
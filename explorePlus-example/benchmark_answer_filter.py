@@ -0,0 +1,119 @@
+'''
+Equivalence check and benchmark of filter_answers_near_questions (2_add_events_files.py).
+
+The previous implementation (one np.abs scan over all questions per answer and a
+list comprehension over the accepted answers for the density cap) is kept here
+as the reference:
+  - check: on many random (seeded) answer/question streams, including ties,
+    bursts, no question at all and time windows shorter than the bursts, both
+    implementations must return exactly the same events;
+  - benchmark: dense synthetic answer streams of increasing size.
+
+Usage (from explorePlus-example/):
+    python benchmark_answer_filter.py
+    python benchmark_answer_filter.py --checks 2000 --sizes 1000 10000 50000
+'''
+
+import time
+import argparse
+import importlib.util
+from pathlib import Path
+
+import numpy as np
+
+
+def _load_events_module():
+    """Import 2_add_events_files.py (not importable by name: it starts with a digit)."""
+    path = Path(__file__).resolve().parent / '2_add_events_files.py'
+    spec = importlib.util.spec_from_file_location('add_events_files', path)
+    module = importlib.util.module_from_spec(spec)
+    spec.loader.exec_module(module)
+    return module
+
+
+def filter_answers_reference(events_quest, events_answer, max_time_diff=6.0, sfreq=1000, max_events=4, time_window=16.0):
+    """Previous implementation, unchanged."""
+    max_time_diff_samples = int(max_time_diff * sfreq)
+    time_window_samples = int(time_window * sfreq)
+    filtered_answers = []
+    answer_times = []
+
+    for answer_event in events_answer:
+        answer_time = answer_event[0]
+        if np.any(np.abs(answer_time - events_quest[:, 0]) <= max_time_diff_samples):
+            recent_answers = [t for t in answer_times if answer_time - t <= time_window_samples]
+            if len(recent_answers) < max_events:
+                filtered_answers.append(answer_event)
+                answer_times.append(answer_time)
+
+    return np.array(filtered_answers)
+
+
+def make_streams(rng, n_answers, n_questions, duration):
+    """Sorted MNE-like event arrays: answers in bursts around random questions, plus isolated answers."""
+    quest_times = np.sort(rng.integers(0, duration, size=n_questions))
+    if n_questions:
+        burst = rng.choice(quest_times, size=n_answers) + rng.integers(-8000, 8000, size=n_answers)
+    else:
+        burst = rng.integers(0, duration, size=n_answers)
+    isolated = rng.integers(0, duration, size=n_answers // 4)
+    answer_times = np.sort(np.concatenate([burst, isolated])[:n_answers])
+
+    def events(times, event_id):
+        return np.column_stack([times, np.zeros_like(times), np.full_like(times, event_id)]).astype(np.int64)
+
+    return events(quest_times, 20), events(answer_times, 25)
+
+
+def check_equivalence(filter_answers, n_checks, seed=0):
+    rng = np.random.default_rng(seed)
+    for i in range(n_checks):
+        n_answers = int(rng.integers(0, 200))
+        n_questions = int(rng.integers(0, 30)) if i % 10 else 0
+        events_quest, events_answer = make_streams(rng, n_answers, n_questions, int(rng.integers(10_000, 600_000)))
+        params = dict(max_time_diff=float(rng.choice([0.5, 2.0, 6.0])), sfreq=int(rng.choice([250, 1000])),
+                      max_events=int(rng.integers(1, 8)), time_window=float(rng.choice([1.0, 4.0, 16.0])))
+
+        expected = filter_answers_reference(events_quest, events_answer, **params)
+        result = filter_answers(events_quest, events_answer, **params)
+        if len(expected) == 0:
+            # the previous code returned np.array([]) (shape (0,)), now (0, 3)
+            assert len(result) == 0, (i, params)
+        else:
+            assert np.array_equal(expected, result) and expected.dtype == result.dtype, (i, params)
+    print(f"  {n_checks} random streams: identical results")
+
+
+def _best_of(func, repeat):
+    best = float('inf')
+    for _ in range(repeat):
+        start = time.perf_counter()
+        func()
+        best = min(best, time.perf_counter() - start)
+    return best
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Equivalence check and benchmark of filter_answers_near_questions")
+    parser.add_argument('--checks', type=int, default=500, help="Number of random streams compared (default: 500)")
+    parser.add_argument('--sizes', type=int, nargs='+', default=[1_000, 5_000, 20_000],
+                        help="Number of answers of the benchmark streams (default: 1000 5000 20000)")
+    parser.add_argument('--repeat', type=int, default=3, help="Timing repetitions, best kept (default: 3)")
+    args = parser.parse_args()
+
+    filter_answers = _load_events_module().filter_answers_near_questions
+    check_equivalence(filter_answers, args.checks)
+
+    rng = np.random.default_rng(1)
+    for n_answers in args.sizes:
+        # dense stream: ~1 answer per 100 ms around questions every ~20 s, large window cap
+        events_quest, events_answer = make_streams(rng, n_answers, max(n_answers // 50, 1), n_answers * 100)
+        params = dict(max_events=50, time_window=16.0)
+        t_reference = _best_of(lambda: filter_answers_reference(events_quest, events_answer, **params), args.repeat)
+        t_new = _best_of(lambda: filter_answers(events_quest, events_answer, **params), args.repeat)
+        print(f"  {n_answers:7d} answers: reference {t_reference:8.3f}s, searchsorted + window {t_new:8.4f}s "
+              f"({t_reference / t_new:6.1f}x)")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,100 @@
+'''
+Benchmark of MEG trigger decoding on synthetic stim channels.
+
+Compares, on the trigger table of _config.yaml:
+  - find_events: one mne.find_events call per event type (previous code)
+  - one pass:    decode_triggers on the STI block read once (_utils/trigger_decoding.py)
+and checks that both give exactly the same events.
+
+Usage:
+    python benchmark_trigger_decoding.py                # 1 h run at 1 kHz
+    python benchmark_trigger_decoding.py --duration 600 --repeat 5
+'''
+
+import sys
+import time
+import argparse
+from pathlib import Path
+
+import numpy as np
+import mne
+import yaml
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent / '_utils'))
+from trigger_decoding import load_trigger_map, stim_channels, decode_triggers
+
+
+CONFIG_FILE = Path(__file__).resolve().parent / "_config.yaml"
+
+
+def make_stim_raw(channels, duration, sfreq=1000., n_pulses=2000, seed=0):
+    """
+    RawArray of stim channels with random TTL pulses: pulses of 1-50 samples,
+    some overlapping (steps between two non-zero levels), a pulse still high at
+    the end of the first channel, and a non-zero first_samp.
+    """
+    rng = np.random.default_rng(seed)
+    n_times = int(duration * sfreq)
+    data = np.zeros((len(channels), n_times))
+    for row in data:
+        onsets = np.sort(rng.choice(n_times - 100, size=n_pulses, replace=False))
+        widths = rng.integers(1, 50, size=n_pulses)
+        levels = rng.choice([1, 2, 5], size=n_pulses)
+        for onset, width, level in zip(onsets, widths, levels):
+            row[onset:onset + width] = np.maximum(row[onset:onset + width], level)
+    data[0, -10:] = 5
+    info = mne.create_info(channels, sfreq, 'stim')
+    return mne.io.RawArray(data, info, first_samp=4321, verbose='ERROR')
+
+
+def find_events_per_type(raw, trigger_map):
+    """Previous code: one mne.find_events call (full stim re-scan) per event type."""
+    decoded = {}
+    for name, spec in trigger_map['events'].items():
+        channels = spec['channels'] if len(spec['channels']) > 1 else spec['channels'][0]
+        events = mne.find_events(raw, stim_channel=channels, shortest_event=trigger_map['shortest_event'], verbose='ERROR')
+        events[:, 2] = spec['event_id']
+        decoded[name] = events[1:] if spec['skip_first'] else events
+    return decoded
+
+
+def decode_one_pass(raw, trigger_map):
+    channels = stim_channels(trigger_map)
+    return decode_triggers(raw.get_data(picks=channels), channels, trigger_map, first_samp=raw.first_samp)
+
+
+def _best_of(func, repeat):
+    best, result = float('inf'), None
+    for _ in range(repeat):
+        start = time.perf_counter()
+        result = func()
+        best = min(best, time.perf_counter() - start)
+    return best, result
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark of MEG trigger decoding")
+    parser.add_argument('--duration', type=float, default=3600, help="Run duration in seconds (default: 3600)")
+    parser.add_argument('--repeat', type=int, default=3, help="Timing repetitions, best kept (default: 3)")
+    args = parser.parse_args()
+
+    with open(CONFIG_FILE, 'r') as file:
+        trigger_map = load_trigger_map(yaml.safe_load(file))
+    channels = stim_channels(trigger_map)
+    raw = make_stim_raw(channels, args.duration)
+    print(f"Synthetic run: {len(channels)} stim channels, {raw.n_times} samples")
+
+    t_find_events, reference = _best_of(lambda: find_events_per_type(raw, trigger_map), args.repeat)
+    t_one_pass, decoded = _best_of(lambda: decode_one_pass(raw, trigger_map), args.repeat)
+
+    for name in trigger_map['events']:
+        assert np.array_equal(reference[name], decoded[name]), f"decoders disagree on {name}"
+    n_events = sum(len(events) for events in decoded.values())
+    print(f"  {n_events} events, identical for both decoders")
+    print(f"  find_events per type: {t_find_events:8.3f}s")
+    print(f"  one pass            : {t_one_pass:8.3f}s")
+    print(f"  speedup             : {t_find_events / t_one_pass:8.1f}x")
+
+
+if __name__ == '__main__':
+    main()
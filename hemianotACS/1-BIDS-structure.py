@@ -15,6 +15,9 @@ import yaml
 from collections import Counter
 from typing import Tuple, Optional, List, Dict
 
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent / '_utils'))
+from channel_mapping import load_channel_mapping, apply_channel_mapping
+
 # ============================================================================
 # CONFIGURATION
 # ============================================================================
@@ -32,6 +35,9 @@ EEG_PATH = RAW_ROOT / config['paths']['eeg_path']
 SUBJECTS_TO_PROCESS = config.get('subjects', [])
 SESSIONS_TO_PROCESS = config.get('sessions', [])
 
+# Renommage / types de canaux appliqués avant l'écriture BIDS
+CHANNEL_MAPPING = load_channel_mapping(config)
+
 BIDS_ROOT.mkdir(parents=True, exist_ok=True)
 
 
@@ -364,6 +370,7 @@ def copy_brainvision_files(vhdr_files: List[Path]) -> Tuple[int, int]:
             
             # Lire et écrire avec MNE-BIDS
             raw = mne.io.read_raw_brainvision(vhdr_file, preload=False, verbose=False)
+            apply_channel_mapping(raw, CHANNEL_MAPPING)
             write_raw_bids(raw, bids_path, format='BrainVision', overwrite=True, verbose=False)
             
             triplets_copied += 1
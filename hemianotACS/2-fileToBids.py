@@ -10,6 +10,10 @@ from pathlib import Path
 import yaml
 import re
 import shutil
+import sys
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent / '_utils'))
+from channel_mapping import load_channel_mapping, apply_channel_mapping
 
 # Charger la configuration
 with open('config.yaml', 'r') as f:
@@ -17,6 +21,9 @@ with open('config.yaml', 'r') as f:
 
 BIDS_ROOT = Path(config['paths']['bids_root'])
 
+# Renommage / types de canaux appliqués avant l'écriture BIDS
+CHANNEL_MAPPING = load_channel_mapping(config)
+
 # Listes des sujets et sessions à traiter
 subjects = ['0002']
 sessions = ['01']
@@ -165,6 +172,7 @@ def bidsify_brainvision(vhdr_file, overwrite=False):
         )
         
         raw = mne.io.read_raw_brainvision(vhdr_file, preload=False, verbose=False)
+        apply_channel_mapping(raw, CHANNEL_MAPPING)
         write_raw_bids(raw, bids_path, format='BrainVision', overwrite=overwrite, verbose=False)
         
         return True, None
@@ -1,16 +1,16 @@
 #!/usr/bin/env python3
 """
 Diagnostic simple pour la BIDSification du projet hemianotACS
+(requêtes sur l'inventaire construit par session_inventory.py)
 """
-import os
-from pathlib import Path
-import yaml
+import argparse
 
-# Configuration
-RAW_PATH = Path("/Users/hippolyte.dreyfus/Desktop/hemiatotACS/HEMIANOTACS_WIP")
-BIDS_PATH = Path("/Users/hippolyte.dreyfus/Desktop/hemiatotACS/BIDS")
+from session_inventory import (RAW_ROOT as RAW_PATH, BIDS_ROOT as BIDS_PATH, load_inventory,
+                               participants as list_participants, files_per_session,
+                               sessions_per_subject)
 
-def analyze_raw_structure():
+
+def analyze_raw_structure(rebuild=False):
     """Analyse la structure des données brutes"""
     print("=" * 60)
     print("DIAGNOSTIC HEMIANOTACS - BIDSification")
@@ -26,65 +26,53 @@ def analyze_raw_structure():
         print("\n❌ ERREUR: Le dossier RAW n'existe pas!")
         return
     
+    inventory = load_inventory(rebuild=rebuild)
+
     # 2. Analyser les participants
     print("\n2. PARTICIPANTS")
     print("-" * 60)
-    
-    eeg_path = RAW_PATH / "EEG"
-    if eeg_path.exists():
-        participants = sorted([d.name for d in eeg_path.iterdir() if d.is_dir()])
-        print(f"   Nombre total de participants: {len(participants)}")
-        
-        # Distinguer patients et contrôles
-        patients = [p for p in participants if "PATIENT" in p]
-        healthy = [p for p in participants if "HEALTHY" in p]
-        excluded = [p for p in participants if "excluded" in p or "STAND_BY" in p]
-        
-        print(f"   - Patients: {len(patients)}")
-        print(f"   - Contrôles (HEALTHY): {len(healthy)}")
-        print(f"   - Exclus/Stand-by: {len(excluded)}")
-        
-        if excluded:
-            print(f"\n   ⚠️  Participants à exclure:")
-            for p in excluded:
-                print(f"      - {p}")
-    
+
+    participants = list_participants(inventory)
+    print(f"   Nombre total de participants: {len(participants)}")
+
+    # Distinguer patients et contrôles
+    excluded = participants.loc[participants['excluded'].astype(bool), 'subject_folder']
+    print(f"   - Patients: {(participants['group'] == 'PATIENT').sum()}")
+    print(f"   - Contrôles (HEALTHY): {(participants['group'] == 'HEALTHY').sum()}")
+    print(f"   - Exclus/Stand-by: {len(excluded)}")
+
+    if len(excluded):
+        print(f"\n   ⚠️  Participants à exclure:")
+        for p in excluded:
+            print(f"      - {p}")
+
     # 3. Analyser la structure des données
     print("\n3. TYPES DE DONNÉES")
     print("-" * 60)
-    
-    # Analyser un participant exemple
-    if participants:
-        example_subj = [p for p in participants if "excluded" not in p and "STAND_BY" not in p][0]
-        example_path = eeg_path / example_subj
-        print(f"   Exemple: {example_subj}")
-        
-        if (example_path / "2_EEG").exists():
-            eeg_sessions = sorted([d.name for d in (example_path / "2_EEG").iterdir() if d.is_dir()])
-            print(f"   Sessions EEG: {len(eeg_sessions)}")
-            for ses in eeg_sessions[:5]:  # Montrer les 5 premières
-                print(f"      - {ses}")
-            
-            # Compter les fichiers EDF
-            if eeg_sessions:
-                first_session = example_path / "2_EEG" / eeg_sessions[0]
-                edf_files = list(first_session.glob("*.edf"))
-                print(f"\n   Fichiers EEG (.edf) dans {eeg_sessions[0]}: {len(edf_files)}")
-                for f in edf_files[:3]:
-                    print(f"      - {f.name}")
-        
-        if (example_path / "1_VISUAL_FIELD").exists():
-            print(f"\n   ✓ Données VISUAL_FIELD présentes")
-    
+
+    sessions = sessions_per_subject(inventory)
+    print(f"   Sessions EEG: {sessions['n_sessions'].sum()} "
+          f"({len(sessions)} participants inclus)")
+
+    # Fichiers EEG (.edf) par participant et session
+    edf = files_per_session(inventory, extension='.edf')
+    edf = edf[edf['modality'] == 'eeg']
+    print(f"\n   Fichiers EEG (.edf): {edf['n_files'].sum()} dans {len(edf)} sessions")
+    for row in edf.itertuples():
+        print(f"      - {row.subject_folder}/{row.session_folder}: {row.n_files}")
+
+    n_visual_field = inventory.loc[inventory['modality'] == 'visual_field', 'subject_folder'].nunique()
+    if n_visual_field:
+        print(f"\n   ✓ Données VISUAL_FIELD présentes ({n_visual_field} participants)")
+
     # 4. IRM
     print("\n4. DONNÉES IRM")
     print("-" * 60)
-    irm_path = RAW_PATH / "IRM"
-    if irm_path.exists():
-        irm_subjects = sorted([d.name for d in irm_path.iterdir() if d.is_dir()])
+    irm_subjects = sorted(inventory.loc[inventory['modality'] == 'mri', 'subject_folder'].unique())
+    if irm_subjects:
         print(f"   Nombre de sujets avec IRM: {len(irm_subjects)}")
-        print(f"   Premiers sujets: {', '.join(irm_subjects[:5])}")
-    
+        print(f"   Sujets: {', '.join(irm_subjects)}")
+
     # 5. État BIDS
     print("\n5. ÉTAT DE LA BIDSIFICATION")
     print("-" * 60)
@@ -116,4 +104,7 @@ def analyze_raw_structure():
     print("=" * 60)
 
 if __name__ == "__main__":
-    analyze_raw_structure()
+    parser = argparse.ArgumentParser(description="Diagnostic de la BIDSification hemianotACS")
+    parser.add_argument('--rebuild', action='store_true', help="Reconstruire l'inventaire avant le diagnostic")
+    args = parser.parse_args()
+    analyze_raw_structure(rebuild=args.rebuild)
@@ -0,0 +1,419 @@
+#!/usr/bin/env python3
+"""
+Inventaire des données brutes du projet hemianotACS.
+
+Parcourt une seule fois HEMIANOTACS_WIP (EEG + IRM) et produit une table
+colonnaire sujet × session × modalité × fichier, sauvegardée en Parquet.
+Les rapports (check_sessions.py, diagnostic_bidsification.py) ne sont plus
+que des requêtes sur cette table.
+
+L'inventaire sauvegardé est reconstruit automatiquement quand l'empreinte du RAW
+(dates de modification des dossiers jusqu'au niveau session) a changé depuis sa
+construction; sa date de construction est affichée à chaque chargement.
+
+Usage:
+    python session_inventory.py                 # construit (ou recharge) l'inventaire
+    python session_inventory.py --rebuild       # force un nouveau parcours du RAW
+    python session_inventory.py --export inv.csv
+"""
+import argparse
+import hashlib
+import json
+import os
+import re
+from datetime import datetime
+from pathlib import Path
+from typing import Dict, Iterator, List, Optional, Tuple
+
+import pandas as pd
+import yaml
+
+try:
+    import pyarrow  # noqa: F401
+except ImportError:
+    pyarrow = None
+
+# ============================================================================
+# CONFIGURATION
+# ============================================================================
+
+CONFIG_PATH = Path(__file__).parent / 'config.yaml'
+with open(CONFIG_PATH, 'r') as f:
+    config = yaml.safe_load(f)
+
+RAW_ROOT = Path(config['paths']['raw_root'])
+BIDS_ROOT = Path(config['paths']['bids_root'])
+EEG_PATH = RAW_ROOT / config['paths']['eeg_path']
+MRI_PATH = RAW_ROOT / config['paths']['mri_path']
+INVENTORY_PATH = Path(__file__).parent / config['paths'].get('inventory_path', 'inventory/raw_inventory.parquet')
+
+# Sous-dossiers d'un participant -> modalité
+MODALITY_FOLDERS = {
+    '2_EEG': 'eeg',
+    '1_VISUAL_FIELD': 'visual_field',
+}
+
+COLUMNS = [
+    'subject_folder', 'subject_id', 'group', 'initials', 'excluded',
+    'session_folder', 'session', 'modality',
+    'relpath', 'filename', 'extension', 'size_bytes', 'mtime',
+]
+
+
+# ============================================================================
+# FONCTIONS D'EXTRACTION D'INFORMATIONS
+# ============================================================================
+
+def extract_subject_info(folder_name: str) -> Tuple[Optional[str], Optional[str], Optional[str]]:
+    """
+    Extrait les informations du dossier participant.
+
+    Args:
+        folder_name: Nom du dossier (ex: '001-0001-CC_PATIENT')
+
+    Returns:
+        Tuple (subject_id, group, initials) ou (None, None, None)
+    """
+    match = re.match(r'(\d+)-(\d+)-([A-Z]+)_(PATIENT|HEALTHY)', folder_name)
+    if match:
+        return match.group(2), match.group(4), match.group(3)
+    return None, None, None
+
+
+def extract_session_from_folder(folder_name: str) -> Optional[str]:
+    """
+    Extrait le numéro de session depuis le nom du dossier.
+
+    Args:
+        folder_name: Nom du dossier (ex: 'V1_BASELINE_22-12-2020')
+
+    Returns:
+        Numéro de session formaté ('01', '02', etc.) ou None
+    """
+    match = re.match(r'V(\d+)', folder_name)
+    if match:
+        return match.group(1).zfill(2)
+    return None
+
+
+def is_excluded(folder_name: str) -> bool:
+    """Vérifie si un dossier participant est exclu ou en stand-by."""
+    return 'excluded' in folder_name or 'STAND_BY' in folder_name
+
+
+# ============================================================================
+# PARCOURS DU RAW
+# ============================================================================
+
+def _walk_files(root: Path) -> Iterator[os.DirEntry]:
+    """Parcourt récursivement `root` avec os.scandir (un seul stat par entrée)."""
+    stack = [root]
+    while stack:
+        current = stack.pop()
+        try:
+            with os.scandir(current) as it:
+                for entry in it:
+                    if entry.is_dir(follow_symlinks=False):
+                        stack.append(Path(entry.path))
+                    elif entry.is_file(follow_symlinks=False):
+                        yield entry
+        except (PermissionError, FileNotFoundError):
+            continue
+
+
+def _file_row(entry: os.DirEntry, base: Dict) -> Dict:
+    """Construit une ligne d'inventaire à partir d'une entrée os.scandir."""
+    st = entry.stat(follow_symlinks=False)
+    path = Path(entry.path)
+    return {
+        **base,
+        'relpath': str(path.relative_to(RAW_ROOT)),
+        'filename': entry.name,
+        'extension': path.suffix.lower() if path.suffix else '[no_extension]',
+        'size_bytes': st.st_size,
+        'mtime': st.st_mtime,
+    }
+
+
+def _scan_session(session_dir: Path, base: Dict) -> List[Dict]:
+    """
+    Inventorie une session. Une session vide produit une ligne sans fichier
+    afin d'être comptée dans les rapports.
+    """
+    rows = [_file_row(entry, base) for entry in _walk_files(session_dir)]
+    return rows or [dict(base)]
+
+
+def scan_eeg(eeg_path: Path = EEG_PATH) -> List[Dict]:
+    """Inventorie les dossiers participants de HEMIANOTACS_WIP/EEG."""
+    rows = []
+    if not eeg_path.exists():
+        return rows
+
+    for subj_dir in sorted(d for d in eeg_path.iterdir() if d.is_dir()):
+        subject_id, group, initials = extract_subject_info(subj_dir.name)
+        subject_base = {
+            'subject_folder': subj_dir.name,
+            'subject_id': subject_id,
+            'group': group,
+            'initials': initials,
+            'excluded': is_excluded(subj_dir.name),
+        }
+        n_before = len(rows)
+
+        for folder_name, modality in MODALITY_FOLDERS.items():
+            modality_dir = subj_dir / folder_name
+            if not modality_dir.is_dir():
+                continue
+
+            if modality == 'eeg':
+                # Une session par dossier V1_..., V2_..., etc.
+                session_dirs = sorted(d for d in modality_dir.iterdir() if d.is_dir())
+                for session_dir in session_dirs:
+                    base = {
+                        **subject_base,
+                        'session_folder': session_dir.name,
+                        'session': extract_session_from_folder(session_dir.name),
+                        'modality': modality,
+                    }
+                    rows.extend(_scan_session(session_dir, base))
+                # Dossier EEG sans session: le participant compte avec 0 séance
+                if not session_dirs:
+                    rows.append({**subject_base, 'session_folder': None, 'session': None, 'modality': modality})
+            else:
+                base = {**subject_base, 'session_folder': None, 'session': None, 'modality': modality}
+                rows.extend(_scan_session(modality_dir, base))
+
+        # Participant sans aucune donnée reconnue (ou dossier hors sujet, ex: data-VisualField)
+        if len(rows) == n_before:
+            rows.append({**subject_base, 'session_folder': None, 'session': None, 'modality': None})
+
+    return rows
+
+
+def scan_mri(mri_path: Path = MRI_PATH) -> List[Dict]:
+    """Inventorie les dossiers sujets de HEMIANOTACS_WIP/IRM."""
+    rows = []
+    if not mri_path.exists():
+        return rows
+
+    for subj_dir in sorted(d for d in mri_path.iterdir() if d.is_dir()):
+        subject_id, group, initials = extract_subject_info(subj_dir.name)
+        base = {
+            'subject_folder': subj_dir.name,
+            'subject_id': subject_id,
+            'group': group,
+            'initials': initials,
+            'excluded': is_excluded(subj_dir.name),
+            'session_folder': None,
+            'session': config['paths'].get('mri_session_id'),
+            'modality': 'mri',
+        }
+        rows.extend(_scan_session(subj_dir, base))
+
+    return rows
+
+
+def build_inventory() -> pd.DataFrame:
+    """Parcourt le RAW une seule fois et retourne la table d'inventaire."""
+    rows = scan_eeg() + scan_mri()
+    inventory = pd.DataFrame(rows, columns=COLUMNS)
+    for col in ['subject_folder', 'subject_id', 'group', 'initials',
+                'session_folder', 'session', 'modality', 'extension']:
+        inventory[col] = inventory[col].astype('category')
+    inventory['size_bytes'] = inventory['size_bytes'].astype('Int64')
+    inventory['mtime'] = pd.to_datetime(inventory['mtime'], unit='s')
+    return inventory
+
+
+# ============================================================================
+# SAUVEGARDE / CHARGEMENT
+# ============================================================================
+
+def _dir_mtimes(root: Path, depth: int) -> Iterator[Tuple[str, int]]:
+    """(chemin relatif à RAW_ROOT, mtime en ns) de root et de ses sous-dossiers jusqu'à `depth` niveaux."""
+    try:
+        st = root.stat()
+    except FileNotFoundError:
+        return
+    yield str(root.relative_to(RAW_ROOT)), st.st_mtime_ns
+    if depth == 0:
+        return
+    try:
+        with os.scandir(root) as it:
+            subdirs = sorted(Path(entry.path) for entry in it if entry.is_dir(follow_symlinks=False))
+    except PermissionError:
+        return
+    for subdir in subdirs:
+        yield from _dir_mtimes(subdir, depth - 1)
+
+
+def raw_fingerprint() -> str:
+    """
+    Empreinte du RAW: dates de modification des dossiers EEG jusqu'aux sessions
+    (EEG/participant/2_EEG/V*) et IRM jusqu'aux sous-dossiers des sujets.
+
+    Un ajout, une suppression ou un renommage à ces niveaux change l'empreinte;
+    quelques centaines de stat au lieu du parcours complet.
+    """
+    mtimes = list(_dir_mtimes(EEG_PATH, 3)) + list(_dir_mtimes(MRI_PATH, 2))
+    return hashlib.sha1(json.dumps(mtimes).encode()).hexdigest()
+
+
+def _meta_path(path: Path) -> Path:
+    """Fichier de métadonnées (date de construction, empreinte du RAW) d'un inventaire."""
+    return path.with_name(path.stem + '.meta.json')
+
+
+def _read_meta(path: Path) -> Optional[Dict]:
+    try:
+        with open(_meta_path(path), 'r') as f:
+            return json.load(f)
+    except (FileNotFoundError, json.JSONDecodeError):
+        return None
+
+
+def save_inventory(inventory: pd.DataFrame, path: Path = INVENTORY_PATH) -> Path:
+    """
+    Sauvegarde l'inventaire. Le format dépend de l'extension
+    (.parquet, .csv, .tsv). Sans pyarrow, un .parquet est remplacé par un .tsv.
+    """
+    path = Path(path)
+    path.parent.mkdir(parents=True, exist_ok=True)
+
+    if path.suffix == '.parquet' and pyarrow is None:
+        path = path.with_suffix('.tsv')
+        print(f"⚠️  pyarrow non installé, inventaire sauvegardé en TSV: {path}")
+
+    if path.suffix == '.parquet':
+        inventory.to_parquet(path, index=False)
+    elif path.suffix == '.csv':
+        inventory.to_csv(path, index=False)
+    else:
+        inventory.to_csv(path, sep='\t', index=False)
+    return path
+
+
+def load_inventory(path: Path = INVENTORY_PATH, rebuild: bool = False) -> pd.DataFrame:
+    """
+    Charge l'inventaire existant, ou le construit s'il est absent, si le RAW a
+    changé depuis sa construction (raw_fingerprint) ou si `rebuild`.
+
+    Returns:
+        DataFrame avec une ligne par fichier (colonnes COLUMNS)
+    """
+    path = Path(path)
+    if path.suffix == '.parquet' and pyarrow is None:
+        path = path.with_suffix('.tsv')
+
+    fingerprint = raw_fingerprint()
+    meta = _read_meta(path) if path.exists() else None
+
+    if rebuild or meta is None or meta.get('fingerprint') != fingerprint:
+        if not rebuild and meta is not None:
+            print(f"⚠️  RAW modifié depuis l'inventaire du {meta['built_at']}: reconstruction")
+        inventory = build_inventory()
+        path = save_inventory(inventory, path)
+        meta = {'built_at': datetime.now().isoformat(timespec='seconds'), 'fingerprint': fingerprint}
+        with open(_meta_path(path), 'w') as f:
+            json.dump(meta, f, indent=1)
+    elif path.suffix == '.parquet':
+        inventory = pd.read_parquet(path)
+    else:
+        sep = ',' if path.suffix == '.csv' else '\t'
+        inventory = pd.read_csv(path, sep=sep, dtype={'subject_id': str, 'session': str},
+                                parse_dates=['mtime'])
+
+    print(f"📦 Inventaire RAW construit le {meta['built_at'].replace('T', ' ')} ({path})")
+    return inventory
+
+
+# ============================================================================
+# REQUÊTES
+# ============================================================================
+
+def included(inventory: pd.DataFrame) -> pd.DataFrame:
+    """Participants reconnus et non exclus."""
+    return inventory[inventory['subject_id'].notna() & ~inventory['excluded'].astype(bool)]
+
+
+def participants(inventory: pd.DataFrame) -> pd.DataFrame:
+    """Une ligne par dossier participant (EEG) avec groupe et statut d'exclusion."""
+    eeg_side = inventory[inventory['modality'].astype(object) != 'mri']
+    return (eeg_side[['subject_folder', 'subject_id', 'group', 'initials', 'excluded']]
+            .drop_duplicates('subject_folder')
+            .sort_values('subject_folder')
+            .reset_index(drop=True))
+
+
+def sessions_per_subject(inventory: pd.DataFrame) -> pd.DataFrame:
+    """
+    Sessions EEG (dossiers V*) par participant inclus ayant un dossier EEG,
+    y compris ceux sans aucune séance (n_sessions = 0).
+
+    Returns:
+        DataFrame (subject_folder, group, n_sessions, sessions)
+    """
+    eeg = included(inventory)
+    eeg = eeg[eeg['modality'].astype(object) == 'eeg']
+    subjects = (eeg[['subject_folder', 'group']]
+                .astype(object)
+                .drop_duplicates('subject_folder')
+                .sort_values('subject_folder'))
+    eeg = eeg[eeg['session_folder'].astype(object).str.startswith('V', na=False)]
+    sessions = (eeg[['subject_folder', 'session_folder']]
+                .astype(object)
+                .drop_duplicates()
+                .sort_values(['subject_folder', 'session_folder'])
+                .groupby('subject_folder')['session_folder']
+                .agg(list))
+    subjects['sessions'] = [sessions.get(folder, []) for folder in subjects['subject_folder']]
+    subjects['n_sessions'] = subjects['sessions'].str.len()
+    return subjects[['subject_folder', 'group', 'n_sessions', 'sessions']].reset_index(drop=True)
+
+
+def files_per_session(inventory: pd.DataFrame, extension: Optional[str] = None) -> pd.DataFrame:
+    """Nombre de fichiers par participant × session × modalité (filtrable par extension)."""
+    files = inventory[inventory['filename'].notna()]
+    if extension:
+        files = files[files['extension'].astype(object) == extension]
+    return (files.groupby(['subject_folder', 'session_folder', 'modality'], observed=True)
+            .agg(n_files=('filename', 'size'), size_bytes=('size_bytes', 'sum'))
+            .reset_index())
+
+
+def extension_counts(inventory: pd.DataFrame) -> pd.Series:
+    """Nombre de fichiers par extension (participants inclus)."""
+    files = included(inventory)
+    files = files[files['filename'].notna()]
+    return files['extension'].astype(object).value_counts()
+
+
+# ============================================================================
+# FONCTION PRINCIPALE
+# ============================================================================
+
+def main():
+    """Fonction principale."""
+    parser = argparse.ArgumentParser(description="Inventaire des données brutes hemianotACS")
+    parser.add_argument('--rebuild', action='store_true', help="Reparcourir le RAW même si l'inventaire existe")
+    parser.add_argument('--export', help="Exporter l'inventaire (.parquet, .csv ou .tsv)")
+    args = parser.parse_args()
+
+    inventory = load_inventory(rebuild=args.rebuild)
+    files = inventory[inventory['filename'].notna()]
+    print(f"✓ Inventaire: {len(files)} fichiers, "
+          f"{inventory['subject_folder'].nunique()} dossiers participants ({INVENTORY_PATH})")
+
+    summary = files.groupby('modality', observed=True).agg(
+        n_files=('filename', 'size'), size_bytes=('size_bytes', 'sum'))
+    for modality, row in summary.iterrows():
+        print(f"  {modality:15s}: {row['n_files']:6d} fichiers, {row['size_bytes'] / 1e9:8.2f} Go")
+
+    if args.export:
+        export_path = save_inventory(inventory, Path(args.export))
+        print(f"✓ Exporté vers {export_path}")
+
+
+if __name__ == "__main__":
+    main()